@@ -0,0 +1,227 @@
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+import metricas
+from armazem import ARMAZEM, armazem
+from log_estruturado import evento
+from sienge import sienge_financeiro
+from sienge.sienge_http import (
+    BASE_URL, PRIORIDADE_BACKGROUND, CircuitoAberto, PaginaFalhou, paginar, prioridade,
+)
+
+# ============================================================
+# 🔥 AQUECIMENTO DO CACHE DE RELATÓRIOS
+# ============================================================
+# Uma thread de fundo recalcula (com prioridade baixa no limitador do
+# Sienge) os relatórios que mais vão ser pedidos, para que o primeiro
+# "resumo" do dia não pague a extração fria:
+#   - período padrão sem filtro;
+#   - cada empresa no ano corrente;
+#   - os conjuntos de filtros mais usados em atualizar_filtros (registrar).
+# A primeira rodada do dia acontece em AQUECIMENTO_HORA_INICIO (antes do
+# expediente) e depois a cada AQUECIMENTO_INTERVALO até AQUECIMENTO_HORA_FIM.
+# Cada rodada renova as partições que venceriam antes da próxima, então o
+# mês corrente fica sempre fresco e os meses fechados quase nunca são
+# rebaixados. Os nomes (obra, centro de custo) entram no cache junto.
+# Com o armazém local ligado (armazem.py) a rodada sincroniza os meses em
+# disco, que é de onde o chat passa a ler.
+#
+#   AQUECIMENTO            = "0" desliga (padrão: ligado)
+#   AQUECIMENTO_INTERVALO  = segundos entre rodadas (padrão: 240)
+#   AQUECIMENTO_HORA_INICIO / AQUECIMENTO_HORA_FIM = janela, hora local (padrão: 6 e 20)
+#   AQUECIMENTO_FUSO       = fuso da janela (padrão: America/Sao_Paulo)
+#   AQUECIMENTO_TOP        = filtros aprendidos aquecidos por rodada (padrão: 10)
+#   AQUECIMENTO_EMPRESAS   = ids separados por vírgula (padrão: GET /enterprises)
+
+AQUECIMENTO = os.getenv("AQUECIMENTO", "1") != "0"
+AQUECIMENTO_INTERVALO = float(os.getenv("AQUECIMENTO_INTERVALO", "240"))
+AQUECIMENTO_HORA_INICIO = int(os.getenv("AQUECIMENTO_HORA_INICIO", "6"))
+AQUECIMENTO_HORA_FIM = int(os.getenv("AQUECIMENTO_HORA_FIM", "20"))
+AQUECIMENTO_FUSO = os.getenv("AQUECIMENTO_FUSO", "America/Sao_Paulo")
+AQUECIMENTO_TOP = int(os.getenv("AQUECIMENTO_TOP", "10"))
+AQUECIMENTO_EMPRESAS = os.getenv("AQUECIMENTO_EMPRESAS", "")
+
+# O que os helpers do chat leem (resumo, gastos por obra/centro); apropriações ficam de fora
+CAMPOS = {"dre", "por_obra", "por_centro_custo"}
+CHAVES_FILTRO = ("enterpriseId", "startDate", "endDate")
+
+rodadas_total = metricas.Contador(
+    "constru_aquecimento_total", "Relatórios aquecidos por resultado", ("resultado",))
+rodada_segundos = metricas.Histograma(
+    "constru_aquecimento_rodada_segundos", "Duração de uma rodada de aquecimento",
+    buckets=(1, 5, 15, 30, 60, 120, 300, 600))
+
+
+def _fuso():
+    try:
+        from zoneinfo import ZoneInfo
+        return ZoneInfo(AQUECIMENTO_FUSO)
+    except Exception:
+        return timezone(timedelta(hours=-3))
+
+
+def _chave(filtros: dict) -> tuple:
+    return tuple((k, str(filtros[k])) for k in CHAVES_FILTRO if filtros.get(k))
+
+
+class Aquecedor:
+    def __init__(self, intervalo: float = AQUECIMENTO_INTERVALO):
+        self.intervalo = intervalo
+        self._uso = Counter()
+        self._lock = threading.Lock()
+        self._parar = threading.Event()
+        self._thread = None
+        self._empresas = (None, [])  # (dia, ids)
+        self.alvos = []  # conjuntos da última rodada (prontidão/métricas não chamam o Sienge)
+        self.ultima_rodada = None  # dict com início, duração e resultados
+
+    # --- aprendizado -------------------------------------------------------
+    def registrar(self, filtros: dict):
+        """Conta um conjunto de filtros escolhido por um usuário (atualizar_filtros)."""
+        chave = _chave(filtros or {})
+        if chave:
+            with self._lock:
+                self._uso[chave] += 1
+
+    def mais_usados(self, n: int = AQUECIMENTO_TOP):
+        with self._lock:
+            return [dict(chave) for chave, _ in self._uso.most_common(n)]
+
+    # --- o que aquecer -----------------------------------------------------
+    def empresas(self):
+        """Ids das empresas: AQUECIMENTO_EMPRESAS ou a listagem do Sienge (uma vez por dia)."""
+        if AQUECIMENTO_EMPRESAS:
+            return [int(e) for e in AQUECIMENTO_EMPRESAS.split(",") if e.strip().isdigit()]
+        hoje = datetime.now(_fuso()).date()
+        if self._empresas[0] == hoje:
+            return self._empresas[1]
+        try:
+            ids = [e["id"] for e in paginar(f"{BASE_URL}/enterprises", timeout=20) if e.get("id")]
+        except PaginaFalhou as e:
+            logging.warning(f"⚠️ Aquecimento: falha ao listar empresas ({e.status})")
+            return self._empresas[1]
+        self._empresas = (hoje, ids)
+        return ids
+
+    def conjuntos(self):
+        """Filtros a aquecer, sem repetição: padrão, empresas no ano corrente, aprendidos."""
+        hoje = datetime.now(_fuso()).date()
+        ano = {"startDate": hoje.replace(month=1, day=1).isoformat(), "endDate": hoje.isoformat()}
+        candidatos = [{}] + [{"enterpriseId": e, **ano} for e in self.empresas()] + self.mais_usados()
+        vistos, saida = set(), []
+        for filtros in candidatos:
+            chave = _chave(filtros)
+            if chave not in vistos:
+                vistos.add(chave)
+                saida.append(filtros)
+        return saida
+
+    # --- execução ----------------------------------------------------------
+    def rodada(self):
+        """Recalcula todos os conjuntos; partições que vencem antes da próxima rodada são renovadas."""
+        inicio = time.monotonic()
+        resultados = {"ok": 0, "falha": 0}
+        margem = self.intervalo * 1.5
+        with prioridade(PRIORIDADE_BACKGROUND), sienge_financeiro.renovando(margem):
+            try:
+                conjuntos = self.conjuntos()
+            except CircuitoAberto:
+                conjuntos = []
+            self.alvos = conjuntos
+            for filtros in conjuntos:
+                if self._parar.is_set():
+                    break
+                try:
+                    if ARMAZEM:
+                        armazem.garantir(dict(filtros), margem)  # o chat responde por SQL em cima dos arquivos
+                    else:
+                        sienge_financeiro.gerar_relatorio_json(dict(filtros), campos=CAMPOS)
+                    resultados["ok"] += 1
+                    rodadas_total.inc("ok")
+                except CircuitoAberto:
+                    rodadas_total.inc("circuito_aberto")
+                    logging.warning("⚠️ Aquecimento interrompido: circuito do Sienge aberto.")
+                    break
+                except sienge_financeiro.ListagemIncompleta as e:
+                    resultados["falha"] += 1
+                    rodadas_total.inc("falha")
+                    logging.warning(f"⚠️ Aquecimento de {filtros} incompleto: {e}")
+                except Exception:
+                    resultados["falha"] += 1
+                    rodadas_total.inc("falha")
+                    logging.exception(f"❌ Erro aquecendo relatório {filtros}:")
+        duracao = time.monotonic() - inicio
+        rodada_segundos.observar(duracao)
+        self.ultima_rodada = {"em": datetime.now(_fuso()).isoformat(timespec="seconds"),
+                              "segundos": round(duracao, 2), **resultados}
+        evento("aquecimento", "🔥 Rodada de aquecimento concluída", conjuntos=len(conjuntos),
+               segundos=round(duracao, 2), **resultados)
+
+    @staticmethod
+    def _na_janela(agora) -> bool:
+        return AQUECIMENTO_HORA_INICIO <= agora.hour < AQUECIMENTO_HORA_FIM
+
+    def _espera(self) -> float:
+        """Segundos até a próxima rodada: o intervalo dentro da janela, senão até a abertura."""
+        agora = datetime.now(_fuso())
+        if self._na_janela(agora):
+            return self.intervalo
+        abertura = agora.replace(hour=AQUECIMENTO_HORA_INICIO, minute=0, second=0, microsecond=0)
+        if abertura <= agora:
+            abertura += timedelta(days=1)
+        return (abertura - agora).total_seconds()
+
+    def _loop(self):
+        # Na subida só aquece se já estiver na janela
+        espera = 0.0 if self._na_janela(datetime.now(_fuso())) else self._espera()
+        while not self._parar.wait(espera):
+            try:
+                self.rodada()
+            except Exception:
+                logging.exception("❌ Erro inesperado na rodada de aquecimento:")
+            espera = self._espera()
+
+    def iniciar(self):
+        if not AQUECIMENTO or self._thread is not None:
+            return
+        self._parar.clear()
+        self._thread = threading.Thread(target=self._loop, name="aquecimento", daemon=True)
+        self._thread.start()
+        logging.info(f"🔥 Aquecimento de relatórios ativo (a cada {self.intervalo:.0f}s, "
+                     f"{AQUECIMENTO_HORA_INICIO}h–{AQUECIMENTO_HORA_FIM}h {AQUECIMENTO_FUSO})")
+
+    def parar(self):
+        self._parar.set()
+        self._thread = None
+
+    # --- prontidão ---------------------------------------------------------
+    def cobertura(self):
+        """([(filtros, em_cache, partições)], fração) dos conjuntos da última rodada, vistos agora."""
+        prontas = armazem.prontos if ARMAZEM else sienge_financeiro.particoes_prontas
+        itens = [(f, *prontas(f)) for f in self.alvos]
+        total = sum(n for _, _, n in itens)
+        return itens, (sum(c for _, c, _ in itens) / total if total else 0.0)
+
+    def estado(self) -> dict:
+        """Cobertura do cache quente: partições válidas agora para cada conjunto aquecido."""
+        itens, cobertura = self.cobertura()
+        return {
+            "ativo": AQUECIMENTO,
+            "pronto": not AQUECIMENTO or cobertura >= 1.0,
+            "cobertura": round(cobertura, 4),
+            "ultima_rodada": self.ultima_rodada,
+            "conjuntos": [{"filtros": f, "particoes": n, "em_cache": c} for f, c, n in itens],
+        }
+
+
+aquecedor = Aquecedor()
+
+
+@metricas.registrar_coletor
+def _metricas_cobertura():
+    return [("constru_aquecimento_cobertura", "gauge", "Fração das partições aquecidas que estão em cache",
+             [({}, aquecedor.cobertura()[1])])]
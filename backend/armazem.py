@@ -0,0 +1,304 @@
+import importlib.util
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+
+import metricas
+from log_estruturado import evento
+from rastreio import propagar, span
+from sienge import sienge_financeiro
+from prazo import PrazoEsgotado
+from sienge.sienge_http import BASE_URL, CircuitoAberto, PaginaFalhou, paginar
+
+# ============================================================
+# 🗄️ ARMAZÉM LOCAL (Parquet por mês + DuckDB)
+# ============================================================
+# Contas a pagar e a receber extraídas do Sienge ficam em disco, um arquivo
+# Parquet por mês:
+#   despesas/escopo=<empreendimento|todas>/mes=2025-03/dados.parquet
+#   receitas/escopo=<empreendimento|todas>/mes=2025-03/dados.parquet
+# O escopo é o enterpriseId pedido, e quem filtra é o próprio Sienge: o
+# título não traz o empreendimento (debtorId é a empresa, outro espaço de
+# ids), então não dá para filtrar localmente a partir de "todas". As
+# despesas guardam os hrefs de empresa, fornecedor, centro e obra; o nome
+# só é resolvido (get_cached) para os grupos que a consulta devolve.
+#
+# Resumo, gastos por obra/centro e alertas viram SQL no DuckDB sobre os
+# arquivos, com poda de partição pelo `mes` e filtro de datas empurrado para
+# o Parquet: depois da primeira extração, vários anos respondem em milissegundos.
+# Mês fechado é baixado de novo a cada ARMAZEM_TTL_PASSADO; o corrente a
+# cada ARMAZEM_TTL_ATUAL. Se o Sienge falhar, o arquivo antigo continua valendo.
+#
+#   ARMAZEM            = "0" desliga (padrão: ligado se duckdb e pyarrow estiverem instalados)
+#   ARMAZEM_DIR        = diretório dos arquivos (padrão: armazem)
+#   ARMAZEM_TTL_PASSADO / ARMAZEM_TTL_ATUAL = idem às partições em memória (7 dias / 300 s)
+#
+# Apropriações não entram: a apresentação com plano de contas continua no
+# gerar_relatorio_json (com o cache persistente de apropriações).
+
+ARMAZEM_DIR = os.getenv("ARMAZEM_DIR", "armazem")
+ARMAZEM_TTL_PASSADO = float(os.getenv("ARMAZEM_TTL_PASSADO", str(sienge_financeiro.PARTICAO_TTL_PASSADO)))
+ARMAZEM_TTL_ATUAL = float(os.getenv("ARMAZEM_TTL_ATUAL", str(sienge_financeiro.PARTICAO_TTL_ATUAL)))
+ARMAZEM = (os.getenv("ARMAZEM", "1") != "0"
+           and importlib.util.find_spec("duckdb") is not None
+           and importlib.util.find_spec("pyarrow") is not None)
+
+# Dimensões que fatiar() aceita; as de LINKS_NOMES ficam como href (<campo>_ref)
+DIMENSOES = tuple(sienge_financeiro.LINKS_NOMES) + ("status", "tipo_lancamento", "mes")
+COLUNAS_DESPESAS = (
+    ("id", "int64"), ("empresa_id", "int64"), ("empresa_ref", "string"), ("fornecedor_ref", "string"),
+    ("centro_custo_ref", "string"), ("obra_ref", "string"), ("status", "string"), ("valor", "float64"),
+    ("data_emissao", "string"), ("data_vencimento", "string"), ("documento", "string"),
+    ("tipo_lancamento", "string"),
+)
+COLUNAS_RECEITAS = (("id", "int64"), ("cliente_id", "int64"), ("valor", "float64"), ("data_emissao", "string"))
+
+sincronizados = metricas.Contador(
+    "constru_armazem_meses_total", "Meses sincronizados no armazém local", ("tabela", "resultado"))
+consultas = metricas.Histograma(
+    "constru_armazem_consulta_segundos", "Duração das consultas SQL ao armazém local", ("consulta",))
+
+
+class ArmazemIncompleto(Exception):
+    """Algum mês do período não pôde ser baixado e não há cópia local."""
+
+
+def _mes(d: date) -> str:
+    return d.strftime("%Y-%m")
+
+
+def _meses(inicio: str, fim: str):
+    return [_mes(date.fromisoformat(a)) for a, _ in sienge_financeiro.particoes_mensais(inicio, fim)]
+
+
+def _periodo(params) -> dict:
+    params = dict(params or {})
+    if "startDate" not in params:
+        params["startDate"], params["endDate"] = sienge_financeiro.periodo_padrao()
+    elif not params.get("endDate"):
+        params["endDate"] = date.today().isoformat()  # "a partir de" sem fim: até hoje
+    return params
+
+
+def _limites_do_mes(mes: str):
+    ini = date.fromisoformat(f"{mes}-01")
+    fim = (ini.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
+    return ini.isoformat(), fim.isoformat()
+
+
+def _int(v):
+    try:
+        return int(v)
+    except (TypeError, ValueError):
+        return None
+
+
+def _linha_despesa(item) -> dict:
+    links = {l.get("rel"): l.get("href") for l in item.get("links", [])}
+    linha = {f"{campo}_ref": links.get(rel) for campo, rel in sienge_financeiro.LINKS_NOMES.items()}
+    linha.update({
+        "id": _int(item.get("id")),
+        "empresa_id": _int(item.get("debtorId") or item.get("companyId")),
+        "status": item.get("status", "N/A"),
+        "valor": float(item.get("totalInvoiceAmount") or item.get("totalValueAmount") or 0),
+        "data_emissao": item.get("issueDate", ""),
+        "data_vencimento": item.get("dueDate", ""),
+        "documento": item.get("documentNumber", ""),
+        "tipo_lancamento": item.get("originId", ""),
+    })
+    return linha
+
+
+def _linha_receita(item) -> dict:
+    return {
+        "id": _int(item.get("receivableBillId") or item.get("id")),
+        "cliente_id": _int(item.get("customerId")),
+        "valor": float(item.get("receivableBillValue") or 0),
+        "data_emissao": item.get("issueDate", ""),
+    }
+
+
+class Armazem:
+    def __init__(self, diretorio: str = ARMAZEM_DIR):
+        self.diretorio = diretorio
+        self._locks = {}
+        self._locks_lock = threading.Lock()
+        self._local = threading.local()
+
+    # --- arquivos ----------------------------------------------------------
+    def _arquivo(self, tabela: str, mes: str, escopo: str = None) -> str:
+        partes = [self.diretorio, tabela] + ([f"escopo={escopo}"] if escopo else []) + [f"mes={mes}", "dados.parquet"]
+        return os.path.join(*partes)
+
+    @staticmethod
+    def _ttl(mes: str) -> float:
+        return ARMAZEM_TTL_PASSADO if mes < _mes(datetime.now().date()) else ARMAZEM_TTL_ATUAL
+
+    def _fresco(self, arquivo: str, mes: str, margem: float = 0.0) -> bool:
+        try:
+            return time.time() - os.path.getmtime(arquivo) < self._ttl(mes) - margem
+        except OSError:
+            return False
+
+    def _lock(self, arquivo: str) -> threading.Lock:
+        with self._locks_lock:
+            return self._locks.setdefault(arquivo, threading.Lock())
+
+    @staticmethod
+    def _gravar(arquivo: str, colunas, linhas):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        esquema = pa.schema([(nome, getattr(pa, tipo)()) for nome, tipo in colunas])
+        tabela = pa.Table.from_pylist(linhas, schema=esquema)
+        os.makedirs(os.path.dirname(arquivo), exist_ok=True)
+        temporario = f"{arquivo}.{os.getpid()}.{threading.get_ident()}.tmp"
+        pq.write_table(tabela, temporario, compression="zstd")
+        os.replace(temporario, arquivo)  # leitores nunca veem arquivo pela metade
+
+    # --- sincronização -----------------------------------------------------
+    def _sincronizar_mes(self, tabela: str, mes: str, escopo: str = None, margem: float = 0.0) -> bool:
+        """Baixa o mês inteiro se o arquivo não existe ou venceu. False só se faltar o arquivo."""
+        arquivo = self._arquivo(tabela, mes, escopo)
+        with self._lock(arquivo):
+            if self._fresco(arquivo, mes, margem):
+                return True
+            ini, fim = _limites_do_mes(mes)
+            params = {"startDate": ini, "endDate": fim}
+            if escopo != "todas":
+                params["enterpriseId"] = escopo
+            try:
+                if tabela == "despesas":
+                    linhas = [_linha_despesa(i) for i in paginar(f"{BASE_URL}/bills", params)]
+                    self._gravar(arquivo, COLUNAS_DESPESAS, linhas)
+                else:
+                    linhas = [_linha_receita(i) for i in
+                              paginar(f"{BASE_URL}/accounts-receivable/receivable-bills", params)]
+                    self._gravar(arquivo, COLUNAS_RECEITAS, linhas)
+            except (PaginaFalhou, CircuitoAberto, PrazoEsgotado) as e:
+                sincronizados.inc(tabela, "falha")
+                existe = os.path.exists(arquivo)
+                logging.warning(f"⚠️ Armazém: {tabela} {mes} não sincronizado ({e})"
+                                + ("; usando a cópia local" if existe else ""))
+                if isinstance(e, (CircuitoAberto, PrazoEsgotado)) and not existe:
+                    raise
+                return existe
+            sincronizados.inc(tabela, "ok")
+            return True
+
+    def garantir(self, params=None, margem: float = 0.0):
+        """
+        Deixa no disco (e frescos) todos os meses que o período pede. ArmazemIncompleto se faltar algum.
+        `margem`: arquivos que vencem em menos de `margem` segundos são baixados de novo (aquecimento).
+        """
+        params = _periodo(params)
+        escopo = str(params.get("enterpriseId") or "todas")
+        meses = _meses(params["startDate"], params["endDate"])
+        pendentes = [(tabela, m, escopo) for tabela in ("despesas", "receitas") for m in meses]
+        pendentes = [p for p in pendentes if not self._fresco(self._arquivo(*p), p[1], margem)]
+        if not pendentes:
+            return
+        with span("armazem.sincronizar"), ThreadPoolExecutor(
+                max_workers=min(sienge_financeiro.PARTICAO_PARALELO, len(pendentes))) as pool:
+            # Contexto (prazo, prioridade, span) capturado aqui, na thread de quem pediu
+            tarefa = propagar(self._sincronizar_mes)
+            resultados = list(pool.map(lambda p: tarefa(*p, margem), pendentes))
+        evento("armazem", "🗄️ Meses sincronizados", meses=len(pendentes), faltando=resultados.count(False))
+        if not all(resultados):
+            raise ArmazemIncompleto(f"{resultados.count(False)} mês(es) sem dados locais")
+
+    def prontos(self, params=None):
+        """(meses frescos no disco, meses que o período pede) — não chama o Sienge."""
+        params = _periodo(params)
+        escopo = str(params.get("enterpriseId") or "todas")
+        meses = _meses(params["startDate"], params["endDate"])
+        arquivos = [(self._arquivo(tabela, m, escopo), m) for tabela in ("despesas", "receitas") for m in meses]
+        return sum(self._fresco(a, m) for a, m in arquivos), len(arquivos)
+
+    # --- consultas ---------------------------------------------------------
+    def _conexao(self):
+        con = getattr(self._local, "con", None)
+        if con is None:
+            import duckdb
+            con = self._local.con = duckdb.connect()
+        return con
+
+    def _origem(self, tabela: str, escopo: str = None) -> str:
+        padrao = os.path.join(self.diretorio, tabela, *([f"escopo={escopo}"] if escopo else []), "mes=*", "*.parquet")
+        return f"read_parquet('{padrao}', hive_partitioning = true, hive_types = {{'mes': VARCHAR}}, union_by_name = true)"
+
+    def _filtros(self, params):
+        """(params, where, valores, escopo): o empreendimento já vem filtrado pelo escopo do arquivo."""
+        params = _periodo(params)
+        ini, fim = params["startDate"][:10], params["endDate"][:10]
+        where = "mes BETWEEN ? AND ? AND data_emissao BETWEEN ? AND ?"
+        escopo = str(params.get("enterpriseId") or "todas")
+        return params, where, [ini[:7], fim[:7], ini, fim], escopo
+
+    def _consultar(self, nome: str, sql: str, valores, df: bool = False):
+        inicio = time.perf_counter()
+        with span(f"armazem.{nome}"):
+            cursor = self._conexao().execute(sql, valores)
+            linhas = cursor.df() if df else cursor.fetchall()
+        consultas.observar(time.perf_counter() - inicio, nome)
+        return linhas
+
+    def resumo(self, params=None) -> dict:
+        """DRE do período: {"receitas", "despesas", "lucro", "titulos"}."""
+        self.garantir(params)
+        _, where, valores, escopo = self._filtros(params)
+        (despesas, titulos), = self._consultar(
+            "resumo",
+            f"SELECT coalesce(sum(valor), 0), count(*) FROM {self._origem('despesas', escopo)} WHERE {where}", valores)
+        (receitas,), = self._consultar(
+            "resumo", f"SELECT coalesce(sum(valor), 0) FROM {self._origem('receitas', escopo)} WHERE {where}", valores)
+        return {"receitas": receitas, "despesas": despesas, "lucro": receitas - despesas, "titulos": titulos}
+
+    def fatiar(self, dimensao: str, params=None, limite: int = None) -> list:
+        """[{dimensao: valor, "valor": total, "titulos": n}, ...] das despesas, do maior para o menor."""
+        if dimensao not in DIMENSOES:
+            raise ValueError(f"dimensão inválida: {dimensao}; use {', '.join(DIMENSOES)}")
+        self.garantir(params)
+        _, where, valores, escopo = self._filtros(params)
+        coluna = f"{dimensao}_ref" if dimensao in sienge_financeiro.LINKS_NOMES else dimensao
+        grupos = self._consultar(
+            f"por_{dimensao}",
+            f"SELECT {coluna}, sum(valor), count(*) FROM {self._origem('despesas', escopo)} "
+            f"WHERE {where} GROUP BY {coluna}",
+            valores)
+        totais = {}
+        for chave, valor, n in grupos:
+            if coluna != dimensao:
+                chave = sienge_financeiro.get_cached(chave)  # hrefs diferentes podem ter o mesmo nome
+            v, t = totais.get(chave, (0.0, 0))
+            totais[chave] = (v + valor, t + n)
+        ordenados = sorted(totais.items(), key=lambda kv: -kv[1][0])[:limite]
+        return [{dimensao: d, "valor": v, "titulos": n} for d, (v, n) in ordenados]
+
+    def despesas(self, params=None, nomes=()):
+        """
+        DataFrame das despesas do período com as colunas do relatório (valor_total,
+        data_vencimento, data_emissao, status, documento, tipo_lancamento) e os `nomes` pedidos.
+        """
+        self.garantir(params)
+        _, where, valores, escopo = self._filtros(params)
+        refs = "".join(f", {campo}_ref" for campo in nomes)
+        df = self._consultar(
+            "despesas",
+            f"SELECT valor AS valor_total, data_vencimento, data_emissao, status, documento, tipo_lancamento{refs} "
+            f"FROM {self._origem('despesas', escopo)} WHERE {where}", valores, df=True)
+        for campo in nomes:
+            refs = df.pop(f"{campo}_ref")
+            nomes_por_ref = {r: sienge_financeiro.get_cached(r) for r in refs.dropna().unique()}
+            df[campo] = refs.map(nomes_por_ref).fillna("N/A")
+        return df
+
+    def limpar(self):
+        import shutil
+        shutil.rmtree(self.diretorio, ignore_errors=True)
+
+
+armazem = Armazem()
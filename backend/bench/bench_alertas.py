@@ -0,0 +1,91 @@
+"""
+Motor de alertas (sienge_financeiro.detectar_alertas) sobre uma base grande.
+
+Uso (a partir de backend/):
+    python -m bench.bench_alertas --contas 100000 --repeticoes 5
+
+Gera as linhas de `todas_despesas` do tenant sintético direto em memória
+(como se tudo viesse das partições em cache), injeta anomalias conhecidas e
+mede a varredura completa. Confere se cada anomalia injetada foi apontada.
+"""
+import argparse
+import statistics
+import time
+from datetime import date, timedelta
+
+from bench.fake_sienge import TenantSintetico
+
+INJETADAS = {
+    "documento_duplicado": "NF-DUP-1",
+    "fora_da_curva_obra": "Obra 3",
+    "concentracao_fornecedor": "Fornecedor Concentrado",
+    "vencidos_obra": "Obra 7",
+}
+
+
+def gerar_despesas(contas: int):
+    tenant = TenantSintetico(contas=contas)
+    despesas = []
+    for i in range(contas):
+        c = tenant.conta(i, "")
+        despesas.append({
+            "empresa": f"Empresa {c['debtorId']}",
+            "fornecedor": f"Fornecedor {c['creditorId']}",
+            "centro_custo": f"Centro de Custo {i % tenant.centros + 1}",
+            "obra": f"Obra {i % tenant.obras + 1}",
+            "status": c["status"] if c["dueDate"] >= date.today().isoformat() else "PAID",
+            "valor_total": c["totalInvoiceAmount"],
+            "data_vencimento": c["dueDate"],
+            "data_emissao": c["issueDate"],
+            "descricao": c["notes"],
+            "documento": c["documentNumber"] + f"-{i}",
+            "tipo_lancamento": c["originId"],
+        })
+    modelo = dict(despesas[0])
+    hoje = date.today()
+    # Duplicidade, valor absurdo numa obra, fornecedor dominante, vencidos acumulados
+    despesas += [{**modelo, "documento": "NF-DUP-1", "valor_total": 12345.67} for _ in range(2)]
+    despesas.append({**modelo, "obra": "Obra 3", "valor_total": 9_000_000.0})
+    despesas += [{**modelo, "fornecedor": "Fornecedor Concentrado", "valor_total": 400_000.0,
+                  "documento": f"C-{k}"} for k in range(contas // 100)]
+    despesas += [{**modelo, "obra": "Obra 7", "status": "OPEN", "valor_total": 50_000.0, "documento": f"V-{k}",
+                  "data_vencimento": (hoje - timedelta(days=90 + k)).isoformat()} for k in range(40)]
+    return despesas
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--contas", type=int, default=100000)
+    parser.add_argument("--repeticoes", type=int, default=5)
+    args = parser.parse_args()
+
+    from sienge.sienge_financeiro import detectar_alertas, quadro_alertas, resumo_alertas
+
+    t0 = time.perf_counter()
+    despesas = gerar_despesas(args.contas)
+    print(f"🧪 {len(despesas)} despesas sintéticas geradas em {time.perf_counter() - t0:.1f}s")
+
+    import pandas  # noqa: F401  (import fora da medição, como no processo já aquecido)
+    detectar_alertas(despesas[:1000])
+
+    # quadro = linhas (dicts) → colunas; varredura = as regras sobre as colunas
+    quadro, varredura = [], []
+    for _ in range(args.repeticoes):
+        t0 = time.perf_counter()
+        df = quadro_alertas(despesas)
+        t1 = time.perf_counter()
+        alertas = detectar_alertas(df)
+        quadro.append((t1 - t0) * 1000)
+        varredura.append((time.perf_counter() - t1) * 1000)
+    for nome, tempos in (("quadro", quadro), ("varredura", varredura)):
+        print(f"▶ {nome:<9} mediana {statistics.median(tempos):6.0f} ms | min {min(tempos):6.0f} ms")
+    print(f"   {len(alertas)} alertas")
+
+    for tipo, alvo in INJETADAS.items():
+        achou = any(a["tipo"] == tipo and alvo in a["mensagem"] for a in alertas)
+        print(f"   {'✅' if achou else '❌'} {tipo}: {alvo}")
+    print("\n" + resumo_alertas(alertas))
+
+
+if __name__ == "__main__":
+    main()
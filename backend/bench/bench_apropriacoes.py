@@ -0,0 +1,66 @@
+"""
+Relatório completo (com apropriações) com o cache persistente de apropriações.
+
+Uso (a partir de backend/):
+    python -m bench.bench_apropriacoes --contas 3000 --latencia-ms 10
+
+Passos (Sienge local):
+  frio        tudo zerado: um budget-categories por título
+  quente      partições zeradas (listagens de novo), nomes e SQLite mantidos
+  reinício    caches em memória zerados, SQLite mantido (como um deploy)
+  alterados   idem, com --alterados títulos cujo marcador mudou no Sienge
+Mostra tempo, chamadas por endpoint e o tamanho do arquivo.
+"""
+import argparse
+import os
+import time
+
+from bench.bench_sienge import limpar_caches, preparar_ambiente
+from bench.fake_sienge import FakeSienge, TenantSintetico
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--contas", type=int, default=3000)
+    parser.add_argument("--latencia-ms", type=float, default=10)
+    parser.add_argument("--alterados", type=int, default=50)
+    args = parser.parse_args()
+
+    fake = FakeSienge(TenantSintetico(contas=args.contas), latencia_ms=args.latencia_ms)
+    fake.iniciar()
+    preparar_ambiente(fake, 1000)
+
+    from sienge import sienge_financeiro
+    cache = sienge_financeiro._cache_apropriacoes
+
+    def relatorio(rotulo):
+        fake.zerar()
+        t0 = time.perf_counter()
+        rel = sienge_financeiro.gerar_relatorio_json({"enterpriseId": 1})
+        ms = (time.perf_counter() - t0) * 1000
+        est = fake.estatisticas()
+        print(f"▶ {rotulo:<10} {ms:9.1f} ms | {rel['total_registros']:5d} títulos | "
+              f"{est.get('budget-categories', 0):5d} budget-categories | {est.get('total', 0):5d} chamadas")
+
+    limpar_caches()
+    relatorio("frio")
+    sienge_financeiro.limpar_particoes()
+    relatorio("quente")
+    sienge_financeiro._cache.clear()
+    sienge_financeiro.limpar_particoes()
+    relatorio("reinício")
+
+    # Simula títulos alterados no Sienge: o marcador guardado deixa de bater
+    cache._conexao().execute(
+        "UPDATE apropriacoes SET marcador = 'alterado' WHERE bill_id IN "
+        "(SELECT bill_id FROM apropriacoes ORDER BY bill_id LIMIT ?)", (args.alterados,))
+    sienge_financeiro._cache.clear()
+    sienge_financeiro.limpar_particoes()
+    relatorio("alterados")
+    tamanho = sum(os.path.getsize(cache.caminho + sufixo) for sufixo in ("", "-wal") if os.path.exists(cache.caminho + sufixo))
+    print(f"💾 {len(cache)} títulos no cache, {tamanho / 1024:.0f} KiB em {cache.caminho}")
+    fake.parar()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Primeiro "resumo" do dia com e sem o aquecimento de relatórios.
+
+Uso (a partir de backend/):
+    python -m bench.bench_aquecimento --contas 20000 --latencia-ms 30
+
+Passos (Sienge local, caches zerados):
+  frio        resumo / gastos por obra para a empresa 1 sem aquecimento
+  rodada      uma rodada do aquecedor (padrão, cada empresa no ano, filtros aprendidos)
+  quente      os mesmos pedidos logo depois da rodada
+  renovação   segunda rodada: só o que venceria antes da próxima é rebaixado
+Mostra tempo, chamadas ao Sienge e a cobertura que o /prontidao reportaria.
+"""
+import argparse
+import time
+
+from bench.bench_sienge import limpar_caches, preparar_ambiente
+from bench.fake_sienge import FakeSienge, TenantSintetico
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--contas", type=int, default=20000)
+    parser.add_argument("--latencia-ms", type=float, default=30)
+    args = parser.parse_args()
+
+    fake = FakeSienge(TenantSintetico(contas=args.contas), latencia_ms=args.latencia_ms)
+    fake.iniciar()
+    preparar_ambiente(fake, 1000)
+
+    import main as app_main
+    from aquecimento import aquecedor
+
+    # Um usuário que sempre olha a empresa 1 no período padrão
+    app_main.atualizar_filtros("bench-aquecimento", {"enterpriseId": 1})
+    filtros = app_main.filtros_do_usuario("bench-aquecimento")
+
+    def pedir(rotulo):
+        for nome, fn in (("resumo", app_main.resumo_financeiro), ("obras", app_main.gastos_por_obra)):
+            fake.zerar()
+            t0 = time.perf_counter()
+            fn(**filtros)
+            ms = (time.perf_counter() - t0) * 1000
+            print(f"▶ {rotulo:<10} {nome:<7} {ms:9.1f} ms | {fake.estatisticas().get('total', 0):4d} chamadas")
+
+    def rodada(rotulo):
+        fake.zerar()
+        t0 = time.perf_counter()
+        aquecedor.rodada()
+        ms = (time.perf_counter() - t0) * 1000
+        estado = aquecedor.estado()
+        print(f"🔥 {rotulo:<10} {ms:9.1f} ms | {fake.estatisticas().get('total', 0):4d} chamadas | "
+              f"{len(estado['conjuntos'])} conjuntos | cobertura {estado['cobertura']:.0%}")
+
+    limpar_caches()
+    pedir("frio")
+    limpar_caches()
+    rodada("rodada")
+    pedir("quente")
+    rodada("renovação")
+    fake.parar()
+
+
+if __name__ == "__main__":
+    main()
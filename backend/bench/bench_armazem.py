@@ -0,0 +1,73 @@
+"""
+Resumo / gastos / alertas pelo armazém local (Parquet + DuckDB) contra o relatório direto.
+
+Uso (a partir de backend/):
+    python -m bench.bench_armazem --contas 100000 --anos 3
+
+Sobe o Sienge local com `--contas` títulos espalhados por `--anos` anos e mede,
+para a empresa 1 no período inteiro:
+  relatório   gerar_relatorio_json com partições em memória (frio e quente)
+  armazém     primeira sincronização, depois as consultas SQL com os arquivos prontos
+e um fatiamento sem código novo (por fornecedor, status e mês).
+"""
+import argparse
+import os
+import time
+from datetime import date, timedelta
+
+from bench.bench_sienge import limpar_caches, preparar_ambiente
+from bench.fake_sienge import FakeSienge, TenantSintetico
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--contas", type=int, default=100000)
+    parser.add_argument("--anos", type=int, default=3)
+    parser.add_argument("--latencia-ms", type=float, default=10)
+    args = parser.parse_args()
+
+    dias = 365 * args.anos
+    inicio = date.today() - timedelta(days=dias)
+    tenant = TenantSintetico(contas=args.contas, dias=dias)
+    fake = FakeSienge(tenant, latencia_ms=args.latencia_ms)
+    fake.iniciar()
+    preparar_ambiente(fake, 1000)
+
+    from armazem import armazem
+    from sienge import sienge_financeiro
+
+    filtros = {"enterpriseId": "1", "startDate": inicio.isoformat(), "endDate": date.today().isoformat()}
+
+    def medir(rotulo, fn):
+        fake.zerar()
+        t0 = time.perf_counter()
+        saida = fn()
+        ms = (time.perf_counter() - t0) * 1000
+        print(f"▶ {rotulo:<28} {ms:10.1f} ms | {fake.estatisticas().get('total', 0):5d} chamadas")
+        return saida
+
+    print(f"🧪 {args.contas} títulos em {args.anos} anos, empresa 1, Sienge {args.latencia_ms:.0f} ms")
+    limpar_caches()
+    rel = medir("relatório frio (dre+obras)",
+                lambda: sienge_financeiro.gerar_relatorio_json(dict(filtros), campos={"dre", "por_obra"}))
+    medir("relatório quente", lambda: sienge_financeiro.gerar_relatorio_json(dict(filtros), campos={"dre", "por_obra"}))
+    medir("relatório alertas", lambda: sienge_financeiro.alertas_financeiros(dict(filtros)))
+
+    medir("armazém sincronização", lambda: armazem.garantir(filtros))
+    dre = medir("armazém resumo", lambda: armazem.resumo(filtros))
+    obras = medir("armazém gastos por obra", lambda: armazem.fatiar("obra", filtros))
+    despesas = medir("armazém despesas (alertas)", lambda: armazem.despesas(filtros, ("fornecedor", "obra")))
+    medir("armazém alertas", lambda: sienge_financeiro.detectar_alertas(despesas))
+    for dimensao in ("fornecedor", "status", "mes"):
+        medir(f"armazém por {dimensao}", lambda: armazem.fatiar(dimensao, filtros, limite=10))
+
+    iguais = (round(dre["despesas"], 2) == round(rel["dre"]["valores"]["despesas"], 2)
+              and [round(o["valor"], 2) for o in obras] == [round(o["valor"], 2) for o in rel["por_obra"]])
+    tamanho = sum(os.path.getsize(os.path.join(raiz, f)) for raiz, _, arquivos in os.walk(armazem.diretorio)
+                  for f in arquivos)
+    print(f"{'✅' if iguais else '❌'} totais iguais ao relatório | 💾 {tamanho / 1024 / 1024:.1f} MiB em {armazem.diretorio}")
+    fake.parar()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+GETs idênticos simultâneos ao Sienge com e sem coalescência.
+
+Uso (a partir de backend/):
+    python -m bench.bench_coalescer --concorrencia 16 --latencia-ms 30
+
+Cenários (todas as chamadas disparadas juntas, caches zerados):
+  cpf        N threads buscando o mesmo cliente (/customers?cpf=)
+  pedidos    N threads listando pedidos pendentes
+  entidade   N threads resolvendo o mesmo href no get_cached
+  async      N corrotinas com sienge_request_async na mesma URL
+Para cada um: chamadas ao Sienge, coalescidas e tempo total, com SIENGE_COALESCER ligado e desligado.
+"""
+import argparse
+import asyncio
+import threading
+import time
+
+from bench.bench_sienge import limpar_caches, preparar_ambiente
+from bench.fake_sienge import FakeSienge, TenantSintetico
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--concorrencia", type=int, default=16)
+    parser.add_argument("--latencia-ms", type=float, default=30)
+    args = parser.parse_args()
+
+    tenant = TenantSintetico(contas=100)
+    fake = FakeSienge(tenant, latencia_ms=args.latencia_ms)
+    fake.iniciar()
+    preparar_ambiente(fake, 1000)
+
+    from sienge import sienge_financeiro, sienge_http
+    from sienge.sienge_clientes import buscar_cliente_por_cpf
+    from sienge.sienge_pedidos import listar_pedidos_pendentes
+
+    cpf = tenant.cpf_do_cliente(7)
+    href = f"{sienge_http.BASE_URL}/creditors/3"
+
+    def juntos(fn):
+        barreira = threading.Barrier(args.concorrencia)
+
+        def _um():
+            barreira.wait()
+            fn()
+
+        threads = [threading.Thread(target=_um) for _ in range(args.concorrencia)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+    async def _corrotinas():
+        await asyncio.gather(*(sienge_http.sienge_request_async("GET", href, timeout=20)
+                               for _ in range(args.concorrencia)))
+
+    cenarios = {
+        "cpf": lambda: juntos(lambda: buscar_cliente_por_cpf(cpf)),
+        "pedidos": lambda: juntos(listar_pedidos_pendentes),
+        "entidade": lambda: juntos(lambda: sienge_financeiro.get_cached(href)),
+        "async": lambda: asyncio.run(_corrotinas()),
+    }
+
+    buscar_cliente_por_cpf(cpf)  # aquece a conexão
+    print(f"🧪 {args.concorrencia} chamadas simultâneas, Sienge {args.latencia_ms:.0f} ms")
+    for nome, fn in cenarios.items():
+        for ligado in (False, True):
+            sienge_http.SIENGE_COALESCER = ligado
+            limpar_caches()
+            fake.zerar()
+            antes = sum(sienge_http.coalescidos._valores.values())
+            t0 = time.perf_counter()
+            fn()
+            ms = (time.perf_counter() - t0) * 1000
+            juntas = sum(sienge_http.coalescidos._valores.values()) - antes
+            print(f"▶ {nome:<10} {'ligado' if ligado else 'desligado':<9} {ms:9.1f} ms | "
+                  f"{fake.estatisticas().get('total', 0):5d} chamadas | {juntas:5.0f} coalescidas")
+    fake.parar()
+
+
+if __name__ == "__main__":
+    main()
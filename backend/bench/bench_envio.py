@@ -0,0 +1,92 @@
+"""
+Envio de respostas de WhatsApp: inline (como era) × despachante em segundo plano.
+
+Uso (a partir de backend/):
+    python -m bench.bench_envio --mensagens 200 --destinos 20 --latencia-ms 150
+    python -m bench.bench_envio --taxa-429 0.1        # com novas tentativas
+
+inline       requests.post sem sessão, na thread do webhook (uma conexão nova por envio)
+despachante  envio.despachante.enviar(...) — só enfileira; entrega com pool + retries
+
+Mostra o tempo que o webhook fica preso por mensagem, o tempo até a última
+entrega e confere se cada destino recebeu as mensagens na ordem.
+"""
+import argparse
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from bench.fake_sienge import FakeSienge, TenantSintetico
+
+
+def _requisicao(base, destino, texto):
+    return {
+        "method": "POST",
+        "url": f"{base}/meta/bench/messages",
+        "headers": {"Authorization": "Bearer bench"},
+        "json": {"messaging_product": "whatsapp", "to": destino, "type": "text", "text": {"body": texto}},
+    }
+
+
+def _em_ordem(envios, destinos):
+    por_destino = {}
+    for _servico, destino, texto in envios:
+        por_destino.setdefault(destino, []).append(int(texto.split("#")[1]))
+    return all(seq == sorted(seq) for seq in por_destino.values()) and len(por_destino) == destinos
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mensagens", type=int, default=200)
+    parser.add_argument("--destinos", type=int, default=20)
+    parser.add_argument("--latencia-ms", type=float, default=150.0)
+    parser.add_argument("--taxa-429", type=float, default=0.0)
+    parser.add_argument("--webhooks", type=int, default=8, help="webhooks simultâneos")
+    args = parser.parse_args()
+
+    fake = FakeSienge(TenantSintetico(), latencia_ms=args.latencia_ms, taxa_429=args.taxa_429)
+    fake.iniciar()
+    base = fake.mensageria_url
+    from envio import despachante, envio_resultados
+
+    roteiro = [(f"55919{i % args.destinos:06d}", f"resposta #{i}") for i in range(args.mensagens)]
+    print(f"📤 {args.mensagens} respostas para {args.destinos} destinos | latência {args.latencia_ms} ms | "
+          f"429 {args.taxa_429:.0%} | {args.webhooks} webhooks simultâneos")
+
+    def _inline(m):
+        t0 = time.perf_counter()
+        try:
+            kw = _requisicao(base, *m)
+            requests.request(kw.pop("method"), kw.pop("url"), **kw)
+        except requests.RequestException:
+            pass
+        return time.perf_counter() - t0
+
+    def _enfileirar(m):
+        t0 = time.perf_counter()
+        despachante.enviar("meta", m[0], _requisicao(base, *m))
+        return time.perf_counter() - t0
+
+    for nome, fn in (("inline", _inline), ("despachante", _enfileirar)):
+        fake.zerar()
+        inicio = time.perf_counter()
+        # um destino por webhook de cada vez, como o WhatsApp entrega
+        with ThreadPoolExecutor(max_workers=args.webhooks) as pool:
+            presos = list(pool.map(fn, roteiro))
+        despachante.aguardar(timeout=600)
+        total = time.perf_counter() - inicio
+        entregues = len(fake.envios)
+        print(f"▶ {nome:<12} webhook preso p50 {statistics.median(presos) * 1000:8.2f} ms | "
+              f"máx {max(presos) * 1000:8.2f} ms | última entrega em {total:6.2f} s | "
+              f"entregues {entregues}/{args.mensagens} | ordem por destino: "
+              f"{'ok' if _em_ordem(fake.envios, args.destinos) else 'FORA DE ORDEM'}")
+
+    print(f"   despachante: ok={envio_resultados.valor('meta', 'ok'):.0f} "
+          f"falha={envio_resultados.valor('meta', 'falha'):.0f} 429 simulados={fake.estatisticas().get('429', 0)}")
+    fake.parar()
+
+
+if __name__ == "__main__":
+    main()
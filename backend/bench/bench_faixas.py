@@ -0,0 +1,99 @@
+"""
+Latência das intenções baratas enquanto relatórios pesados rodam.
+
+Uso (a partir de backend/):
+    python -m bench.bench_faixas --segundos 10 --pesados 4
+
+Sobe o Sienge local + a API (uvicorn) e, por alguns segundos, mantém
+`--pesados` usuários pedindo "análise financeira" sem parar enquanto um
+usuário de sonda manda "oi", "itens do pedido 1001" e "boleto 7 1".
+Compara três modos:
+  sem carga     só a sonda
+  compartilhada todas as intenções num único pool (mesmo total de threads)
+  faixas        faixas leve/media/pesada (faixas.escalonador)
+Mostra p50/p99 da sonda e quantos pedidos pesados terminaram ou foram recusados.
+"""
+import argparse
+import threading
+import time
+
+import requests
+
+from bench.bench_sienge import percentil, preparar_ambiente, subir_api
+from bench.fake_sienge import FakeSienge, TenantSintetico
+
+SONDA = ("oi", "itens do pedido 1001", "boleto 7 1")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--segundos", type=float, default=10)
+    parser.add_argument("--pesados", type=int, default=4)
+    parser.add_argument("--latencia-ms", type=float, default=20)
+    parser.add_argument("--taxa-sienge", type=float, default=150)
+    args = parser.parse_args()
+
+    fake = FakeSienge(TenantSintetico(contas=3000, clientes=50, pedidos_pendentes=8), latencia_ms=args.latencia_ms)
+    fake.iniciar()
+    preparar_ambiente(fake, args.taxa_sienge)
+    servidor, url = subir_api()
+
+    import faixas
+    import main as app_main
+
+    por_faixas = app_main.escalonador
+    total = sum(f.workers for f in por_faixas.faixas.values())
+    unica = faixas.Faixa("unica", total, 64, 1000)
+    compartilhada = faixas.Escalonador({"unica": unica}, custo={}, padrao="unica")
+
+    def falar(sessao, usuario, texto):
+        t0 = time.perf_counter()
+        r = sessao.post(f"{url}/mensagem", json={"user": usuario, "text": texto}, timeout=300)
+        r.raise_for_status()
+        return time.perf_counter() - t0, r.json().get("text", "")
+
+    def rodada(nome, escalonador, pesados):
+        app_main.escalonador = escalonador
+        parar = threading.Event()
+        placar = {"ok": 0, "recusado": 0}
+        lock = threading.Lock()
+
+        def pesado(k):
+            s = requests.Session()
+            falar(s, f"pesado-{k}", f"empresa {k % 3 + 1}")
+            while not parar.is_set():
+                _, texto = falar(s, f"pesado-{k}", "análise financeira")
+                with lock:
+                    placar["recusado" if texto.startswith("⏳") else "ok"] += 1
+
+        threads = [threading.Thread(target=pesado, args=(k,), daemon=True) for k in range(pesados)]
+        for t in threads:
+            t.start()
+        time.sleep(0.5 if pesados else 0)
+
+        s = requests.Session()
+        latencias = []
+        fim = time.monotonic() + args.segundos
+        i = 0
+        while time.monotonic() < fim:
+            dur, _ = falar(s, "sonda", SONDA[i % len(SONDA)])
+            latencias.append(dur * 1000)
+            i += 1
+        parar.set()
+        for t in threads:
+            t.join()
+        print(f"▶ {nome:<13} sonda p50 {percentil(latencias, .5):8.1f} ms | p99 {percentil(latencias, .99):8.1f} ms"
+              f" | máx {max(latencias):8.1f} ms | {len(latencias)} msgs"
+              + (f" | pesados ok {placar['ok']} recusados {placar['recusado']}" if pesados else ""))
+
+    print(f"🧪 {args.pesados} usuários pedindo análise sem parar, {args.segundos:.0f}s por modo, "
+          f"Sienge {args.latencia_ms:.0f} ms / {args.taxa_sienge:.0f} req/s")
+    rodada("sem carga", por_faixas, 0)
+    rodada("compartilhada", compartilhada, args.pesados)
+    rodada("faixas", por_faixas, args.pesados)
+    servidor.should_exit = True
+    fake.parar()
+
+
+if __name__ == "__main__":
+    main()
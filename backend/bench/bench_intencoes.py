@@ -0,0 +1,62 @@
+"""
+Micro-benchmark do motor de intenções.
+
+Uso (a partir de backend/):
+    python -m bench.bench_intencoes [--repeticoes 2000]
+
+Mede a latência de classificação (p50/p99 por mensagem) sobre o corpus
+bench/corpus_intencoes.jsonl e a acurácia contra a ação esperada.
+"""
+import argparse
+import json
+import os
+import statistics
+import time
+
+from intencoes import classificar
+
+CORPUS = os.path.join(os.path.dirname(__file__), "corpus_intencoes.jsonl")
+
+
+def carregar_corpus(caminho: str = CORPUS):
+    with open(caminho, encoding="utf-8") as f:
+        return [json.loads(l) for l in f if l.strip()]
+
+
+def percentil(valores, p):
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * p))]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeticoes", type=int, default=2000)
+    parser.add_argument("--corpus", default=CORPUS)
+    args = parser.parse_args()
+
+    corpus = carregar_corpus(args.corpus)
+
+    erros = []
+    for caso in corpus:
+        obtida = classificar(caso["texto"])["acao"]
+        if obtida != caso["acao"]:
+            erros.append((caso["texto"], caso["acao"], obtida))
+
+    amostras = []
+    for _ in range(args.repeticoes):
+        for caso in corpus:
+            t0 = time.perf_counter_ns()
+            classificar(caso["texto"])
+            amostras.append(time.perf_counter_ns() - t0)
+
+    print(f"📚 Corpus: {len(corpus)} mensagens x {args.repeticoes} repetições")
+    print(f"🎯 Acurácia: {len(corpus) - len(erros)}/{len(corpus)} ({100 * (1 - len(erros) / len(corpus)):.1f}%)")
+    print(f"⏱️ Latência: média {statistics.mean(amostras) / 1000:.1f} µs | "
+          f"p50 {percentil(amostras, .50) / 1000:.1f} µs | p99 {percentil(amostras, .99) / 1000:.1f} µs")
+    for texto, esperada, obtida in erros:
+        print(f"❌ {texto!r}: esperado {esperada}, obtido {obtida}")
+    return 1 if erros else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
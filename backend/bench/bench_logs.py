@@ -0,0 +1,170 @@
+"""
+Custo dos logs na thread da requisição: antes (logging síncrono, payload
+formatado em INFO) e depois (log_estruturado: fila + amostragem + DEBUG).
+
+Uso (a partir de backend/):
+    python -m bench.bench_logs --repeticoes 2000
+    python -m bench.bench_logs --saida /var/log/constru.log   # disco de verdade
+
+Cenários (reproduzem as chamadas de antes, linha a linha):
+    webhook   payload da Meta inteiro + mensagem + resposta da Cloud API
+    boletos   um CPF com 6 títulos × 4 parcelas (parcela, r.text[:400], resultado...)
+    pedidos   PUT de autorização com body
+
+Mede o tempo na thread chamadora por operação (µs). A escrita em si, no modo
+assíncrono, acontece depois na thread do QueueListener.
+"""
+import argparse
+import json
+import logging
+import os
+import statistics
+import tempfile
+import time
+
+import log_estruturado
+from log_estruturado import ativo, configurar_logs, encerrar_logs, evento
+
+PAYLOAD_META = {
+    "object": "whatsapp_business_account",
+    "entry": [{
+        "id": "1234567890",
+        "changes": [{
+            "field": "messages",
+            "value": {
+                "messaging_product": "whatsapp",
+                "metadata": {"display_phone_number": "559100000000", "phone_number_id": "987654321"},
+                "contacts": [{"profile": {"name": "Fulano de Tal"}, "wa_id": "559193808761"}],
+                "messages": [{
+                    "from": "559193808761", "id": "wamid.HBgMNTU5MTkzODA4NzYxFQIAEhgg" * 2,
+                    "timestamp": "1718000000", "type": "text",
+                    "text": {"body": "quero a segunda via do boleto de março, por favor"},
+                }],
+            },
+        }],
+    }],
+}
+PARCELA = {"id": 3, "installmentId": 3, "balanceDue": 1523.77, "dueDate": "2024-03-10",
+           "originalValue": 1523.77, "indexerId": 1, "paymentTerm": {"id": "PM", "description": "Parcela mensal"}}
+RESPOSTA_BOLETO = json.dumps({"results": [{"urlReport": "https://api.sienge.com.br/boleto/" + "x" * 80,
+                                           "digitableNumber": "34191.79001 01043.510047 91020.150008 8 9" * 3}]})
+
+
+# --- como era ---------------------------------------------------------------
+def webhook_antes():
+    logging.info(f"📲 Webhook WhatsApp recebido: {PAYLOAD_META}")
+    logging.info(f"📩 Mensagem recebida: whatsapp:559193808761 -> {'quero a segunda via'}")
+    logging.info(f"📤 Enviando mensagem Cloud API → 559193808761: {'resposta ' * 40}")
+    logging.info(f"Resposta Meta: 200 - {RESPOSTA_BOLETO}")
+
+
+def boletos_antes():
+    for titulo in range(6):
+        logging.info(f"🧾 Título {titulo} | Valor 1000.0 | Descrição: Contrato {titulo}")
+        logging.info(f"📦 Parcelas do título {titulo}: 4")
+        for parcela in range(4):
+            logging.info(f"🧩 Parcela -> {PARCELA}")
+            logging.info(f"🔍 Testando boleto título={titulo}, parcela={parcela}, valor={PARCELA['balanceDue']}")
+            logging.info(f"🔎 Verificando boleto: {{'billReceivableId': {titulo}, 'installmentId': {parcela}}} -> 200")
+            logging.info(f"Resposta: {RESPOSTA_BOLETO[:400]}")
+            logging.info(f"Resultado da verificação -> {'🟢 Existe'}")
+
+
+def pedidos_antes():
+    url = "https://api.sienge.com.br/x/public/api/v1/purchase-orders/1001/authorize"
+    logging.info("%s -> %s | body=%s", url, 204, {"observation": "aprovado pelo chat"})
+
+
+# --- como ficou --------------------------------------------------------------
+def webhook_depois():
+    evento("whatsapp.payload", "📲 Webhook WhatsApp recebido", nivel=logging.DEBUG, payload=PAYLOAD_META)
+    evento("whatsapp", "📲 Mensagem recebida", de="559193808761")
+    evento("chat", "📩 Mensagem recebida", usuario="whatsapp:559193808761", texto="quero a segunda via")
+    evento("whatsapp", "📤 Mensagem enviada pela Cloud API", para="559193808761", status=200)
+    if ativo("whatsapp.payload", logging.DEBUG):
+        evento("whatsapp.payload", "Resposta Meta", nivel=logging.DEBUG, corpo="resposta " * 40, resposta=RESPOSTA_BOLETO)
+
+
+def boletos_depois():
+    for titulo in range(6):
+        evento("sienge.boletos", "🧾 Título", nivel=logging.DEBUG, titulo=titulo, valor=1000.0, parcelas=4)
+        for parcela in range(4):
+            if ativo("sienge.boletos", logging.DEBUG):
+                evento("sienge.boletos", "🔎 Verificando boleto", nivel=logging.DEBUG,
+                       titulo=titulo, parcela=parcela, status=200, resposta=RESPOSTA_BOLETO[:400])
+            evento("sienge.boletos", "🔍 Parcela verificada", nivel=logging.DEBUG,
+                   titulo=titulo, parcela=parcela, saldo=PARCELA["balanceDue"], existe=True)
+    evento("sienge.boletos", "✅ Cliente encontrado", cliente=7, nome="Cliente 7", titulos=6)
+
+
+def pedidos_depois():
+    url = "https://api.sienge.com.br/x/public/api/v1/purchase-orders/1001/authorize"
+    evento("sienge.pedidos", "PATCH", url=url, status=204)
+    evento("sienge.pedidos", "PATCH body", nivel=logging.DEBUG, url=url, observacao="aprovado pelo chat")
+
+
+CENARIOS = {
+    "webhook": (webhook_antes, webhook_depois),
+    "boletos": (boletos_antes, boletos_depois),
+    "pedidos": (pedidos_antes, pedidos_depois),
+}
+
+
+def _medir(fn, repeticoes):
+    duracoes = []
+    for _ in range(repeticoes):
+        t0 = time.perf_counter()
+        fn()
+        duracoes.append(time.perf_counter() - t0)
+    duracoes.sort()
+    return statistics.median(duracoes) * 1e6, duracoes[int(len(duracoes) * .99)] * 1e6
+
+
+def _modo_antes(stream):
+    raiz = logging.getLogger()
+    encerrar_logs()
+    for h in list(raiz.handlers):
+        raiz.removeHandler(h)
+    h = logging.StreamHandler(stream)
+    h.setFormatter(logging.Formatter(logging.BASIC_FORMAT))
+    raiz.addHandler(h)
+    raiz.setLevel(logging.INFO)
+
+
+def _modo_depois(stream, nivel_payload="INFO"):
+    for nome in ("constru.whatsapp.payload", "constru.sienge.boletos", "constru.sienge.pedidos"):
+        logging.getLogger(nome).setLevel(logging.NOTSET)
+    os.environ["LOG_NIVEL"] = nivel_payload
+    configurar_logs(stream=stream)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeticoes", type=int, default=2000)
+    parser.add_argument("--saida", help="arquivo de log (padrão: temporário)")
+    args = parser.parse_args()
+
+    caminho = args.saida or os.path.join(tempfile.mkdtemp(), "bench_logs.log")
+    with open(caminho, "a", encoding="utf-8") as stream:
+        print(f"🧪 {args.repeticoes} operações por cenário | log em {caminho}")
+        print(f"{'cenário':<10} {'modo':<22} {'p50 µs':>9} {'p99 µs':>9}")
+        for nome, (antes, depois) in CENARIOS.items():
+            _modo_antes(stream)
+            p50, p99 = _medir(antes, args.repeticoes)
+            print(f"{nome:<10} {'antes (síncrono)':<22} {p50:9.1f} {p99:9.1f}")
+
+            _modo_depois(stream)
+            p50, p99 = _medir(depois, args.repeticoes)
+            print(f"{nome:<10} {'depois (fila, INFO)':<22} {p50:9.1f} {p99:9.1f}")
+
+            _modo_depois(stream, "DEBUG")
+            p50, p99 = _medir(depois, args.repeticoes)
+            print(f"{nome:<10} {'depois (fila, DEBUG)':<22} {p50:9.1f} {p99:9.1f}")
+            encerrar_logs()
+
+        descartes = sum(log_estruturado._descartados._valores.values())
+        print(f"🗑️ registros descartados (fila cheia/amostragem): {descartes:.0f}")
+
+
+if __name__ == "__main__":
+    main()
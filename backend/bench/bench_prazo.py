@@ -0,0 +1,72 @@
+"""
+Tempo de resposta com o Sienge lento, com e sem o prazo por mensagem.
+
+Uso (a partir de backend/):
+    python -m bench.bench_prazo --contas 1500 --latencia-ms 300 --prazo-media 4 --prazo-pesada 8
+
+Sobe o Sienge local (e a OpenAI falsa) com `--latencia-ms` por chamada, a
+API num uvicorn e manda, sempre com os caches zerados, "gastos por obra"
+e "análise financeira":
+  sem prazo   PRAZO desligado: a resposta sai quando o Sienge terminar
+  com prazo   prazos das faixas de --prazo-leve/--prazo-media/--prazo-pesada
+Mostra o tempo de cada resposta, as partes que ficaram de fora e o começo do texto.
+"""
+import argparse
+import os
+import time
+
+import requests
+
+from bench.bench_sienge import limpar_caches, preparar_ambiente, subir_api
+from bench.fake_sienge import FakeSienge, TenantSintetico
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--contas", type=int, default=1500)
+    parser.add_argument("--latencia-ms", type=float, default=300)
+    parser.add_argument("--prazo-leve", type=float, default=3)
+    parser.add_argument("--prazo-media", type=float, default=4)
+    parser.add_argument("--prazo-pesada", type=float, default=8)
+    parser.add_argument("--reserva-ia", type=float, default=2)
+    args = parser.parse_args()
+
+    fake = FakeSienge(TenantSintetico(contas=args.contas), latencia_ms=args.latencia_ms)
+    fake.iniciar()
+    preparar_ambiente(fake, 1000)
+    os.environ.setdefault("ARMAZEM", "0")  # mede o caminho que depende do Sienge a cada pedido
+    os.environ.setdefault("PRAZO_LEVE", str(args.prazo_leve))
+    os.environ.setdefault("PRAZO_MEDIA", str(args.prazo_media))
+    os.environ.setdefault("PRAZO_PESADA", str(args.prazo_pesada))
+    os.environ.setdefault("PRAZO_RESERVA_IA", str(args.reserva_ia))
+    servidor, url = subir_api()
+
+    import prazo
+
+    mensagens = ("gastos por obra", "análise financeira")
+    sessao = requests.Session()
+
+    def rodada(nome, ligado):
+        prazo.PRAZO = ligado
+        for texto in mensagens:
+            limpar_caches()
+            fake.zerar()
+            t0 = time.perf_counter()
+            r = sessao.post(f"{url}/mensagem", json={"user": f"bench-{nome}", "text": texto}, timeout=600)
+            r.raise_for_status()
+            ms = (time.perf_counter() - t0) * 1000
+            corpo = r.json()
+            primeira = (corpo.get("text") or "").strip().splitlines()[0][:60]
+            print(f"▶ {nome:<9} {texto[:22]:<22} {ms:9.1f} ms | {fake.estatisticas().get('total', 0):5d} chamadas"
+                  f" | parcial {','.join(corpo.get('parcial', [])) or '-':<18} | {primeira}")
+
+    print(f"🧪 {args.contas} títulos, Sienge {args.latencia_ms:.0f} ms/chamada, prazos "
+          f"{args.prazo_leve:.0f}/{args.prazo_media:.0f}/{args.prazo_pesada:.0f} s (leve/media/pesada)")
+    rodada("sem prazo", False)
+    rodada("com prazo", True)
+    servidor.should_exit = True
+    fake.parar()
+
+
+if __name__ == "__main__":
+    main()
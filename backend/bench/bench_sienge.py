@@ -0,0 +1,180 @@
+"""
+Benchmarks contra o Sienge local (bench/fake_sienge.py).
+
+Uso (a partir de backend/):
+    python -m bench.bench_sienge --contas 20000 --latencia-ms 30 --repeticoes 5
+    python -m bench.bench_sienge --cenarios relatorio,mensagem --concorrencia 4 --taxa-429 0.02
+
+Cenários:
+    relatorio  gerar_relatorio_json para a empresa 1 no período padrão
+    boletos    buscar_boletos_por_cpf para clientes sintéticos
+    pedidos    listar_pedidos_pendentes
+    mensagem   POST /mensagem de ponta a ponta (uvicorn local): resumo, pedidos, CPF
+
+Para cada cenário: vazão (op/s), p50/p99 e chamadas ao Sienge por operação.
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from bench.fake_sienge import FakeSienge, TenantSintetico
+
+CENARIOS = ("relatorio", "boletos", "pedidos", "mensagem")
+
+
+def percentil(valores, p):
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * p))]
+
+
+def preparar_ambiente(fake: FakeSienge, taxa_sienge: float):
+    """Aponta o backend para o Sienge local. Precisa rodar ANTES de importar main/sienge."""
+    os.environ["SIENGE_BASE_URL"] = fake.base_url
+    os.environ.setdefault("SIENGE_TAXA", str(taxa_sienge))
+    os.environ.setdefault("SIENGE_RAJADA", str(max(8, taxa_sienge)))
+    os.environ.setdefault("OPENAI_API_KEY", "bench")
+    os.environ.setdefault("OPENAI_BASE_URL", fake.openai_url)
+    os.environ.setdefault("META_GRAPH_URL", f"{fake.mensageria_url}/meta")
+    os.environ.setdefault("WHATSAPP_PHONE_NUMBER_ID", "bench")
+    os.environ.setdefault("WHATSAPP_TOKEN", "bench")
+    os.environ.setdefault("TWILIO_API_URL", f"{fake.mensageria_url}/twilio")
+    os.environ.setdefault("TWILIO_ACCOUNT_SID", "ACbench")
+    os.environ.setdefault("TWILIO_AUTH_TOKEN", "bench")
+    # O aquecimento em fundo mudaria as contagens de chamadas; os benches o ligam explicitamente
+    os.environ.setdefault("AQUECIMENTO", "0")
+    # Cache persistente de apropriações e armazém local em arquivos descartáveis, por execução
+    temporario = tempfile.mkdtemp(prefix="bench-")
+    os.environ.setdefault("APROPRIACOES_CACHE", os.path.join(temporario, "apropriacoes.db"))
+    os.environ.setdefault("ARMAZEM_DIR", os.path.join(temporario, "armazem"))
+
+
+def limpar_caches():
+    """Zera os caches (memória, SQLite de apropriações e armazém local) para medir o caminho frio."""
+    from sienge import sienge_financeiro
+    sienge_financeiro._cache.clear()
+    sienge_financeiro.limpar_particoes()
+    if sienge_financeiro._cache_apropriacoes is not None:
+        sienge_financeiro._cache_apropriacoes.limpar()
+    from armazem import armazem
+    armazem.limpar()
+
+
+def medir(nome, operacao, repeticoes, concorrencia, fake, frio=False):
+    fake.zerar()
+    duracoes = []
+    lock = threading.Lock()
+
+    def _uma(i):
+        if frio:
+            limpar_caches()
+        t0 = time.perf_counter()
+        operacao(i)
+        dur = time.perf_counter() - t0
+        with lock:
+            duracoes.append(dur)
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concorrencia) as pool:
+        list(pool.map(_uma, range(repeticoes)))
+    total = time.perf_counter() - inicio
+
+    chamadas = fake.estatisticas()
+    n = len(duracoes)
+    por_op = {k: round(v / n, 1) for k, v in sorted(chamadas.items()) if k not in ("total", "429")}
+    return {
+        "cenario": nome,
+        "operacoes": n,
+        "vazao": n / total if total else 0.0,
+        "p50": percentil(duracoes, .50),
+        "p99": percentil(duracoes, .99),
+        "media": statistics.mean(duracoes),
+        "chamadas_por_op": chamadas.get("total", 0) / n,
+        "respostas_429": chamadas.get("429", 0),
+        "por_familia": por_op,
+    }
+
+
+def imprimir(r):
+    print(
+        f"▶ {r['cenario']:<10} {r['operacoes']:>4} ops | {r['vazao']:8.2f} op/s | "
+        f"p50 {r['p50'] * 1000:9.1f} ms | p99 {r['p99'] * 1000:9.1f} ms | "
+        f"{r['chamadas_por_op']:8.1f} chamadas/op | 429: {r['respostas_429']}"
+    )
+    print(f"   por endpoint/op: {r['por_familia']}")
+
+
+def subir_api():
+    """Sobe o app FastAPI num uvicorn local (thread) e devolve (servidor, url)."""
+    import uvicorn
+    import main as app_main
+
+    config = uvicorn.Config(app_main.app, host="127.0.0.1", port=0, log_level="warning")
+    servidor = uvicorn.Server(config)
+    threading.Thread(target=servidor.run, daemon=True).start()
+    while not servidor.started:
+        time.sleep(0.05)
+    porta = servidor.servers[0].sockets[0].getsockname()[1]
+    return servidor, f"http://127.0.0.1:{porta}"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--contas", type=int, default=5000)
+    parser.add_argument("--clientes", type=int, default=500)
+    parser.add_argument("--pedidos", type=int, default=40)
+    parser.add_argument("--latencia-ms", type=float, default=20.0)
+    parser.add_argument("--taxa-429", type=float, default=0.0)
+    parser.add_argument("--taxa-sienge", type=float, default=500.0, help="req/s liberadas pelo limitador do backend")
+    parser.add_argument("--repeticoes", type=int, default=3)
+    parser.add_argument("--concorrencia", type=int, default=1)
+    parser.add_argument("--frio", action="store_true", help="limpa os caches antes de cada operação")
+    parser.add_argument("--cenarios", default=",".join(CENARIOS))
+    args = parser.parse_args()
+
+    tenant = TenantSintetico(contas=args.contas, clientes=args.clientes, pedidos_pendentes=args.pedidos)
+    fake = FakeSienge(tenant, latencia_ms=args.latencia_ms, taxa_429=args.taxa_429, retry_after=0.5)
+    fake.iniciar()
+    preparar_ambiente(fake, args.taxa_sienge)
+
+    # Imports só depois de apontar o backend para o Sienge local
+    from sienge.sienge_boletos import buscar_boletos_por_cpf
+    from sienge.sienge_financeiro import gerar_relatorio_json
+    from sienge.sienge_pedidos import listar_pedidos_pendentes
+
+    print(f"🧪 Tenant: {tenant.contas} títulos, {tenant.recebiveis} recebíveis, {tenant.clientes} clientes | "
+          f"latência {args.latencia_ms} ms | 429 {args.taxa_429:.0%}")
+
+    cenarios = [c.strip() for c in args.cenarios.split(",") if c.strip()]
+    kw = dict(repeticoes=args.repeticoes, concorrencia=args.concorrencia, fake=fake, frio=args.frio)
+
+    if "relatorio" in cenarios:
+        imprimir(medir("relatorio", lambda i: gerar_relatorio_json(enterpriseId="1"), **kw))
+    if "boletos" in cenarios:
+        imprimir(medir("boletos", lambda i: buscar_boletos_por_cpf(tenant.cpf_do_cliente(i % tenant.clientes + 1)), **kw))
+    if "pedidos" in cenarios:
+        imprimir(medir("pedidos", lambda i: listar_pedidos_pendentes(), **kw))
+    if "mensagem" in cenarios:
+        import requests
+
+        servidor, url = subir_api()
+        sessao = requests.Session()
+        roteiro = ["empresa 1", "resumo financeiro", "pedidos pendentes", tenant.cpf_do_cliente(7), "confirmar"]
+
+        def _conversa(i):
+            usuario = f"bench-{i}"
+            for texto in roteiro:
+                r = sessao.post(f"{url}/mensagem", json={"user": usuario, "text": texto}, timeout=600)
+                r.raise_for_status()
+
+        imprimir(medir(f"mensagem({len(roteiro)} msgs)", _conversa, **kw))
+        servidor.should_exit = True
+
+    fake.parar()
+
+
+if __name__ == "__main__":
+    main()
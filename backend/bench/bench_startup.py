@@ -0,0 +1,80 @@
+"""
+Tempo de cold start do backend.
+
+Uso (a partir de backend/):
+    python -m bench.bench_startup --repeticoes 5
+
+Cada repetição roda num processo Python novo (como um spin-up do Render):
+  import     tempo para `import main`
+  raiz       primeira resposta do GET / (ASGI direto, sem rede)
+  saudacao   primeira resposta do /mensagem com "oi"
+  pesados    quais de pandas/plotly/openai/twilio já estavam carregados
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+PESADOS = ("pandas", "plotly", "openai", "twilio")
+
+_SONDA = r"""
+import asyncio, json, sys, time
+t0 = time.perf_counter()
+import main
+t_import = time.perf_counter() - t0
+
+async def _chamar(metodo, caminho, corpo=b""):
+    mensagens = [{"type": "http.request", "body": corpo, "more_body": False}]
+    status = []
+    async def receive():
+        return mensagens.pop(0) if mensagens else {"type": "http.disconnect"}
+    async def send(m):
+        if m["type"] == "http.response.start":
+            status.append(m["status"])
+    scope = {"type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": metodo,
+             "scheme": "http", "path": caminho, "raw_path": caminho.encode(), "query_string": b"",
+             "headers": [(b"content-type", b"application/json"), (b"host", b"localhost")],
+             "server": ("localhost", 80), "client": ("127.0.0.1", 1)}
+    await main.app(scope, receive, send)
+    return status[0]
+
+t1 = time.perf_counter()
+s1 = asyncio.run(_chamar("GET", "/"))
+t_raiz = time.perf_counter() - t1
+t2 = time.perf_counter()
+s2 = asyncio.run(_chamar("POST", "/mensagem", json.dumps({"user": "bench", "text": "oi"}).encode()))
+t_oi = time.perf_counter() - t2
+print(json.dumps({"import": t_import, "raiz": t_raiz, "saudacao": t_oi, "status": [s1, s2],
+                  "pesados": sorted(m for m in PESADOS if m in sys.modules)}))
+"""
+
+
+def rodar_uma():
+    env = dict(os.environ)
+    env.setdefault("OPENAI_API_KEY", "bench")
+    env.setdefault("LOG_NIVEL", "WARNING")
+    codigo = f"PESADOS = {PESADOS!r}\n" + _SONDA
+    saida = subprocess.run([sys.executable, "-c", codigo], capture_output=True, text=True, env=env,
+                           cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))), check=True)
+    return json.loads(saida.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeticoes", type=int, default=5)
+    args = parser.parse_args()
+
+    rodadas = [rodar_uma() for _ in range(args.repeticoes)]
+    print(f"🧊 {args.repeticoes} cold starts")
+    for chave in ("import", "raiz", "saudacao"):
+        valores = [r[chave] * 1000 for r in rodadas]
+        print(f"▶ {chave:<9} mediana {statistics.median(valores):8.1f} ms | min {min(valores):8.1f} ms | máx {max(valores):8.1f} ms")
+    total = [(r["import"] + r["raiz"] + r["saudacao"]) * 1000 for r in rodadas]
+    print(f"▶ {'pronto':<9} mediana {statistics.median(total):8.1f} ms (import + / + primeira saudação)")
+    print(f"   status: {rodadas[-1]['status']} | pesados carregados: {rodadas[-1]['pesados'] or 'nenhum'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,490 @@
+"""
+Sienge local de testes com tenant sintético.
+
+Uso (a partir de backend/):
+    python -m bench.fake_sienge --contas 50000 --latencia-ms 40 --taxa-429 0.02 --porta 8099
+    SIENGE_BASE_URL=http://127.0.0.1:8099/api/v1 uvicorn main:app
+
+Implementa os endpoints usados pelo backend: bills, budget-categories, links de
+entidades (creditors, companies, cost-centers, buildings, payment-categories),
+receivable-bills, installments, payment-slip-notification, customers e
+purchase-orders. Os registros são gerados de forma determinística a partir do
+id, então um tenant de 500k títulos não ocupa memória.
+
+Também responde POST /openai/v1/chat/completions com um texto fixo, para
+rodar as intenções de IA sem a OpenAI (OPENAI_BASE_URL=<servidor>/openai/v1),
+e os envios de WhatsApp em /mensageria/meta/... (META_GRAPH_URL) e
+/mensageria/twilio/... (TWILIO_API_URL). Envios ficam em `fake.envios`, na
+ordem de chegada, e não entram no "total" de chamadas.
+
+Estatísticas de chamadas: GET /__stats  |  zerar: POST /__reset
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+PREFIXO = "/api/v1"
+PREFIXO_OPENAI = "/openai/v1"
+PREFIXO_MENSAGERIA = "/mensageria"  # /meta/... (Graph API) e /twilio/... (REST)
+LIMITE_PADRAO = 100
+LIMITE_MAXIMO = 200
+
+
+# ============================================================
+# 🏗️ TENANT SINTÉTICO
+# ============================================================
+class TenantSintetico:
+    def __init__(
+        self,
+        contas: int = 10000,
+        empresas: int = 3,
+        fornecedores: int = 500,
+        centros: int = 40,
+        obras: int = 25,
+        categorias: int = 60,
+        clientes: int = 2000,
+        pedidos_pendentes: int = 40,
+        inicio: str = None,
+        dias: int = 730,
+        semente: int = 42,
+    ):
+        self.contas = contas
+        self.recebiveis = max(1, contas // 4)
+        self.empresas = empresas
+        self.fornecedores = fornecedores
+        self.centros = centros
+        self.obras = obras
+        self.categorias = categorias
+        self.clientes = clientes
+        self.pedidos = pedidos_pendentes
+        self.inicio = date.fromisoformat(inicio) if inicio else date.today() - timedelta(days=dias)
+        self.dias = dias
+        self.semente = semente
+        self.decididos = set()
+        self._lock = threading.Lock()
+
+    # --- utilidades determinísticas ---
+    def _rng(self, *chave) -> random.Random:
+        return random.Random(f"{self.semente}:{chave}")
+
+    def _data(self, i: int, total: int) -> date:
+        return self.inicio + timedelta(days=(i * self.dias) // max(1, total))
+
+    def _faixa_datas(self, total: int, inicio: str = None, fim: str = None) -> range:
+        a, b = 0, total
+        if inicio:
+            d = (date.fromisoformat(inicio) - self.inicio).days
+            a = max(0, -(-d * total // self.dias))
+        if fim:
+            d = (date.fromisoformat(fim) - self.inicio).days + 1
+            b = min(total, max(0, -(-d * total // self.dias)))
+        return range(a, max(a, b))
+
+    @staticmethod
+    def _filtrar_modulo(faixa: range, modulo: int, resto: int) -> range:
+        if not faixa:
+            return faixa
+        primeiro = faixa.start + ((resto - faixa.start) % modulo)
+        return range(primeiro, faixa.stop, modulo)
+
+    def cpf_do_cliente(self, cid: int) -> str:
+        return f"{cid:011d}"
+
+    # --- contas a pagar ---
+    def faixa_contas(self, q: dict) -> range:
+        faixa = self._faixa_datas(self.contas, q.get("startDate"), q.get("endDate"))
+        if q.get("enterpriseId"):
+            faixa = self._filtrar_modulo(faixa, self.empresas, int(q["enterpriseId"]) - 1)
+        return faixa
+
+    def conta(self, i: int, base: str) -> dict:
+        rng = self._rng("conta", i)
+        empresa = i % self.empresas + 1
+        emissao = self._data(i, self.contas)
+        return {
+            "id": i + 1,
+            "debtorId": empresa,
+            "creditorId": i % self.fornecedores + 1,
+            "documentNumber": f"NF-{rng.randint(1000, 99999)}",
+            "issueDate": emissao.isoformat(),
+            "dueDate": (emissao + timedelta(days=rng.choice((15, 30, 45, 60)))).isoformat(),
+            "totalInvoiceAmount": round(rng.lognormvariate(8, 1.2), 2),
+            "status": rng.choice(("PAID", "OPEN", "OPEN", "PARTIALLY_PAID")),
+            "notes": f"Compra {rng.choice(('cimento', 'aço', 'areia', 'mão de obra', 'locação'))}",
+            "originId": rng.choice(("CP", "NF", "ME")),
+            "links": [
+                {"rel": "company", "href": f"{base}/companies/{empresa}"},
+                {"rel": "creditor", "href": f"{base}/creditors/{i % self.fornecedores + 1}"},
+                {"rel": "departmentsCost", "href": f"{base}/cost-centers/{i % self.centros + 1}"},
+                {"rel": "buildingsCost", "href": f"{base}/buildings/{i % self.obras + 1}"},
+            ],
+        }
+
+    def apropriacoes(self, bill_id: int, base: str) -> list:
+        rng = self._rng("aprop", bill_id)
+        n = rng.choice((1, 1, 2, 3))
+        partes = [100 // n] * n
+        partes[0] += 100 - sum(partes)
+        return [
+            {
+                "paymentCategoriesId": f"{rng.randint(1, self.categorias)}",
+                "percentage": p,
+                "links": [
+                    {"rel": "paymentCategory", "href": f"{base}/payment-categories/{rng.randint(1, self.categorias)}"},
+                    {"rel": "debtor", "href": f"{base}/cost-centers/{rng.randint(1, self.centros)}"},
+                ],
+            }
+            for p in partes
+        ]
+
+    # --- contas a receber ---
+    def faixa_recebiveis(self, q: dict) -> range:
+        faixa = self._faixa_datas(self.recebiveis, q.get("startDate"), q.get("endDate"))
+        if q.get("customerId"):
+            faixa = self._filtrar_modulo(faixa, self.clientes, int(q["customerId"]) - 1)
+        return faixa
+
+    def recebivel(self, j: int) -> dict:
+        rng = self._rng("receb", j)
+        emissao = self._data(j, self.recebiveis)
+        valor = round(rng.lognormvariate(9, 1.0), 2)
+        return {
+            "receivableBillId": j + 1,
+            "id": j + 1,
+            "customerId": j % self.clientes + 1,
+            "receivableBillValue": valor,
+            "amount": valor,
+            "documentNumber": f"CT-{j + 1}",
+            "description": f"Parcelas unidade {rng.randint(100, 999)}",
+            "issueDate": emissao.isoformat(),
+            "payOffDate": emissao.isoformat() if j % 5 == 0 else None,
+        }
+
+    def parcelas(self, titulo_id: int) -> list:
+        rng = self._rng("parc", titulo_id)
+        emissao = self._data(titulo_id - 1, self.recebiveis)
+        return [
+            {
+                "installmentId": k,
+                "id": k,
+                "balanceDue": round(rng.uniform(500, 5000), 2),
+                "dueDate": (emissao + timedelta(days=30 * k)).isoformat(),
+            }
+            for k in range(1, rng.choice((1, 2, 3)) + 1)
+        ]
+
+    def boleto(self, titulo_id: int, parcela_id: int):
+        if titulo_id < 1 or titulo_id > self.recebiveis:
+            return None
+        if parcela_id not in {p["id"] for p in self.parcelas(titulo_id)} or (titulo_id + parcela_id) % 3 == 0:
+            return None
+        return {
+            "urlReport": f"https://boletos.example/{titulo_id}/{parcela_id}.pdf",
+            "digitableNumber": f"34191.{titulo_id:05d} {parcela_id:05d}.000000 0 0000000000",
+        }
+
+    # --- pedidos de compra ---
+    def pedidos_pendentes(self) -> list:
+        with self._lock:
+            decididos = set(self.decididos)
+        return [
+            {
+                "id": 1000 + k,
+                "totalAmount": round(self._rng("ped", k).uniform(1000, 90000), 2),
+                "date": self._data(k, self.pedidos).isoformat(),
+                "disapproved": False,
+            }
+            for k in range(self.pedidos)
+            if 1000 + k not in decididos
+        ]
+
+    def decidir(self, pedido_id: int) -> bool:
+        if not 1000 <= pedido_id < 1000 + self.pedidos:
+            return False
+        with self._lock:
+            self.decididos.add(pedido_id)
+        return True
+
+
+# ============================================================
+# 🌐 SERVIDOR HTTP
+# ============================================================
+_COMPLETION_FICTICIA = {
+    "id": "chatcmpl-local",
+    "object": "chat.completion",
+    "created": 0,
+    "model": "gpt-4o-mini",
+    "choices": [{
+        "index": 0,
+        "finish_reason": "stop",
+        "message": {"role": "assistant", "content": "## Análise (simulada)\n- Texto gerado pelo servidor local."},
+    }],
+    "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+}
+
+
+def _familia(caminho: str) -> str:
+    partes = [p for p in caminho.split("/") if p and not p.isdigit()]
+    for sub in reversed(partes):
+        if sub in ("budget-categories", "installments", "items", "pdf", "receivable-bills"):
+            return sub
+    return partes[0] if partes else "raiz"
+
+
+class FakeSienge:
+    def __init__(self, tenant: TenantSintetico = None, latencia_ms: float = 0.0, taxa_429: float = 0.0, retry_after: float = 1.0):
+        self.tenant = tenant or TenantSintetico()
+        self.latencia_ms = latencia_ms
+        self.taxa_429 = taxa_429
+        self.retry_after = retry_after
+        self.chamadas = Counter()
+        self.envios = []  # (servico, destino, texto) na ordem de chegada
+        self._lock = threading.Lock()
+        self._servidor = None
+
+    # --- controle ---
+    def iniciar(self, porta: int = 0, host: str = "127.0.0.1") -> str:
+        fake = self
+
+        class _Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                fake._atender(self, "GET")
+
+            def do_PUT(self):
+                fake._atender(self, "PUT")
+
+            def do_PATCH(self):
+                fake._atender(self, "PATCH")
+
+            def do_POST(self):
+                fake._atender(self, "POST")
+
+            def log_message(self, *args):
+                pass
+
+        self._servidor = ThreadingHTTPServer((host, porta), _Handler)
+        self._servidor.daemon_threads = True
+        threading.Thread(target=self._servidor.serve_forever, daemon=True).start()
+        return self.base_url
+
+    @property
+    def base_url(self) -> str:
+        host, porta = self._servidor.server_address[:2]
+        return f"http://{host}:{porta}{PREFIXO}"
+
+    @property
+    def openai_url(self) -> str:
+        host, porta = self._servidor.server_address[:2]
+        return f"http://{host}:{porta}{PREFIXO_OPENAI}"
+
+    @property
+    def mensageria_url(self) -> str:
+        host, porta = self._servidor.server_address[:2]
+        return f"http://{host}:{porta}{PREFIXO_MENSAGERIA}"
+
+    def parar(self):
+        if self._servidor:
+            self._servidor.shutdown()
+            self._servidor.server_close()
+
+    def estatisticas(self) -> dict:
+        with self._lock:
+            return dict(self.chamadas)
+
+    def zerar(self):
+        with self._lock:
+            self.chamadas.clear()
+            self.envios.clear()
+
+    # --- atendimento ---
+    def _responder(self, h, status: int, corpo=None, tipo="application/json", extra=None):
+        dados = corpo if isinstance(corpo, bytes) else json.dumps(corpo if corpo is not None else {}).encode()
+        h.send_response(status)
+        h.send_header("Content-Type", tipo)
+        h.send_header("Content-Length", str(len(dados)))
+        for k, v in (extra or {}).items():
+            h.send_header(k, v)
+        h.end_headers()
+        h.wfile.write(dados)
+
+    def _atender(self, h, metodo: str):
+        partes = urlsplit(h.path)
+        caminho = partes.path
+        q = {k: v[0] for k, v in parse_qs(partes.query).items()}
+        tamanho = int(h.headers.get("Content-Length") or 0)
+        corpo = h.rfile.read(tamanho) if tamanho else b""
+
+        if caminho == "/__stats":
+            return self._responder(h, 200, self.estatisticas())
+        if caminho == "/__reset":
+            self.zerar()
+            return self._responder(h, 200, {"ok": True})
+        if caminho == f"{PREFIXO_OPENAI}/chat/completions" and metodo == "POST":
+            with self._lock:
+                self.chamadas["openai"] += 1
+                self.chamadas["total"] += 1
+            return self._responder(h, 200, _COMPLETION_FICTICIA)
+        if caminho.startswith(PREFIXO_MENSAGERIA) and metodo == "POST":
+            return self._mensageria(h, caminho[len(PREFIXO_MENSAGERIA):], corpo)
+        if not caminho.startswith(PREFIXO):
+            return self._responder(h, 404, {"message": "not found"})
+        caminho = caminho[len(PREFIXO):]
+
+        with self._lock:
+            self.chamadas[_familia(caminho)] += 1
+            self.chamadas["total"] += 1
+
+        if self.latencia_ms:
+            time.sleep(max(0.0, random.gauss(self.latencia_ms, self.latencia_ms * 0.2)) / 1000)
+        if self.taxa_429 and random.random() < self.taxa_429:
+            with self._lock:
+                self.chamadas["429"] += 1
+            return self._responder(h, 429, {"message": "Too Many Requests"}, extra={"Retry-After": str(self.retry_after)})
+
+        status, corpo, tipo = self._rotear(metodo, caminho, q)
+        self._responder(h, status, corpo, tipo)
+
+    def _mensageria(self, h, caminho: str, corpo: bytes):
+        """Meta Cloud API e Twilio: registra o envio fora do 'total' (chega em segundo plano)."""
+        if caminho.startswith("/meta/"):
+            dados = json.loads(corpo or b"{}")
+            servico, destino, texto = "meta", dados.get("to"), (dados.get("text") or {}).get("body")
+        elif caminho.startswith("/twilio/"):
+            dados = {k: v[0] for k, v in parse_qs(corpo.decode()).items()}
+            servico, destino, texto = "twilio", dados.get("To"), dados.get("Body")
+        else:
+            return self._responder(h, 404, {"message": "not found"})
+
+        if self.latencia_ms:
+            time.sleep(max(0.0, random.gauss(self.latencia_ms, self.latencia_ms * 0.2)) / 1000)
+        with self._lock:
+            self.chamadas[servico] += 1
+            if self.taxa_429 and random.random() < self.taxa_429:
+                self.chamadas["429"] += 1
+                falhar = True
+            else:
+                self.envios.append((servico, destino, texto))
+                falhar = False
+        if falhar:
+            return self._responder(h, 429, {"message": "Too Many Requests"}, extra={"Retry-After": "0"})
+        if servico == "meta":
+            return self._responder(h, 200, {"messages": [{"id": f"wamid.{len(self.envios)}"}]})
+        return self._responder(h, 201, {"sid": f"SM{len(self.envios):032d}", "status": "queued"})
+
+    def _pagina(self, faixa: range, gerar, q: dict):
+        offset = int(q.get("offset") or 0)
+        limite = min(LIMITE_MAXIMO, int(q.get("limit") or LIMITE_PADRAO))
+        fatia = faixa[offset:offset + limite]
+        return {
+            "resultSetMetadata": {"count": len(faixa), "offset": offset, "limit": limite},
+            "results": [gerar(i) for i in fatia],
+        }
+
+    def _rotear(self, metodo: str, caminho: str, q: dict):
+        t = self.tenant
+        base = self.base_url
+        json_ = "application/json"
+
+        if metodo == "GET" and caminho == "/bills":
+            return 200, self._pagina(t.faixa_contas(q), lambda i: t.conta(i, base), q), json_
+
+        m = re.fullmatch(r"/bills/(\d+)/budget-categories", caminho)
+        if metodo == "GET" and m:
+            bill_id = int(m.group(1))
+            if not 1 <= bill_id <= t.contas:
+                return 404, {"message": "bill not found"}, json_
+            return 200, {"results": t.apropriacoes(bill_id, base)}, json_
+
+        m = re.fullmatch(r"/(creditors|companies|cost-centers|buildings|payment-categories)/(\d+)", caminho)
+        if metodo == "GET" and m:
+            nomes = {
+                "creditors": "Fornecedor", "companies": "Empresa", "cost-centers": "Centro de Custo",
+                "buildings": "Obra", "payment-categories": "Conta Financeira",
+            }
+            return 200, {"id": int(m.group(2)), "name": f"{nomes[m.group(1)]} {m.group(2)}"}, json_
+
+        if metodo == "GET" and caminho == "/enterprises":
+            return 200, self._pagina(range(t.empresas), lambda k: {"id": k + 1, "name": f"Empresa {k + 1}"}, q), json_
+
+        if metodo == "GET" and caminho == "/accounts-receivable/receivable-bills":
+            return 200, self._pagina(t.faixa_recebiveis(q), t.recebivel, q), json_
+
+        m = re.fullmatch(r"/accounts-receivable/receivable-bills/(\d+)/installments", caminho)
+        if metodo == "GET" and m:
+            return 200, {"results": t.parcelas(int(m.group(1)))}, json_
+
+        if metodo == "GET" and caminho == "/payment-slip-notification":
+            boleto = t.boleto(int(q.get("billReceivableId") or 0), int(q.get("installmentId") or 0))
+            if boleto:
+                return 200, {"results": [boleto]}, json_
+            return 422, {"message": "SiengeBusinessException: parcela sem boleto"}, json_
+
+        if metodo == "GET" and caminho == "/customers":
+            cpf = re.sub(r"\D", "", q.get("cpf", ""))
+            cid = int(cpf) if cpf.isdigit() else 0
+            if 1 <= cid <= t.clientes:
+                return 200, {"results": [{"id": cid, "name": f"Cliente {cid}", "cpf": cpf}]}, json_
+            return 200, {"results": []}, json_
+
+        if metodo == "GET" and caminho == "/purchase-orders":
+            pendentes = t.pedidos_pendentes()
+            return 200, self._pagina(range(len(pendentes)), lambda k: pendentes[k], q), json_
+
+        m = re.fullmatch(r"/purchase-orders/(\d+)(/items|/analysis/pdf|/authorize|/disapprove)?", caminho)
+        if m:
+            pid, sub = int(m.group(1)), m.group(2)
+            if not 1000 <= pid < 1000 + t.pedidos:
+                return 404, {"message": "purchase order not found"}, json_
+            if sub in ("/authorize", "/disapprove") and metodo in ("PUT", "PATCH"):
+                t.decidir(pid)
+                return 204, b"", json_
+            if metodo == "GET" and sub == "/items":
+                rng = t._rng("itens", pid)
+                itens = [
+                    {"description": f"Item {k}", "totalAmount": round(rng.uniform(100, 9000), 2)}
+                    for k in range(1, rng.randint(1, 5) + 1)
+                ]
+                return 200, {"results": itens}, json_
+            if metodo == "GET" and sub == "/analysis/pdf":
+                return 200, b"%PDF-1.4\n% pedido ficticio\n", "application/pdf"
+            if metodo == "GET" and sub is None:
+                return 200, {"id": pid, "status": "PENDING"}, json_
+
+        return 404, {"message": f"rota não simulada: {metodo} {caminho}"}, json_
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sienge local com tenant sintético")
+    parser.add_argument("--porta", type=int, default=8099)
+    parser.add_argument("--contas", type=int, default=10000)
+    parser.add_argument("--empresas", type=int, default=3)
+    parser.add_argument("--clientes", type=int, default=2000)
+    parser.add_argument("--pedidos", type=int, default=40)
+    parser.add_argument("--latencia-ms", type=float, default=0.0)
+    parser.add_argument("--taxa-429", type=float, default=0.0)
+    parser.add_argument("--retry-after", type=float, default=1.0)
+    args = parser.parse_args()
+
+    tenant = TenantSintetico(contas=args.contas, empresas=args.empresas, clientes=args.clientes,
+                             pedidos_pendentes=args.pedidos)
+    fake = FakeSienge(tenant, latencia_ms=args.latencia_ms, taxa_429=args.taxa_429, retry_after=args.retry_after)
+    url = fake.iniciar(args.porta, host="0.0.0.0")
+    print(f"🧪 Sienge local em {url} ({args.contas} títulos, {tenant.recebiveis} recebíveis)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        fake.parar()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""
+Gate de regressão de desempenho.
+
+Uso (a partir de backend/):
+    python -m bench.gate_desempenho                 # falha (exit 1) se estourar algum orçamento
+    python -m bench.gate_desempenho --medir         # só mostra os números, sem reprovar
+
+Sobe o Sienge local (com o stand-in da OpenAI) e a API num uvicorn local,
+roda as conversas de bench/cenarios_desempenho.json por /mensagem,
+/webhook-whatsapp e /webhook-twilio e confere, passo a passo:
+  - se o servidor executou a intenção esperada (Server-Timing `acao`);
+  - o tempo de parede contra `max_ms` da intenção;
+  - as chamadas ao Sienge/OpenAI (total e por endpoint) contra `max_chamadas`.
+
+Os envios ao WhatsApp/Twilio saem em fundo (envio.despachante); cada passo
+espera a fila esvaziar antes de ler as chamadas, para nada vazar no seguinte.
+
+Um `get_cached` novo dentro de um loop aparece aqui como estouro de chamadas.
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import time
+
+from bench.bench_sienge import preparar_ambiente, subir_api
+from bench.fake_sienge import FakeSienge, TenantSintetico
+
+ARQUIVO = os.path.join(os.path.dirname(__file__), "cenarios_desempenho.json")
+RE_ACAO = re.compile(r'acao;desc="([^"]*)"')
+
+
+def _payload_whatsapp(numero: str, texto: str) -> dict:
+    return {"entry": [{"changes": [{"value": {"messages": [{"from": numero, "text": {"body": texto}}]}}]}]}
+
+
+def _enviar(sessao, url: str, canal: str, usuario: str, texto: str):
+    if canal == "mensagem":
+        r = sessao.post(f"{url}/mensagem", json={"user": usuario, "text": texto}, timeout=600)
+    elif canal == "whatsapp":
+        r = sessao.post(f"{url}/webhook-whatsapp", json=_payload_whatsapp(usuario, texto), timeout=600)
+    elif canal == "twilio":
+        r = sessao.post(f"{url}/webhook-twilio", data={"From": f"whatsapp:+{usuario}", "Body": texto}, timeout=600)
+    else:
+        raise ValueError(f"canal desconhecido: {canal}")
+    r.raise_for_status()
+    return r
+
+
+def _acao_do_servidor(r):
+    """Intenção que o servidor executou, lida do Server-Timing (None = "não entendi")."""
+    m = RE_ACAO.search(r.headers.get("Server-Timing", ""))
+    if m is None:
+        return "sem cabeçalho"
+    return m.group(1) or None
+
+
+def _conferir(passo, orcamento, ms, chamadas, acao_obtida, folga):
+    falhas = []
+    esperada = passo.get("acao")
+    if esperada is not None and acao_obtida != esperada:
+        falhas.append(f"intenção {acao_obtida!r} ≠ esperada {esperada!r}")
+    max_ms = passo.get("max_ms", orcamento.get("max_ms"))
+    if max_ms is not None and ms > max_ms * folga:
+        falhas.append(f"{ms:.0f} ms > {max_ms * folga:.0f} ms")
+    limites = dict(orcamento.get("max_chamadas", {}))
+    limites.update(passo.get("max_chamadas", {}))
+    for familia, limite in limites.items():
+        n = chamadas.get(familia, 0)
+        if n > limite:
+            falhas.append(f"{n} chamadas a {familia} > {limite}")
+    return falhas
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--arquivo", default=ARQUIVO)
+    parser.add_argument("--medir", action="store_true", help="não reprova; só imprime tempos e chamadas")
+    parser.add_argument("--folga", type=float, default=1.0, help="multiplica os orçamentos de tempo (máquinas lentas)")
+    args = parser.parse_args()
+
+    with open(args.arquivo, encoding="utf-8") as f:
+        spec = json.load(f)
+
+    tenant = TenantSintetico(**spec.get("tenant", {}))
+    fake = FakeSienge(tenant, latencia_ms=spec.get("latencia_ms", 0.0))
+    fake.iniciar()
+    preparar_ambiente(fake, taxa_sienge=spec.get("taxa_sienge", 1000.0))
+
+    import requests
+    from envio import despachante
+    from intencoes import classificar
+
+    servidor, url = subir_api()
+    sessao = requests.Session()
+    orcamentos = spec.get("orcamentos", {})
+    reprovados = 0
+
+    for conversa in spec["conversas"]:
+        canal = conversa.get("canal", "mensagem")
+        print(f"\n💬 {conversa['nome']} ({canal})")
+        for passo in conversa["passos"]:
+            texto = passo["texto"]
+            # Orçamento pela intenção esperada (ou a local, se o passo não diz); a conferida é a do servidor
+            rotulo = passo.get("orcamento", passo.get("acao", classificar(texto)["acao"]))
+            orcamento = orcamentos.get(rotulo or "desconhecida", {})
+
+            despachante.aguardar()
+            fake.zerar()
+            t0 = time.perf_counter()
+            r = _enviar(sessao, url, canal, conversa["usuario"], texto)
+            ms = (time.perf_counter() - t0) * 1000
+            acao = _acao_do_servidor(r)
+            despachante.aguardar()  # envios em fundo contam neste passo, não no próximo
+            chamadas = fake.estatisticas()
+
+            falhas = [] if args.medir else _conferir(passo, orcamento, ms, chamadas, acao, args.folga)
+            reprovados += bool(falhas)
+            marca = "❌" if falhas else "✅"
+            resumo = {k: v for k, v in sorted(chamadas.items()) if k != "total"}
+            print(f"  {marca} {texto!r:<32} [{rotulo}] {ms:8.1f} ms | {chamadas.get('total', 0):4d} chamadas {resumo}")
+            for falha in falhas:
+                print(f"      ↳ {falha}")
+
+    servidor.should_exit = True
+    fake.parar()
+
+    if reprovados:
+        print(f"\n🚨 {reprovados} passo(s) estouraram o orçamento de desempenho.")
+        return 1
+    print("\n🏁 Todos os passos dentro do orçamento." if not args.medir else "\n📏 Medição concluída.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
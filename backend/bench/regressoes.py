@@ -0,0 +1,375 @@
+"""
+Verificações de regressão de comportamento (não de tempo).
+
+Uso (a partir de backend/):
+    python -m bench.regressoes          # falha (exit 1) se alguma verificação não passar
+
+Sobe o Sienge local (com o stand-in da OpenAI) e a API num uvicorn local e
+confere casos que já quebraram uma vez:
+  prazo_mensagem    prazo esgotado em /mensagem vira o aviso ⏱️ (HTTP 200), não um 500
+  sonda_prazo       sonda do disjuntor cortada pelo prazo não deixa o Sienge em meio_aberto para sempre
+  seguidor_async    quem espera um GET em voo (asyncio) respeita o próprio prazo e não cancela o líder
+  contexto_armazem  a sincronização do armazém herda prazo e prioridade de quem pediu
+  armazem_obra      o armazém filtra despesas pelo empreendimento pedido ao Sienge, não pelo debtorId
+  exportacao_cache  exportar despesas de um período longo não enche o cache de partições
+  lote_confirmado   "autorizar todos" só confirma; o botão decide os pedidos listados, não os que chegaram depois
+  mes_com_falha     uma página que falha num mês derruba o relatório (ListagemIncompleta), sem totais pela metade
+  envio_sem_dobro   timeout de leitura e 5xx no envio não são repetidos (talvez entregues); 429 é
+  faixa_cancelada   cancelar quem espera uma intenção não devolve a vaga antes de a thread terminar
+  filtros_atomicos  filtros gravados ao mesmo tempo pelo mesmo usuário não se perdem (memória e SQLite)
+  webhook_prazo     intenção pesada pelo webhook da Twilio devolve o 200 dentro de PRAZO_WEBHOOK
+"""
+import os
+import sys
+from types import SimpleNamespace
+
+from bench.bench_sienge import limpar_caches, preparar_ambiente, subir_api
+from bench.fake_sienge import FakeSienge, TenantSintetico
+
+VERIFICACOES = []
+
+
+def verificacao(fn):
+    VERIFICACOES.append(fn)
+    return fn
+
+
+@verificacao
+def prazo_mensagem(ctx):
+    """Com o Sienge lento e PRAZO_MEDIA=1, "resumo financeiro" responde o aviso de prazo."""
+    limpar_caches()
+    ctx.fake.latencia_ms = 400
+    try:
+        r = ctx.sessao.post(f"{ctx.url}/mensagem", json={"user": "reg-prazo", "text": "resumo financeiro"}, timeout=60)
+    finally:
+        ctx.fake.latencia_ms = 0
+    assert r.status_code == 200, f"HTTP {r.status_code}"
+    texto = r.json().get("text", "")
+    assert texto.startswith("⏱️"), f"texto inesperado: {texto[:80]!r}"
+
+
+@verificacao
+def sonda_prazo(ctx):
+    """Disjuntor meio aberto + sonda sem tempo: a vaga de sonda volta e a chamada seguinte passa."""
+    import time
+
+    import prazo
+    from circuito import ABERTO, disjuntor_sienge
+    from prazo import PrazoEsgotado
+    from sienge.sienge_http import BASE_URL, sienge_request
+
+    url = f"{BASE_URL}/purchase-orders/1001"
+    # (prazo, latência do Sienge): sem tempo antes da chamada / timeout encurtado no meio dela
+    for segundos, latencia_ms in ((0.1, 0), (0.6, 1500)):
+        with disjuntor_sienge._lock:
+            disjuntor_sienge.estado = ABERTO
+            disjuntor_sienge._aberto_ate = time.monotonic() - 1  # espera já cumprida
+        ctx.fake.latencia_ms = latencia_ms
+        try:
+            with prazo.com_prazo(segundos):
+                try:
+                    sienge_request("GET", url)
+                    raise AssertionError(f"a sonda deveria estourar o prazo de {segundos}s")
+                except PrazoEsgotado:
+                    pass
+        finally:
+            ctx.fake.latencia_ms = 0
+        r = sienge_request("GET", url)  # levantaria CircuitoAberto com a sonda presa
+        assert r.status_code < 500, f"HTTP {r.status_code}"
+        assert disjuntor_sienge.estado == "fechado", f"prazo {segundos}s: {disjuntor_sienge.estado}"
+
+
+@verificacao
+def seguidor_async(ctx):
+    """Líder lento numa thread; o seguidor async com prazo de 0.5s desiste a tempo e o líder termina."""
+    import asyncio
+    import threading
+    import time
+
+    import prazo
+    from prazo import PrazoEsgotado
+    from sienge.sienge_http import BASE_URL, _em_voo, sienge_request, sienge_request_async
+
+    url = f"{BASE_URL}/purchase-orders/1002"
+    resposta = {}
+    ctx.fake.latencia_ms = 2000
+    try:
+        lider = threading.Thread(target=lambda: resposta.update(r=sienge_request("GET", url)))
+        lider.start()
+        while not _em_voo:
+            time.sleep(0.01)
+
+        async def seguir():
+            with prazo.com_prazo(0.5):
+                await sienge_request_async("GET", url)
+
+        t0 = time.perf_counter()
+        try:
+            asyncio.run(seguir())
+            raise AssertionError("o seguidor deveria estourar o prazo")
+        except PrazoEsgotado:
+            pass
+        segundos = time.perf_counter() - t0
+        lider.join(10)
+    finally:
+        ctx.fake.latencia_ms = 0
+    assert segundos < 1.5, f"seguidor esperou {segundos:.1f}s com prazo de 0.5s"
+    assert resposta.get("r") is not None and resposta["r"].status_code < 500, "o líder não terminou"
+
+
+@verificacao
+def contexto_armazem(ctx):
+    """Dentro de com_prazo + prioridade, cada mês sincronizado vê o mesmo prazo e prioridade."""
+    import prazo
+    from armazem import armazem
+    from sienge.sienge_http import _prioridade_atual, prioridade
+
+    vistos = []
+
+    def espiao(tabela, mes, escopo, margem):
+        vistos.append((prazo.restante(), _prioridade_atual.get()))
+        return True
+
+    armazem.limpar()
+    armazem._sincronizar_mes = espiao
+    try:
+        with prazo.com_prazo(5), prioridade(10):
+            armazem.garantir({"startDate": "2024-01-01", "endDate": "2024-03-31"})
+    finally:
+        del armazem._sincronizar_mes
+    assert vistos, "nenhum mês sincronizado"
+    assert all(r is not None for r, _ in vistos), f"prazo perdido na thread: {vistos}"
+    assert all(n == 10 for _, n in vistos), f"prioridade perdida na thread: {vistos}"
+
+
+@verificacao
+def armazem_obra(ctx):
+    """Com debtorId noutro espaço de ids, o total do armazém para enterpriseId=2 é o que o Sienge lista."""
+    from datetime import date, timedelta
+
+    from armazem import armazem
+    from sienge.sienge_http import BASE_URL, paginar
+
+    tenant = ctx.fake.tenant
+    conta = tenant.conta
+    # No Sienge o debtorId é a empresa devedora; o enterpriseId do filtro é o empreendimento
+    tenant.conta = lambda i, base: {**conta(i, base), "debtorId": 100 + i % tenant.empresas}
+    params = {"startDate": (date.today() - timedelta(days=90)).isoformat(), "endDate": date.today().isoformat(),
+              "enterpriseId": "2"}
+    try:
+        armazem.limpar()
+        total = armazem.resumo(params)["despesas"]
+        esperado = sum(float(i.get("totalInvoiceAmount") or 0) for i in paginar(f"{BASE_URL}/bills", params))
+    finally:
+        tenant.conta = conta
+        armazem.limpar()
+    assert esperado, "Sienge sem despesas para o empreendimento"
+    assert abs(total - esperado) < 0.01, f"armazém {total:.2f} ≠ Sienge {esperado:.2f}"
+
+
+@verificacao
+def exportacao_cache(ctx):
+    """iterar_despesas de um ano inteiro lê o Sienge mês a mês sem guardar os meses em _particoes."""
+    from datetime import date, timedelta
+
+    from sienge import sienge_financeiro
+
+    sienge_financeiro.limpar_particoes()
+    periodo = {"startDate": (date.today() - timedelta(days=365)).isoformat(), "endDate": date.today().isoformat()}
+    linhas = sum(1 for _ in sienge_financeiro.iterar_despesas(periodo, campos={"status", "valor_total"}))
+    assert linhas, "exportação vazia"
+    guardadas = len(sienge_financeiro._particoes)
+    assert guardadas == 0, f"{guardadas} partição(ões) guardadas depois de exportar {linhas} linhas"
+
+
+@verificacao
+def lote_confirmado(ctx):
+    """ "autorizar todos" não decide nada; a confirmação leva os ids da lista mostrada."""
+    tenant = ctx.fake.tenant
+    antes = {p["id"] for p in tenant.pedidos_pendentes()}
+    r = ctx.sessao.post(f"{ctx.url}/mensagem", json={"user": "reg-lote", "text": "autorizar todos"}, timeout=60)
+    assert r.status_code == 200, f"HTTP {r.status_code}"
+    assert not tenant.decididos & antes, "pedidos decididos sem confirmação"
+    botao = r.json()["buttons"][0]["action"]
+
+    tenant.pedidos += 1  # chega um pedido novo entre a lista e a confirmação
+    r = ctx.sessao.post(f"{ctx.url}/mensagem", json={"user": "reg-lote", "text": botao}, timeout=60)
+    assert r.status_code == 200, f"HTTP {r.status_code}"
+    novo = 1000 + tenant.pedidos - 1
+    assert antes <= tenant.decididos, f"faltou decidir {sorted(antes - tenant.decididos)}"
+    assert novo not in tenant.decididos, f"pedido {novo} chegou depois e foi decidido"
+
+
+@verificacao
+def mes_com_falha(ctx):
+    """Um mês com página falhando não vira lista vazia: o relatório levanta ListagemIncompleta."""
+    from sienge import sienge_financeiro
+    from sienge.sienge_http import PaginaFalhou
+
+    original = sienge_financeiro.paginar
+    chamadas = {"n": 0}
+
+    def paginar_falhando(url, params=None, **kwargs):
+        chamadas["n"] += 1
+        if chamadas["n"] == 3:
+            raise PaginaFalhou(url, 0, 500)
+        return original(url, params, **kwargs)
+
+    limpar_caches()
+    sienge_financeiro.paginar = paginar_falhando
+    try:
+        sienge_financeiro.gerar_relatorio_json({"enterpriseId": "1"}, campos={"dre"})
+        raise AssertionError("relatório montado sem um dos meses")
+    except sienge_financeiro.ListagemIncompleta:
+        pass
+    finally:
+        sienge_financeiro.paginar = original
+
+
+@verificacao
+def envio_sem_dobro(ctx):
+    """POST de mensagem: 5xx e timeout de leitura saem uma vez só; 429 é repetido."""
+    import threading
+    import time
+    from collections import Counter
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    import envio
+
+    recebidos = Counter()
+
+    class Provedor(BaseHTTPRequestHandler):
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length") or 0))
+            recebidos[self.path] += 1
+            if self.path == "/lento":
+                time.sleep(0.6)
+            status = {"/erro": 502, "/cheio": 429}.get(self.path, 200)
+            self.send_response(status)
+            self.send_header("Retry-After", "0")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    servidor = ThreadingHTTPServer(("127.0.0.1", 0), Provedor)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{servidor.server_address[1]}"
+    timeout, envio.ENVIO_TIMEOUT = envio.ENVIO_TIMEOUT, 0.2
+    try:
+        despachante = envio.Despachante(workers=1, tentativas=3)
+        for caminho in ("/erro", "/lento", "/cheio"):
+            despachante.enviar("meta", "5591", {"method": "POST", "url": base + caminho, "json": {}})
+        assert despachante.aguardar(10), "envios não terminaram"
+    finally:
+        envio.ENVIO_TIMEOUT = timeout
+        servidor.shutdown()
+    assert recebidos["/erro"] == 1, f"5xx repetido {recebidos['/erro']}x"
+    assert recebidos["/lento"] == 1, f"timeout de leitura repetido {recebidos['/lento']}x"
+    assert recebidos["/cheio"] == 3, f"429 tentado {recebidos['/cheio']}x (esperado 3)"
+
+
+@verificacao
+def faixa_cancelada(ctx):
+    """Intenção de 0.5s cancelada com 0.1s: a vaga do usuário segue ocupada até a thread acabar."""
+    import asyncio
+    import time
+
+    from faixas import Faixa, FaixaOcupada
+
+    faixa = Faixa("regressao", workers=1, fila=0, por_usuario=1)
+
+    async def cenario():
+        tarefa = asyncio.ensure_future(faixa.executar("reg-faixa", time.sleep, 0.5))
+        await asyncio.sleep(0.1)
+        tarefa.cancel()  # cliente desconectou
+        await asyncio.gather(tarefa, return_exceptions=True)
+        try:
+            await faixa.executar("reg-faixa", time.sleep, 0)
+            raise AssertionError("vaga devolvida com a thread ainda rodando")
+        except FaixaOcupada:
+            pass
+
+    try:
+        asyncio.run(cenario())
+        time.sleep(0.6)
+        assert faixa.em_uso == 0 and not faixa._usuarios, f"vaga presa: {faixa.em_uso} {faixa._usuarios}"
+    finally:
+        faixa.pool.shutdown(wait=False)
+
+
+@verificacao
+def filtros_atomicos(ctx):
+    """40 threads mesclando um filtro cada na mesma sessão: os 40 ficam guardados."""
+    import tempfile
+    import threading
+
+    from sessao import SessaoMemoria, SessaoSQLite
+
+    with tempfile.TemporaryDirectory() as pasta:
+        for store in (SessaoMemoria(), SessaoSQLite(os.path.join(pasta, "sessoes.db"))):
+            threads = [threading.Thread(target=store.mesclar_filtros, args=("reg-filtros", {f"f{i}": i + 1}))
+                       for i in range(40)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            guardados = len(store.obter("reg-filtros").get("filtros", {}))
+            assert guardados == 40, f"{type(store).__name__}: {guardados} de 40 filtros"
+
+
+@verificacao
+def webhook_prazo(ctx):
+    """Com o Sienge lento, "análise financeira" (faixa pesada) pelo webhook não passa do prazo do webhook."""
+    import time
+
+    import main as api
+
+    limpar_caches()
+    teto, api.PRAZO_WEBHOOK = api.PRAZO_WEBHOOK, 2.0
+    ctx.fake.latencia_ms = 400
+    try:
+        t0 = time.perf_counter()
+        r = ctx.sessao.post(f"{ctx.url}/webhook-twilio", data={"From": "whatsapp:+5591", "Body": "análise financeira"},
+                            timeout=60)
+        segundos = time.perf_counter() - t0
+    finally:
+        ctx.fake.latencia_ms = 0
+        api.PRAZO_WEBHOOK = teto
+    api.despachante.aguardar(10)  # a resposta vai pelo despachante, para o mensageria local
+    assert r.status_code == 200, f"HTTP {r.status_code}"
+    assert segundos < 3.5, f"webhook respondeu em {segundos:.1f}s com prazo de 2s"
+
+
+def main():
+    fake = FakeSienge(TenantSintetico(contas=300, clientes=10, pedidos_pendentes=8))
+    fake.iniciar()
+    preparar_ambiente(fake, taxa_sienge=1000.0)
+    os.environ.setdefault("PRAZO_MEDIA", "1")
+
+    import requests
+
+    servidor, url = subir_api()
+    ctx = SimpleNamespace(fake=fake, url=url, sessao=requests.Session())
+    reprovadas = 0
+    for fn in VERIFICACOES:
+        try:
+            fn(ctx)
+            print(f"  ✅ {fn.__name__}")
+        except Exception as e:
+            reprovadas += 1
+            print(f"  ❌ {fn.__name__}: {type(e).__name__}: {e}")
+
+    servidor.should_exit = True
+    fake.parar()
+
+    if reprovadas:
+        print(f"\n🚨 {reprovadas} verificação(ões) de regressão falharam.")
+        return 1
+    print(f"\n🏁 {len(VERIFICACOES)} verificações de regressão ok.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,135 @@
+import logging
+import os
+import threading
+import time
+from collections import Counter
+
+from metricas import registrar_coletor
+
+# ============================================================
+# ⚡ DISJUNTORES (CIRCUIT BREAKERS) POR SERVIÇO EXTERNO
+# ============================================================
+# fechado     → chamadas passam normalmente
+# aberto      → após N falhas seguidas, chamadas falham na hora (CircuitoAberto)
+# meio_aberto → passado o tempo de espera, UMA chamada de teste é liberada;
+#               sucesso fecha o circuito, falha abre de novo.
+#
+#   CIRCUITO_FALHAS = falhas seguidas para abrir (padrão: 5)
+#   CIRCUITO_ESPERA = segundos aberto antes da sonda (padrão: 30)
+
+FECHADO = "fechado"
+ABERTO = "aberto"
+MEIO_ABERTO = "meio_aberto"
+
+
+class CircuitoAberto(Exception):
+    """Serviço marcado como fora do ar; a chamada nem foi feita."""
+
+    def __init__(self, nome: str, restante: float):
+        super().__init__(f"Serviço {nome} indisponível (circuito aberto, nova tentativa em {restante:.0f}s)")
+        self.nome = nome
+        self.restante = restante
+
+
+class Disjuntor:
+    def __init__(self, nome: str, limite_falhas: int = None, tempo_aberto: float = None):
+        self.nome = nome
+        self.limite_falhas = limite_falhas or int(os.getenv("CIRCUITO_FALHAS", "5"))
+        self.tempo_aberto = tempo_aberto or float(os.getenv("CIRCUITO_ESPERA", "30"))
+        self.estado = FECHADO
+        self.falhas_seguidas = 0
+        self.rejeicoes = 0
+        self.transicoes = Counter()  # (de, para) -> quantidade
+        self._aberto_ate = 0.0
+        self._sonda_em_andamento = False
+        self._lock = threading.Lock()
+
+    def _mudar(self, novo: str):
+        if novo == self.estado:
+            return
+        self.transicoes[(self.estado, novo)] += 1
+        nivel = logging.WARNING if novo == ABERTO else logging.INFO
+        logging.log(nivel, f"⚡ Circuito {self.nome}: {self.estado} → {novo}")
+        self.estado = novo
+
+    def permitir(self):
+        """Levanta CircuitoAberto se a chamada não deve ser feita agora."""
+        with self._lock:
+            if self.estado == FECHADO:
+                return
+            agora = time.monotonic()
+            if self.estado == ABERTO and agora >= self._aberto_ate:
+                self._mudar(MEIO_ABERTO)
+                self._sonda_em_andamento = False
+            if self.estado == MEIO_ABERTO and not self._sonda_em_andamento:
+                self._sonda_em_andamento = True
+                return
+            self.rejeicoes += 1
+            raise CircuitoAberto(self.nome, max(0.0, self._aberto_ate - agora))
+
+    def sucesso(self):
+        with self._lock:
+            self.falhas_seguidas = 0
+            self._sonda_em_andamento = False
+            self._mudar(FECHADO)
+
+    def liberar(self):
+        """Devolve a vaga da sonda sem veredito (a chamada nem chegou ao serviço)."""
+        with self._lock:
+            self._sonda_em_andamento = False
+
+    def falha(self):
+        with self._lock:
+            self.falhas_seguidas += 1
+            self._sonda_em_andamento = False
+            if self.estado == MEIO_ABERTO or self.falhas_seguidas >= self.limite_falhas:
+                self._aberto_ate = time.monotonic() + self.tempo_aberto
+                self._mudar(ABERTO)
+
+    def chamar(self, fn, *args, ignorar=(), **kwargs):
+        """Executa fn protegida: qualquer exceção conta como falha, menos as de `ignorar`."""
+        self.permitir()
+        try:
+            resultado = fn(*args, **kwargs)
+        except ignorar:
+            self.liberar()  # não diz nada sobre o serviço
+            raise
+        except Exception:
+            self.falha()
+            raise
+        self.sucesso()
+        return resultado
+
+    def resumo(self) -> dict:
+        return {
+            "estado": self.estado,
+            "falhas_seguidas": self.falhas_seguidas,
+            "rejeicoes": self.rejeicoes,
+            "transicoes": {f"{de}->{para}": n for (de, para), n in self.transicoes.items()},
+        }
+
+
+disjuntor_sienge = Disjuntor("sienge")
+disjuntor_openai = Disjuntor("openai")
+
+DISJUNTORES = {d.nome: d for d in (disjuntor_sienge, disjuntor_openai)}
+
+
+def estado_disjuntores() -> dict:
+    return {nome: d.resumo() for nome, d in DISJUNTORES.items()}
+
+
+@registrar_coletor
+def _metricas_disjuntores():
+    estados, transicoes, rejeicoes = [], [], []
+    for nome, d in DISJUNTORES.items():
+        for estado in (FECHADO, ABERTO, MEIO_ABERTO):
+            estados.append(({"servico": nome, "estado": estado}, 1 if d.estado == estado else 0))
+        for (de, para), n in d.transicoes.items():
+            transicoes.append(({"servico": nome, "de": de, "para": para}, n))
+        rejeicoes.append(({"servico": nome}, d.rejeicoes))
+    return [
+        ("constru_circuito_estado", "gauge", "Estado atual de cada disjuntor", estados),
+        ("constru_circuito_transicoes_total", "counter", "Mudanças de estado dos disjuntores", transicoes),
+        ("constru_circuito_rejeicoes_total", "counter", "Chamadas recusadas com o circuito aberto", rejeicoes),
+    ]
@@ -0,0 +1,113 @@
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+import metricas
+
+# ============================================================
+# 📑 CURSORES DE LISTAS LONGAS NO CHAT
+# ============================================================
+# Listas que não cabem numa mensagem (gastos por obra/centro, boletos,
+# pedidos pendentes) ficam guardadas aqui já renderizadas, linha a linha.
+# A resposta leva a primeira página e um cursor; "mais" (ou o botão
+# "➡️ Mais") devolve a fatia seguinte direto da memória, sem chamar o Sienge.
+#
+#   CURSOR_TTL = segundos que uma lista fica disponível (padrão: 900)
+#   CURSOR_MAX = listas em memória (LRU, padrão: 2000)
+#
+# O cache é por processo: com vários workers e SESSAO_BACKEND=sqlite, um
+# "mais" que cair em outro worker recebe "lista expirada" e refaz a consulta.
+
+CURSOR_TTL = int(os.getenv("CURSOR_TTL", "900"))
+CURSOR_MAX = int(os.getenv("CURSOR_MAX", "2000"))
+
+paginas_servidas = metricas.Contador(
+    "constru_cursor_paginas_total", "Páginas de listas do chat servidas", ("origem",))
+
+
+class _Lista:
+    __slots__ = ("usuario", "titulo", "linhas", "botoes", "extras", "tamanho", "separador", "posicao")
+
+    def __init__(self, usuario, titulo, linhas, botoes, extras, tamanho, separador):
+        self.usuario = usuario
+        self.titulo = titulo
+        self.linhas = linhas
+        self.botoes = botoes
+        self.extras = extras
+        self.tamanho = tamanho
+        self.separador = separador
+        self.posicao = 0
+
+
+class Cursores:
+    """LRU com TTL de listas paginadas, por processo."""
+
+    def __init__(self, ttl: int = CURSOR_TTL, max_itens: int = CURSOR_MAX):
+        self.ttl = ttl
+        self.max_itens = max_itens
+        self._listas = OrderedDict()  # cursor -> (expira_em, _Lista)
+        self._lock = threading.Lock()
+
+    def paginar(self, usuario, titulo, linhas, botoes=None, extras=None, tamanho=20, separador="\n") -> dict:
+        """
+        Primeira página da lista como resposta do chat. `botoes[i]` (opcional)
+        acompanha `linhas[i]`; `extras` aparecem em todas as páginas.
+        Só cria cursor se houver mais de uma página.
+        """
+        lista = _Lista(usuario, titulo, list(linhas), list(botoes or []), list(extras or []), tamanho, separador)
+        cursor = None
+        if len(lista.linhas) > tamanho:
+            cursor = secrets.token_hex(4)
+            with self._lock:
+                self._listas[cursor] = (time.monotonic() + self.ttl, lista)
+                while len(self._listas) > self.max_itens:
+                    self._listas.popitem(last=False)
+        paginas_servidas.inc("consulta")
+        return self._pagina(cursor, lista)
+
+    def proxima(self, usuario, cursor) -> dict:
+        """Próxima página do cursor, ou None se ele expirou / é de outro usuário."""
+        with self._lock:
+            item = self._listas.get(cursor)
+            if item is None or item[1].usuario != usuario:
+                return None
+            if item[0] < time.monotonic():
+                del self._listas[cursor]
+                return None
+            lista = item[1]
+            lista.posicao += lista.tamanho
+            if lista.posicao + lista.tamanho >= len(lista.linhas):
+                del self._listas[cursor]  # última página: o cursor acaba aqui
+                cursor_seguinte = None
+            else:
+                self._listas.move_to_end(cursor)
+                cursor_seguinte = cursor
+            pagina = self._pagina(cursor_seguinte, lista)
+        paginas_servidas.inc("cursor")
+        return pagina
+
+    @staticmethod
+    def _pagina(cursor, lista: _Lista) -> dict:
+        ini, fim = lista.posicao, min(lista.posicao + lista.tamanho, len(lista.linhas))
+        texto = lista.titulo + lista.separador.join(lista.linhas[ini:fim])
+        if len(lista.linhas) > lista.tamanho:
+            texto += f"\n\n📄 {ini + 1}–{fim} de {len(lista.linhas)}"
+            if cursor:
+                texto += " — envie *mais* para ver o restante"
+        botoes = lista.botoes[ini:fim]
+        if cursor:
+            botoes.append({"label": f"➡️ Mais ({len(lista.linhas) - fim})", "action": f"mais {cursor}"})
+        return {"text": texto, "buttons": botoes + lista.extras, "cursor": cursor}
+
+    def __len__(self):
+        return len(self._listas)
+
+
+cursores = Cursores()
+
+
+@metricas.registrar_coletor
+def _metricas_cursores():
+    return [("constru_cursor_listas", "gauge", "Listas paginadas guardadas em memória", [({}, len(cursores))])]
@@ -1,6 +1,7 @@
 import os
 import pandas as pd
 import plotly.express as px
+from sienge.sienge_financeiro import detectar_alertas, resumo_alertas
 from sienge.sienge_ia import gerar_analise_financeira
 
 def gerar_relatorio_gamma(df: pd.DataFrame, dre: dict, filtros: dict, user_email: str):
@@ -62,7 +63,9 @@ def gerar_relatorio_gamma(df: pd.DataFrame, dre: dict, filtros: dict, user_email
                         template="plotly_dark", color_discrete_sequence=["#FACC15"], text="valor_total")
     graf_obras.update_traces(texttemplate="R$ %{text:,.0f}", textposition="outside")
     graf_obras_html = graf_obras.to_html(full_html=False, include_plotlyjs='cdn')
-    texto_obras = gerar_analise_financeira("Análise das obras", df)
+    # Alertas da base inteira (a IA só vê uma amostra de cada recorte)
+    alertas = resumo_alertas(detectar_alertas(df))
+    texto_obras = gerar_analise_financeira("Análise das obras", df, alertas=alertas)
 
     # === Fornecedores ===
     graf_forn = px.bar(df.groupby("fornecedor")["valor_total"].sum().reset_index().sort_values("valor_total", ascending=True).head(15),
@@ -70,10 +73,10 @@ def gerar_relatorio_gamma(df: pd.DataFrame, dre: dict, filtros: dict, user_email
                        template="plotly_dark", color_discrete_sequence=["#FACC15"], text="valor_total")
     graf_forn.update_traces(texttemplate="R$ %{text:,.0f}", textposition="outside")
     graf_forn_html = graf_forn.to_html(full_html=False, include_plotlyjs='cdn')
-    texto_forn = gerar_analise_financeira("Análise dos fornecedores", df)
+    texto_forn = gerar_analise_financeira("Análise dos fornecedores", df, alertas=alertas)
 
     # === Análise Geral ===
-    texto_geral = gerar_analise_financeira("Resumo geral da empresa", df)
+    texto_geral = gerar_analise_financeira("Resumo geral da empresa", df, alertas=alertas)
 
     html = f"""
     <html><head>{estilo}</head><body>
@@ -0,0 +1,184 @@
+import atexit
+import logging
+import os
+import queue
+import random
+import threading
+import time
+import zlib
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import metricas
+from log_estruturado import evento
+
+# ============================================================
+# 📤 DESPACHANTE DE MENSAGENS DE SAÍDA (Meta Cloud API / Twilio)
+# ============================================================
+# O webhook só enfileira a resposta e devolve 200; o envio acontece numa
+# thread de fundo com:
+#   - sessão HTTP persistente (keep-alive, pool de conexões por provedor);
+#   - timeout de conexão/leitura;
+#   - novas tentativas com backoff + jitter só quando a mensagem com certeza
+#     não foi entregue: falha de conexão (o pedido nem saiu) e 429
+#     (respeitando Retry-After). Os POSTs de mensagem não são idempotentes:
+#     timeout de leitura e 5xx podem já ter entregue, então viram
+#     "incerto" no log/métrica e não são repetidos (nada de resposta em dobro);
+#   - ordem garantida por destino: o número do usuário sempre cai na mesma
+#     fila/thread, então as respostas chegam na ordem em que foram geradas.
+#
+#   ENVIO_WORKERS     = threads/filas de envio (padrão: 4)
+#   ENVIO_FILA_MAX    = mensagens pendentes por fila (padrão: 1000)
+#   ENVIO_TENTATIVAS  = tentativas por mensagem (padrão: 4)
+#   ENVIO_TIMEOUT     = timeout de leitura em segundos (padrão: 15; conexão: 5)
+#   ENVIO_BACKOFF_MAX = teto do backoff em segundos (padrão: 10)
+
+ENVIO_WORKERS = int(os.getenv("ENVIO_WORKERS", "4"))
+ENVIO_FILA_MAX = int(os.getenv("ENVIO_FILA_MAX", "1000"))
+ENVIO_TENTATIVAS = int(os.getenv("ENVIO_TENTATIVAS", "4"))
+ENVIO_TIMEOUT = float(os.getenv("ENVIO_TIMEOUT", "15"))
+ENVIO_BACKOFF_MAX = float(os.getenv("ENVIO_BACKOFF_MAX", "10"))
+BACKOFF_BASE = 0.5
+
+envio_segundos = metricas.Histograma(
+    "constru_envio_segundos", "Tempo do enfileiramento até a entrega por provedor", ("servico",))
+envio_resultados = metricas.Contador(
+    "constru_envio_total", "Mensagens de saída por provedor e resultado", ("servico", "resultado"))
+envio_tentativas = metricas.Contador(
+    "constru_envio_tentativas_total", "Tentativas de envio repetidas por provedor e motivo", ("servico", "motivo"))
+
+
+class _Envio:
+    __slots__ = ("servico", "destino", "requisicao", "criado_em")
+
+    def __init__(self, servico, destino, requisicao):
+        self.servico = servico
+        self.destino = destino
+        self.requisicao = requisicao
+        self.criado_em = time.perf_counter()
+
+
+def _retry_after(r) -> float:
+    try:
+        return max(0.0, float(r.headers.get("Retry-After")))
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class Despachante:
+    def __init__(self, workers: int = ENVIO_WORKERS, tentativas: int = ENVIO_TENTATIVAS):
+        self.workers = max(1, workers)
+        self.tentativas = max(1, tentativas)
+        self._filas = [queue.Queue(maxsize=ENVIO_FILA_MAX) for _ in range(self.workers)]
+        self._threads = []
+        self._lock = threading.Lock()
+        self._sessao = requests.Session()
+        adaptador = HTTPAdapter(pool_connections=4, pool_maxsize=self.workers)
+        self._sessao.mount("https://", adaptador)
+        self._sessao.mount("http://", adaptador)
+
+    def _iniciar(self):
+        with self._lock:
+            if self._threads:
+                return
+            for i, fila in enumerate(self._filas):
+                t = threading.Thread(target=self._loop, args=(fila,), name=f"envio-{i}", daemon=True)
+                t.start()
+                self._threads.append(t)
+
+    def enviar(self, servico: str, destino: str, requisicao: dict) -> bool:
+        """
+        Enfileira `requisicao` (kwargs de requests: method, url, headers, json/data, auth)
+        para `destino`. Não bloqueia; devolve False se a fila do destino estiver cheia.
+        """
+        if not self._threads:
+            self._iniciar()
+        fila = self._filas[zlib.crc32(str(destino).encode()) % self.workers]
+        try:
+            fila.put_nowait(_Envio(servico, destino, requisicao))
+        except queue.Full:
+            envio_resultados.inc(servico, "descartado")
+            logging.error(f"❌ Fila de envio cheia; resposta para {destino} descartada ({servico}).")
+            return False
+        return True
+
+    def pendentes(self) -> int:
+        return sum(f.qsize() for f in self._filas)
+
+    def aguardar(self, timeout: float = 10.0) -> bool:
+        """Espera as filas esvaziarem (shutdown, testes, benchmarks)."""
+        limite = time.monotonic() + timeout
+        for f in self._filas:
+            while f.unfinished_tasks and time.monotonic() < limite:
+                time.sleep(0.01)
+        return all(f.unfinished_tasks == 0 for f in self._filas)
+
+    def _loop(self, fila: queue.Queue):
+        while True:
+            item = fila.get()
+            try:
+                self._entregar(item)
+            except Exception:
+                logging.exception(f"❌ Erro inesperado no envio ({item.servico}):")
+                envio_resultados.inc(item.servico, "falha")
+            finally:
+                fila.task_done()
+
+    def _entregar(self, item: _Envio):
+        for tentativa in range(self.tentativas):
+            inicio = time.perf_counter()
+            espera, motivo = None, None
+            try:
+                r = self._sessao.request(timeout=(5, ENVIO_TIMEOUT), **item.requisicao)
+                metricas.registrar_upstream(item.servico, "messages", r.status_code, time.perf_counter() - inicio)
+                if r.status_code < 400:
+                    envio_resultados.inc(item.servico, "ok")
+                    envio_segundos.observar(time.perf_counter() - item.criado_em, item.servico)
+                    evento("envio", "📤 Mensagem entregue", servico=item.servico, para=item.destino,
+                           status=r.status_code, tentativas=tentativa + 1)
+                    return
+                if r.status_code == 429:
+                    espera, motivo = _retry_after(r), "429"
+                elif r.status_code >= 500:
+                    self._incerto(item, str(r.status_code), tentativa)
+                    return
+                else:
+                    # 4xx de regra (token inválido, número fora da janela de 24h...): não adianta repetir
+                    envio_resultados.inc(item.servico, "falha")
+                    logging.error(f"❌ Envio {item.servico} → {item.destino} recusado: {r.status_code} {r.text[:300]}")
+                    return
+            except (requests.ConnectionError, requests.ConnectTimeout) as e:
+                # O pedido não chegou ao provedor: repetir não duplica nada
+                metricas.registrar_upstream(item.servico, "messages", "erro", time.perf_counter() - inicio)
+                motivo = type(e).__name__
+            except requests.RequestException as e:
+                # Timeout de leitura e afins: o provedor pode ter recebido
+                metricas.registrar_upstream(item.servico, "messages", "erro", time.perf_counter() - inicio)
+                self._incerto(item, type(e).__name__, tentativa)
+                return
+
+            envio_tentativas.inc(item.servico, motivo)
+            if tentativa < self.tentativas - 1:
+                backoff = random.uniform(0, min(ENVIO_BACKOFF_MAX, BACKOFF_BASE * 2 ** tentativa))
+                time.sleep(max(espera or 0.0, backoff))
+
+        envio_resultados.inc(item.servico, "falha")
+        logging.error(f"❌ Envio {item.servico} → {item.destino} falhou após {self.tentativas} tentativas ({motivo}).")
+
+    def _incerto(self, item: _Envio, motivo: str, tentativa: int):
+        """Resposta perdida depois do envio: pode ter sido entregue, então não repete."""
+        envio_resultados.inc(item.servico, "incerto")
+        evento("envio", "⚠️ Envio sem confirmação (não repetido)", nivel=logging.WARNING, servico=item.servico,
+               para=item.destino, motivo=motivo, tentativas=tentativa + 1)
+
+
+despachante = Despachante()
+
+
+@metricas.registrar_coletor
+def _metricas_filas():
+    return [("constru_envio_pendentes", "gauge", "Mensagens aguardando envio", [({}, despachante.pendentes())])]
+
+
+atexit.register(despachante.aguardar, 5.0)
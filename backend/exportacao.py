@@ -0,0 +1,166 @@
+import csv
+import io
+import json
+import os
+
+# ============================================================
+# 📤 EXPORTAÇÃO EM STREAMING (CSV, NDJSON, PARQUET, ARROW)
+# ============================================================
+# Recebe um iterador de despesas (sienge_financeiro.iterar_despesas) e
+# devolve pedaços de bytes prontos para um StreamingResponse. Nada é
+# acumulado além de um lote (EXPORTACAO_LOTE linhas), então a memória não
+# cresce com o período exportado.
+#
+# Cada apropriação financeira vira uma linha (colunas aprop_*); despesa sem
+# apropriação sai numa linha só, com as colunas aprop_* vazias.
+#
+# Parquet e Arrow IPC precisam de pyarrow (já vem com o streamlit); sem ele
+# esses formatos levantam FormatoIndisponivel.
+
+LOTE_PADRAO = int(os.getenv("EXPORTACAO_LOTE", "1000"))
+
+COLUNAS = (
+    "empresa", "fornecedor", "centro_custo", "obra", "status", "valor_total",
+    "data_vencimento", "descricao", "documento", "tipo_lancamento",
+    "aprop_categoria", "aprop_percentual", "aprop_centro", "aprop_valor",
+)
+NUMERICAS = {"valor_total", "aprop_percentual", "aprop_valor"}
+
+FORMATOS = {
+    "csv": ("text/csv; charset=utf-8", "csv"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+    "arrow": ("application/vnd.apache.arrow.stream", "arrows"),
+}
+
+
+class FormatoIndisponivel(Exception):
+    """Formato pedido depende de uma biblioteca que não está instalada."""
+
+
+def linhas_planas(despesas):
+    """Achata `apropriacoes_financeiras`: uma linha por apropriação."""
+    for d in despesas:
+        base = {c: d.get(c) for c in COLUNAS[:10]}
+        aprops = d.get("apropriacoes_financeiras") or []
+        if not aprops:
+            yield {**base, "aprop_categoria": None, "aprop_percentual": None, "aprop_centro": None, "aprop_valor": None}
+            continue
+        for a in aprops:
+            pct = float(a.get("percentual") or 0)
+            yield {
+                **base,
+                "aprop_categoria": a.get("categoria"),
+                "aprop_percentual": pct,
+                "aprop_centro": a.get("debtor"),
+                "aprop_valor": round((base["valor_total"] or 0) * pct / 100, 2),
+            }
+
+
+def _lotes(linhas, tamanho):
+    lote = []
+    for linha in linhas:
+        lote.append(linha)
+        if len(lote) >= tamanho:
+            yield lote
+            lote = []
+    if lote:
+        yield lote
+
+
+def gerar_csv(linhas, lote=LOTE_PADRAO):
+    buf = io.StringIO()
+    escritor = csv.writer(buf)
+    escritor.writerow(COLUNAS)
+    for grupo in _lotes(linhas, lote):
+        escritor.writerows([[("" if l[c] is None else l[c]) for c in COLUNAS] for l in grupo])
+        yield buf.getvalue().encode("utf-8")
+        buf.seek(0)
+        buf.truncate()
+    if buf.tell():
+        yield buf.getvalue().encode("utf-8")
+
+
+def gerar_ndjson(linhas, lote=LOTE_PADRAO):
+    for grupo in _lotes(linhas, lote):
+        yield "".join(json.dumps(l, ensure_ascii=False) + "\n" for l in grupo).encode("utf-8")
+
+
+class _Coletor(io.RawIOBase):
+    """Arquivo só-escrita: o pyarrow escreve aqui e nós repassamos os bytes a cada lote."""
+
+    def __init__(self):
+        self._partes = []
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self._partes.append(bytes(b))
+        return len(b)
+
+    def esvaziar(self) -> bytes:
+        dados = b"".join(self._partes)
+        self._partes.clear()
+        return dados
+
+
+def _pyarrow():
+    try:
+        import pyarrow as pa
+    except ImportError:
+        raise FormatoIndisponivel("Instale pyarrow para exportar em Parquet/Arrow.")
+    return pa
+
+
+def _esquema(pa):
+    return pa.schema([(c, pa.float64() if c in NUMERICAS else pa.string()) for c in COLUNAS])
+
+
+def _lote_arrow(pa, esquema, grupo):
+    colunas = []
+    for c in COLUNAS:
+        valores = [l[c] for l in grupo]
+        if c not in NUMERICAS:
+            valores = [None if v is None else str(v) for v in valores]
+        colunas.append(pa.array(valores, type=esquema.field(c).type))
+    return pa.RecordBatch.from_arrays(colunas, schema=esquema)
+
+
+def gerar_parquet(linhas, lote=LOTE_PADRAO):
+    pa = _pyarrow()
+    import pyarrow.parquet as pq
+
+    esquema = _esquema(pa)
+    saida = _Coletor()
+    # Cada lote vira um row group, escrito (e enviado) assim que fica pronto
+    with pq.ParquetWriter(saida, esquema, compression="zstd") as escritor:
+        for grupo in _lotes(linhas, lote):
+            escritor.write_batch(_lote_arrow(pa, esquema, grupo), row_group_size=lote)
+            pedaco = saida.esvaziar()
+            if pedaco:
+                yield pedaco
+    yield saida.esvaziar()
+
+
+def gerar_arrow(linhas, lote=LOTE_PADRAO):
+    pa = _pyarrow()
+    esquema = _esquema(pa)
+    saida = _Coletor()
+    with pa.ipc.new_stream(saida, esquema) as escritor:
+        for grupo in _lotes(linhas, lote):
+            escritor.write_batch(_lote_arrow(pa, esquema, grupo))
+            yield saida.esvaziar()
+    yield saida.esvaziar()
+
+
+GERADORES = {"csv": gerar_csv, "ndjson": gerar_ndjson, "parquet": gerar_parquet, "arrow": gerar_arrow}
+
+
+def exportar(despesas, formato: str, lote: int = LOTE_PADRAO):
+    """Gerador de bytes no formato pedido. Valida pyarrow antes do primeiro byte."""
+    if formato not in GERADORES:
+        raise ValueError(f"formato desconhecido: {formato}")
+    if formato in ("parquet", "arrow"):
+        _pyarrow()
+    return GERADORES[formato](linhas_planas(despesas), lote)
@@ -0,0 +1,173 @@
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import metricas
+import prazo
+from rastreio import propagar
+from sienge.sienge_http import PRIORIDADE_INTERATIVA, prioridade
+
+# ============================================================
+# 🛣️ FAIXAS DE EXECUÇÃO POR CUSTO DA INTENÇÃO
+# ============================================================
+# Cada intenção do chat tem um custo conhecido e roda numa faixa própria,
+# com pool de threads e fila limitados. Assim um `analise_financeira`
+# (minutos de Sienge + IA) nunca ocupa a vaga de um "oi" ou de um
+# `link_boleto`:
+#   leve    saudação, filtros, "mais", uma chamada ao Sienge
+#   media   relatórios em cima das partições, boletos por CPF, lotes
+#   pesada  análise com IA e apresentação Gamma
+# Cada faixa também limita quantas execuções simultâneas um mesmo usuário
+# pode ter; acima do limite (ou com a fila cheia) a resposta é imediata.
+# A faixa pesada pede ao limitador do Sienge uma prioridade menor que a
+# do chat interativo.
+#
+#   FAIXA_<NOME>_WORKERS      = threads da faixa (leve 8, media 4, pesada 2)
+#   FAIXA_<NOME>_FILA         = pedidos esperando vaga (leve 64, media 16, pesada 4)
+#   FAIXA_<NOME>_POR_USUARIO  = execuções simultâneas por usuário (leve 4, media 2, pesada 1)
+
+PRIORIDADE_RELATORIO = 5  # entre o chat (0) e o aquecimento (10)
+
+CUSTO = {
+    "saudacao": "leve",
+    "definir_filtros": "leve",
+    "mais": "leve",
+    "buscar_boletos_cpf": "leve",
+    "link_boleto": "leve",
+    "itens_pedido": "leve",
+    "autorizar_pedido": "leve",
+    "reprovar_pedido": "leve",
+    "relatorio_pdf": "leve",
+    "listar_pedidos_pendentes": "leve",
+    None: "leve",  # "não entendi"
+    "resumo_financeiro": "media",
+    "gastos_por_obra": "media",
+    "gastos_por_centro_custo": "media",
+    "alertas": "media",
+    "cpf_digitado": "media",
+    "confirmar": "media",
+    "decidir_pedidos_lote": "media",
+    "analise_financeira": "pesada",
+    "apresentacao_gamma": "pesada",
+}
+PADROES = {
+    "leve": (8, 64, 4, PRIORIDADE_INTERATIVA),
+    "media": (4, 16, 2, PRIORIDADE_INTERATIVA),
+    "pesada": (2, 4, 1, PRIORIDADE_RELATORIO),
+}
+
+espera_faixa = metricas.Histograma(
+    "constru_faixa_espera_segundos", "Tempo na fila da faixa antes de começar a executar", ("faixa",))
+recusas_faixa = metricas.Contador(
+    "constru_faixa_recusas_total", "Pedidos recusados na entrada da faixa", ("faixa", "motivo"))
+
+
+class FaixaOcupada(Exception):
+    """Sem vaga na faixa (motivo="fila") ou o usuário já está no limite dela (motivo="usuario")."""
+
+    def __init__(self, faixa: str, motivo: str):
+        super().__init__(f"faixa {faixa} ocupada ({motivo})")
+        self.faixa = faixa
+        self.motivo = motivo
+
+
+class Faixa:
+    def __init__(self, nome: str, workers: int, fila: int, por_usuario: int, prioridade: int = PRIORIDADE_INTERATIVA):
+        self.nome = nome
+        self.workers = max(1, workers)
+        self.capacidade = self.workers + max(0, fila)
+        self.por_usuario = max(1, por_usuario)
+        self.prioridade = prioridade
+        self.pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix=f"faixa-{nome}")
+        self.em_uso = 0  # executando + esperando
+        self.executando = 0
+        self._usuarios = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def do_ambiente(cls, nome: str):
+        workers, fila, por_usuario, prio = PADROES[nome]
+        chave = f"FAIXA_{nome.upper()}"
+        return cls(nome, int(os.getenv(f"{chave}_WORKERS", workers)), int(os.getenv(f"{chave}_FILA", fila)),
+                   int(os.getenv(f"{chave}_POR_USUARIO", por_usuario)), prio)
+
+    def _admitir(self, usuario: str):
+        with self._lock:
+            if self._usuarios.get(usuario, 0) >= self.por_usuario:
+                motivo = "usuario"
+            elif self.em_uso >= self.capacidade:
+                motivo = "fila"
+            else:
+                self.em_uso += 1
+                self._usuarios[usuario] = self._usuarios.get(usuario, 0) + 1
+                return
+        recusas_faixa.inc(self.nome, motivo)
+        raise FaixaOcupada(self.nome, motivo)
+
+    def _liberar(self, usuario: str):
+        with self._lock:
+            self.em_uso -= 1
+            n = self._usuarios.get(usuario, 1) - 1
+            if n:
+                self._usuarios[usuario] = n
+            else:
+                self._usuarios.pop(usuario, None)
+
+    def _rodar(self, enfileirado_em, fn, args):
+        espera_faixa.observar(time.perf_counter() - enfileirado_em, self.nome)
+        prazo.timeout(float("inf"), f"faixa_{self.nome}")  # esperou a vaga além do prazo: nem começa
+        with self._lock:
+            self.executando += 1
+        try:
+            with prioridade(self.prioridade):
+                return fn(*args)
+        finally:
+            with self._lock:
+                self.executando -= 1
+
+    async def executar(self, usuario: str, fn, *args):
+        """
+        Roda fn(*args) numa thread da faixa sem bloquear o event loop; FaixaOcupada se não houver vaga.
+        A vaga só volta quando a thread termina: se quem espera for cancelado (cliente desconectou),
+        o trabalho que já começou continua contando na faixa e no limite do usuário.
+        """
+        self._admitir(usuario)
+        try:
+            futuro = self.pool.submit(propagar(self._rodar), time.perf_counter(), fn, args)
+        except BaseException:
+            self._liberar(usuario)
+            raise
+        futuro.add_done_callback(lambda _: self._liberar(usuario))
+        return await asyncio.wrap_future(futuro)
+
+
+class Escalonador:
+    def __init__(self, faixas: dict, custo: dict = CUSTO, padrao: str = "media"):
+        self.faixas = faixas
+        self.custo = custo
+        self.padrao = padrao
+
+    @classmethod
+    def do_ambiente(cls):
+        return cls({nome: Faixa.do_ambiente(nome) for nome in PADROES})
+
+    def faixa_de(self, acao) -> Faixa:
+        return self.faixas[self.custo.get(acao, self.padrao)]
+
+    async def executar(self, acao, usuario: str, fn, *args):
+        return await self.faixa_de(acao).executar(usuario, fn, *args)
+
+
+escalonador = Escalonador.do_ambiente()
+
+
+@metricas.registrar_coletor
+def _metricas_faixas():
+    executando = [({"faixa": f.nome}, f.executando) for f in escalonador.faixas.values()]
+    esperando = [({"faixa": f.nome}, f.em_uso - f.executando) for f in escalonador.faixas.values()]
+    return [
+        ("constru_faixa_executando", "gauge", "Intenções em execução por faixa", executando),
+        ("constru_faixa_esperando", "gauge", "Intenções esperando vaga por faixa", esperando),
+    ]
@@ -0,0 +1,195 @@
+import re
+import unicodedata
+
+# ============================================================
+# 🧠 MOTOR DE INTENÇÕES (TABELA DE REGRAS PRÉ-COMPILADAS)
+# ============================================================
+# Cada mensagem passa UMA vez por `Analise`, que normaliza o texto,
+# separa os tokens e extrai todas as entidades (datas, CPF, empresa, ids).
+# Depois `classificar` percorre a tabela REGRAS em ordem de prioridade:
+# a regra só é avaliada se algum dos seus gatilhos estiver entre os tokens.
+
+RE_DATA = re.compile(r"\d{4}-\d{2}-\d{2}")
+RE_CPF = re.compile(r"\d{3}\.\d{3}\.\d{3}-\d{2}|(?<!\d)\d{11}(?!\d)")
+RE_EMPRESA = re.compile(r"empresa\s+(\d+)")
+RE_NUMERO = re.compile(r"\d+")
+RE_TOKEN = re.compile(r"[a-z0-9]+")
+RE_LOTE = re.compile(r"(autorizar|reprovar)\s+(todos|pedidos\b)")
+RE_ITENS = re.compile(r"itens\s+do\s+pedido\s+\d+")
+RE_MAIS = re.compile(r"(?:ver\s+)?mais(?:\s+([0-9a-f]{8}))?|proxima(?:\s+pagina)?")
+
+SAUDACOES = frozenset({"oi", "ola", "bom dia", "boa tarde", "boa noite"})
+
+
+def normalizar(texto: str) -> str:
+    """Minúsculas, sem acentos e sem espaços nas pontas."""
+    t = unicodedata.normalize("NFKD", (texto or "").strip().lower())
+    return "".join(c for c in t if not unicodedata.combining(c))
+
+
+class Analise:
+    """Resultado da passagem única sobre a mensagem."""
+
+    __slots__ = ("texto", "tokens", "datas", "cpf", "empresa", "ids")
+
+    def __init__(self, texto: str):
+        self.texto = normalizar(texto)
+        self.tokens = frozenset(RE_TOKEN.findall(self.texto))
+
+        # Entidades: datas, CPF e empresa são retirados do texto antes de
+        # procurar ids, para que "2024-01-01" não vire o pedido 1.
+        resto = self.texto
+        self.datas = RE_DATA.findall(resto)
+        resto = RE_DATA.sub(" ", resto)
+
+        m = RE_CPF.search(resto)
+        self.cpf = re.sub(r"\D", "", m.group(0)) if m else None
+        resto = RE_CPF.sub(" ", resto)
+
+        m = RE_EMPRESA.search(resto)
+        self.empresa = m.group(1) if m else None
+        resto = RE_EMPRESA.sub(" ", resto)
+
+        self.ids = [int(n) for n in RE_NUMERO.findall(resto)]
+
+    def entidades(self) -> dict:
+        return {"datas": self.datas, "cpf": self.cpf, "empresa": self.empresa, "ids": self.ids}
+
+
+# ============================================================
+# 📋 REGRAS (ordem = prioridade)
+# ============================================================
+def _mais(a):
+    # "mais", "ver mais", "próxima página" ou o botão "mais <cursor>"
+    m = RE_MAIS.fullmatch(a.texto)
+    return {"cursor": m.group(1)} if m else None
+
+def _saudacao(a):
+    return {} if a.texto in SAUDACOES else None
+
+def _lote_pedidos(a):
+    m = RE_LOTE.match(a.texto)
+    if not m:
+        return None
+    return {"decisao": m.group(1), "todos": "todos" in a.tokens, "pedido_ids": a.ids}
+
+def _pedidos_pendentes(a):
+    if a.tokens & {"pedido", "pedidos"} and a.tokens & {"pendente", "pendentes"}:
+        return {}
+    return None
+
+def _itens_pedido(a):
+    return {"pedido_id": a.ids[-1]} if a.ids and RE_ITENS.search(a.texto) else None
+
+def _autorizar_pedido(a):
+    return {"pedido_id": a.ids[-1]} if a.ids and "autorizar pedido" in a.texto else None
+
+def _reprovar_pedido(a):
+    return {"pedido_id": a.ids[-1]} if a.ids and "reprovar pedido" in a.texto else None
+
+def _relatorio_pdf(a):
+    # "relatório" sozinho não é PDF de pedido: exige "pdf" ou "pedido" junto com um id
+    if not a.ids:
+        return None
+    if "pdf" in a.tokens or (a.tokens & {"pedido", "pedidos"} and "relatorio" in a.tokens):
+        return {"pedido_id": a.ids[-1]}
+    return None
+
+def _link_boleto(a):
+    if ("boleto" in a.tokens or "segunda via" in a.texto) and len(a.ids) >= 2:
+        return {"titulo_id": a.ids[-2], "parcela_id": a.ids[-1]}
+    return None
+
+def _cpf_digitado(a):
+    return {"cpf": a.cpf} if a.cpf else None
+
+def _buscar_boletos_cpf(a):
+    return {} if "boleto" in a.tokens or "boletos" in a.tokens or "segunda via" in a.texto else None
+
+def _confirmar(a):
+    return {} if "confirmar" in a.tokens else None
+
+def _resumo_financeiro(a):
+    if a.tokens & {"resumo", "dre", "resultado"} or "relatorio financeiro" in a.texto:
+        return {}
+    return None
+
+def _gastos_por_obra(a):
+    return {} if a.tokens & {"gasto", "gastos"} and a.tokens & {"obra", "obras"} else None
+
+def _gastos_por_centro_custo(a):
+    return {} if "centro de custo" in a.texto or "centros de custo" in a.texto else None
+
+def _alertas(a):
+    return {} if a.tokens & {"alerta", "alertas", "anomalia", "anomalias"} else None
+
+def _analise_financeira(a):
+    return {} if "analise" in a.tokens else None
+
+def _apresentacao_gamma(a):
+    return {} if a.tokens & {"apresentacao", "slides", "gamma"} else None
+
+def _definir_filtros(a):
+    return {} if a.empresa or a.datas or "empresa" in a.tokens else None
+
+
+# (ação, gatilhos que precisam aparecer entre os tokens — None = sempre avalia, regra)
+REGRAS = [
+    ("mais", {"mais", "proxima"}, _mais),
+    ("saudacao", {"oi", "ola", "bom", "boa"}, _saudacao),
+    ("decidir_pedidos_lote", {"autorizar", "reprovar"}, _lote_pedidos),
+    ("listar_pedidos_pendentes", {"pendente", "pendentes"}, _pedidos_pendentes),
+    ("itens_pedido", {"itens"}, _itens_pedido),
+    ("autorizar_pedido", {"autorizar"}, _autorizar_pedido),
+    ("reprovar_pedido", {"reprovar"}, _reprovar_pedido),
+    ("relatorio_pdf", {"pdf", "relatorio"}, _relatorio_pdf),
+    ("link_boleto", {"boleto", "via"}, _link_boleto),
+    ("cpf_digitado", None, _cpf_digitado),
+    ("buscar_boletos_cpf", {"boleto", "boletos", "via"}, _buscar_boletos_cpf),
+    ("confirmar", {"confirmar"}, _confirmar),
+    ("apresentacao_gamma", {"apresentacao", "slides", "gamma"}, _apresentacao_gamma),
+    ("resumo_financeiro", {"resumo", "dre", "resultado", "relatorio"}, _resumo_financeiro),
+    ("gastos_por_obra", {"gasto", "gastos"}, _gastos_por_obra),
+    ("gastos_por_centro_custo", {"centro", "centros"}, _gastos_por_centro_custo),
+    ("alertas", {"alerta", "alertas", "anomalia", "anomalias"}, _alertas),
+    ("analise_financeira", {"analise"}, _analise_financeira),
+    ("definir_filtros", None, _definir_filtros),
+]
+REGRAS = [(acao, frozenset(g) if g else None, regra) for acao, g, regra in REGRAS]
+
+
+# Botões do chat enviam o próprio nome da ação como texto ("gastos_por_obra")
+ACOES_DIRETAS = frozenset({
+    "listar_pedidos_pendentes", "buscar_boletos_cpf", "confirmar", "resumo_financeiro",
+    "gastos_por_obra", "gastos_por_centro_custo", "alertas", "analise_financeira", "apresentacao_gamma",
+})
+
+
+def classificar(texto: str) -> dict:
+    """
+    Classifica a mensagem e devolve {"acao", "parametros", "entidades"}.
+    acao=None quando nenhuma regra casa.
+    """
+    a = Analise(texto)
+    if a.texto in ACOES_DIRETAS:
+        return {"acao": a.texto, "parametros": {}, "entidades": a.entidades()}
+    for acao, gatilhos, regra in REGRAS:
+        if gatilhos is not None and not (gatilhos & a.tokens):
+            continue
+        parametros = regra(a)
+        if parametros is not None:
+            return {"acao": acao, "parametros": parametros, "entidades": a.entidades()}
+    return {"acao": None, "parametros": {}, "entidades": a.entidades()}
+
+
+def filtros_das_entidades(entidades: dict) -> dict:
+    """Converte as entidades extraídas no formato de filtros do gerar_relatorio_json."""
+    filtros = {}
+    datas = entidades.get("datas") or []
+    if datas:
+        filtros["startDate"] = datas[0]
+    if len(datas) >= 2:
+        filtros["endDate"] = datas[1]
+    if entidades.get("empresa"):
+        filtros["enterpriseId"] = entidades["empresa"]
+    return filtros
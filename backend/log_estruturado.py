@@ -0,0 +1,171 @@
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import sys
+from logging.handlers import QueueHandler, QueueListener
+
+from metricas import Contador
+
+# ============================================================
+# 📝 LOGS ESTRUTURADOS, AMOSTRADOS E FORA DO CAMINHO DA REQUISIÇÃO
+# ============================================================
+# `evento("categoria", "mensagem", campo=valor, ...)` é o jeito de logar nos
+# caminhos quentes. Na thread da requisição só acontece:
+#   1. checagem de nível da categoria (logger "constru.<categoria>");
+#   2. sorteio da amostragem da categoria;
+#   3. um put_nowait numa fila.
+# A formatação (inclusive repr de payloads) e a escrita ficam numa thread
+# de fundo (QueueListener). Fila cheia → o registro é descartado e contado.
+#
+#   LOG_NIVEL       = nível padrão (INFO)
+#   LOG_NIVEIS      = níveis por categoria, ex: "whatsapp.payload=DEBUG,sienge.boletos=WARNING"
+#   LOG_AMOSTRAGEM  = fração registrada por categoria, ex: "sienge.http=0.1,chat=1"
+#   LOG_FORMATO     = "texto" (padrão) ou "json" (uma linha por registro)
+#   LOG_FILA_MAX    = tamanho máximo da fila (10000)
+#   LOG_CAMPO_MAX   = caracteres por campo antes de truncar (500)
+#   LOG_ASSINCRONO  = "0" escreve direto na thread chamadora (depuração local)
+
+PREFIXO = "constru"
+
+_enfileirados = Contador(
+    "constru_logs_total", "Registros de log aceitos na fila por categoria", ("categoria",))
+_descartados = Contador(
+    "constru_logs_descartados_total", "Registros de log descartados (amostragem ou fila cheia)", ("categoria", "motivo"))
+
+
+def _ler_pares(valor: str) -> dict:
+    pares = {}
+    for item in (valor or "").split(","):
+        if "=" in item:
+            k, v = item.split("=", 1)
+            pares[k.strip()] = v.strip()
+    return pares
+
+
+_amostragem = {k: float(v) for k, v in _ler_pares(os.getenv("LOG_AMOSTRAGEM", "")).items()}
+_campo_max = int(os.getenv("LOG_CAMPO_MAX", "500"))
+_loggers = {}
+_listener = None
+
+
+def _logger(categoria: str) -> logging.Logger:
+    lg = _loggers.get(categoria)
+    if lg is None:
+        lg = _loggers[categoria] = logging.getLogger(f"{PREFIXO}.{categoria}")
+    return lg
+
+
+def ativo(categoria: str, nivel: int = logging.INFO) -> bool:
+    """True se um evento dessa categoria/nível seria registrado (para evitar montar payloads à toa)."""
+    return _logger(categoria).isEnabledFor(nivel)
+
+
+def evento(categoria: str, mensagem: str, nivel: int = logging.INFO, **campos):
+    """Registra um evento estruturado; os campos só viram texto na thread de fundo."""
+    lg = _logger(categoria)
+    if not lg.isEnabledFor(nivel):
+        return
+    fracao = _amostragem.get(categoria)
+    if fracao is not None and nivel < logging.WARNING and random.random() >= fracao:
+        _descartados.inc(categoria, "amostragem")
+        return
+    lg.log(nivel, mensagem, extra={"campos": campos, "categoria": categoria})
+
+
+# ============================================================
+# 🧵 FORMATAÇÃO (roda na thread do QueueListener)
+# ============================================================
+def _valor(v) -> str:
+    s = v if isinstance(v, str) else repr(v)
+    if len(s) > _campo_max:
+        s = s[:_campo_max] + f"…(+{len(s) - _campo_max})"
+    return s
+
+
+class FormatoTexto(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s %(message)s")
+
+    def format(self, record):
+        linha = super().format(record)
+        campos = getattr(record, "campos", None)
+        if campos:
+            linha += " | " + " ".join(f"{k}={_valor(v)}" for k, v in campos.items())
+        return linha
+
+
+class FormatoJSON(logging.Formatter):
+    def format(self, record):
+        dados = {
+            "ts": round(record.created, 3),
+            "nivel": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for k, v in (getattr(record, "campos", None) or {}).items():
+            dados[k] = v if isinstance(v, (int, float, bool, type(None))) else _valor(v)
+        if record.exc_text or record.exc_info:
+            dados["exc"] = record.exc_text or self.formatException(record.exc_info)
+        return json.dumps(dados, ensure_ascii=False, default=str)
+
+
+class _FilaHandler(QueueHandler):
+    """QueueHandler que NÃO formata na thread chamadora e não bloqueia com fila cheia."""
+
+    def prepare(self, record):
+        # O QueueHandler padrão chama self.format() aqui (na requisição).
+        # Só fixamos o traceback, que não pode esperar o frame sumir.
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            _descartados.inc(getattr(record, "categoria", record.name), "fila_cheia")
+            return
+        _enfileirados.inc(getattr(record, "categoria", record.name))
+
+
+def configurar_logs(stream=None):
+    """Troca os handlers do root por fila + thread de escrita. Idempotente."""
+    global _listener
+    nivel = logging.getLevelName(os.getenv("LOG_NIVEL", "INFO").upper())
+    raiz = logging.getLogger()
+    raiz.setLevel(nivel)
+    for categoria, nome_nivel in _ler_pares(os.getenv("LOG_NIVEIS", "")).items():
+        _logger(categoria).setLevel(logging.getLevelName(nome_nivel.upper()))
+
+    saida = logging.StreamHandler(stream or sys.stderr)
+    saida.setFormatter(FormatoJSON() if os.getenv("LOG_FORMATO", "texto") == "json" else FormatoTexto())
+
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+    for h in list(raiz.handlers):
+        raiz.removeHandler(h)
+
+    if os.getenv("LOG_ASSINCRONO", "1") == "0":
+        raiz.addHandler(saida)
+        return
+
+    fila = queue.Queue(maxsize=int(os.getenv("LOG_FILA_MAX", "10000")))
+    raiz.addHandler(_FilaHandler(fila))
+    _listener = QueueListener(fila, saida, respect_handler_level=False)
+    _listener.start()
+
+
+def encerrar_logs():
+    """Esvazia a fila e para a thread de escrita (chamado no shutdown)."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(encerrar_logs)
@@ -1,14 +1,13 @@
 from fastapi import FastAPI, Form, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import PlainTextResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
-import logging, re, base64, os
-import pandas as pd
-import requests  # <-- para chamar a API do WhatsApp Cloud
+import logging, re, base64, os, time, hmac
 
-# Twilio
-from twilio.rest import Client
+# pandas, plotly (dashboard_financeiro) e OpenAI (sienge_ia) são importados
+# só na primeira intenção que precisa deles: o cold start no Render fica só
+# com FastAPI + requests e o webhook responde bem antes.
 
 # === MÓDULOS LOCAIS ===
 from sienge.sienge_pedidos import (
@@ -16,25 +15,50 @@ from sienge.sienge_pedidos import (
     itens_pedido,
     autorizar_pedido,
     reprovar_pedido,
+    decidir_pedidos_em_lote,
     gerar_relatorio_pdf_bytes,
 )
 from sienge.sienge_boletos import buscar_boletos_por_cpf, gerar_link_boleto
-from sienge.sienge_financeiro import gerar_relatorio_json
-from sienge.sienge_ia import gerar_analise_financeira
-from dashboard_financeiro import gerar_relatorio_gamma
+from sienge.sienge_financeiro import (
+    CAMPOS_ALERTAS, ListagemIncompleta, alertas_financeiros, detectar_alertas, gerar_relatorio_json, iterar_despesas,
+    resumo_alertas,
+)
+from intencoes import classificar, filtros_das_entidades
+from sessao import criar_armazenamento_sessao
+from circuito import CircuitoAberto, estado_disjuntores
+import metricas
+from rastreio import RastreioMiddleware, span, debug_ativo, rastreio_atual
+from log_estruturado import configurar_logs, evento
+import exportacao
+from envio import despachante
+from aquecimento import aquecedor
+from cursores import cursores
+from faixas import FaixaOcupada, escalonador
+from armazem import ARMAZEM, ArmazemIncompleto, armazem
+import prazo
+from prazo import PRAZOS, PRAZO_RESERVA_IA, PRAZO_WEBHOOK, PrazoEsgotado, partes_faltando
 
 # ============================================================
 # 🚀 CONFIGURAÇÃO DO SERVIDOR FASTAPI
 # ============================================================
-logging.basicConfig(level=logging.INFO)
+configurar_logs()
 app = FastAPI()
 
+app.add_middleware(RastreioMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"], allow_credentials=True,
     allow_methods=["*"], allow_headers=["*"],
 )
 
+@app.on_event("startup")
+def _iniciar_aquecimento():
+    aquecedor.iniciar()
+
+@app.on_event("shutdown")
+def _parar_aquecimento():
+    aquecedor.parar()
+
 os.makedirs("static", exist_ok=True)
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
@@ -44,15 +68,10 @@ app.mount("/static", StaticFiles(directory="static"), name="static")
 TWILIO_ACCOUNT_SID = os.getenv("TWILIO_ACCOUNT_SID")
 TWILIO_AUTH_TOKEN = os.getenv("TWILIO_AUTH_TOKEN")
 TWILIO_WHATSAPP_FROM = os.getenv("TWILIO_WHATSAPP_FROM", "whatsapp:+14155238886")
+# Envio pela API REST da Twilio (mesma sessão/pool do despachante, sem o SDK)
+TWILIO_API_URL = os.getenv("TWILIO_API_URL", "https://api.twilio.com").rstrip("/")
 
-twilio_client = None
-if TWILIO_ACCOUNT_SID and TWILIO_AUTH_TOKEN:
-    try:
-        twilio_client = Client(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN)
-        logging.info("✅ Cliente Twilio inicializado com sucesso.")
-    except Exception as e:
-        logging.error(f"❌ Erro ao inicializar cliente Twilio: {e}")
-else:
+if not (TWILIO_ACCOUNT_SID and TWILIO_AUTH_TOKEN):
     logging.warning("⚠️ TWILIO_ACCOUNT_SID ou TWILIO_AUTH_TOKEN não configurados.")
 
 # ============================================================
@@ -65,6 +84,7 @@ else:
 WHATSAPP_PHONE_NUMBER_ID = os.getenv("WHATSAPP_PHONE_NUMBER_ID")
 WHATSAPP_TOKEN = os.getenv("WHATSAPP_TOKEN")
 WHATSAPP_VERIFY_TOKEN = os.getenv("WHATSAPP_VERIFY_TOKEN", "construai123")
+META_GRAPH_URL = os.getenv("META_GRAPH_URL", "https://graph.facebook.com/v20.0").rstrip("/")
 
 # ============================================================
 # 📩 MODELOS DE DADOS
@@ -82,175 +102,258 @@ def money(v):
     except Exception:
         return "R$ 0,00"
 
-usuarios_contexto = {}
-
-def extrair_periodo(texto: str):
-    datas = re.findall(r"\d{4}-\d{2}-\d{2}", texto)
-    if len(datas) >= 2:
-        return {"startDate": datas[0], "endDate": datas[1]}
-    if len(datas) == 1:
-        return {"startDate": datas[0]}
-    return {}
-
-def extrair_empresa(texto: str):
-    m = re.search(r"empresa\s+(\d+)", texto)
-    if m:
-        return {"enterpriseId": m.group(1)}
-    return {}
+# Contexto por usuário (filtros, CPF, confirmação) — memória LRU+TTL ou SQLite compartilhado
+sessoes = criar_armazenamento_sessao()
 
 def filtros_do_usuario(user: str):
-    return usuarios_contexto.get(user, {}).get("filtros", {})
+    return sessoes.obter(user).get("filtros", {})
 
 def atualizar_filtros(user: str, novos: dict):
-    ctx = usuarios_contexto.setdefault(user, {})
-    atuais = ctx.get("filtros", {})
-    atuais.update({k: v for k, v in novos.items() if v})
-    ctx["filtros"] = atuais
+    atuais = sessoes.mesclar_filtros(user, novos)  # leitura e gravação atômicas no store
+    aquecedor.registrar(atuais)  # os filtros mais usados entram no aquecimento
     return atuais
 
 # ============================================================
-# 🔎 HELPERS FINANCEIROS EM CIMA DO gerar_relatorio_json
+# 🔎 HELPERS FINANCEIROS (armazém local ou gerar_relatorio_json)
 # ============================================================
+def do_armazem(consulta, *args):
+    """Resposta do armazém local (SQL sobre Parquet), ou None para cair no gerar_relatorio_json."""
+    if not ARMAZEM:
+        return None
+    try:
+        return consulta(*args)
+    except (CircuitoAberto, PrazoEsgotado):
+        raise
+    except ArmazemIncompleto as e:
+        logging.warning(f"⚠️ Armazém local incompleto ({e}); usando o relatório direto do Sienge.")
+    except Exception:
+        logging.exception("❌ Erro consultando o armazém local; usando o relatório direto do Sienge.")
+    return None
+
 def resumo_financeiro(**filtros) -> str:
-    rel = gerar_relatorio_json(**filtros)
-    dre_fmt = rel.get("dre", {}).get("formatado", {})
-    if not dre_fmt:
+    dre = do_armazem(armazem.resumo, filtros)
+    if dre is not None:
+        titulos = dre["titulos"]
+    else:
+        # Só o DRE: bastam as duas listagens, sem nomes nem apropriações
+        rel = gerar_relatorio_json(campos={"dre"}, **filtros)
+        dre = rel.get("dre", {}).get("valores", {})
+        titulos = rel.get("total_registros", 0)
+    if not dre:
         return "⚠️ Sem dados para o período/empresa informados."
 
-    receita = dre_fmt.get("Receita Líquida") or dre_fmt.get("Receita", 0)
-    custos = dre_fmt.get("Custo") or dre_fmt.get("Custos", 0)
-    despesas = dre_fmt.get("Despesas") or dre_fmt.get("Despesas Operacionais", 0)
-    resultado = dre_fmt.get("Lucro Líquido") or dre_fmt.get("Resultado", 0)
-
+    with span("render"):
+        linhas = [
+            "📊 *Resumo Financeiro (DRE)*",
+            f"• Receitas: {money(dre.get('receitas', 0))}",
+            f"• Despesas: {money(dre.get('despesas', 0))}",
+            f"• Resultado: {money(dre.get('lucro', 0))}",
+            f"🧾 Títulos a pagar no período: {titulos}",
+        ]
+        return "\n".join(linhas)
+
+def analise_sem_ia(rel: dict, df, digest: str) -> str:
+    """Quando a IA não coube no prazo: os números do período e os alertas, sem o comentário."""
+    dre = rel.get("dre", {}).get("valores", {})
     linhas = [
-        "📊 *Resumo Financeiro (DRE)*",
-        f"• Receita: {money(receita)}",
-        f"• Custos: {money(custos)}",
-        f"• Despesas: {money(despesas)}",
-        f"• Resultado: {money(resultado)}",
+        "📊 *Relatório Financeiro*",
+        f"• Receitas: {money(dre.get('receitas', 0))}",
+        f"• Despesas: {money(dre.get('despesas', 0))}",
+        f"• Resultado: {money(dre.get('lucro', 0))}",
     ]
+    if "obra" in df.columns:
+        linhas.append("\n🏗️ *Maiores gastos por obra*")
+        top = df.groupby("obra")["valor_total"].sum().nlargest(5)
+        linhas += [f"• {obra or '-'}: {money(valor)}" for obra, valor in top.items()]
+    if digest:
+        linhas += ["\n🚨 *Alertas*", digest]
     return "\n".join(linhas)
 
-def gastos_por_obra(**filtros) -> str:
-    rel = gerar_relatorio_json(**filtros)
-    obras = rel.get("por_obra") or rel.get("gastos_por_obra") or []
-    if not obras:
-        return "⚠️ Nenhum gasto por obra encontrado."
-
-    linhas = ["🏗️ *Gastos por obra*"]
-    for o in obras[:20]:
-        nome = o.get("obra") or o.get("obra_nome") or o.get("descricao") or "-"
-        valor = o.get("valor") or o.get("total") or 0
-        linhas.append(f"• {nome}: {money(valor)}")
-    return "\n".join(linhas)
+def _gastos_por(campo: str, filtros: dict) -> list:
+    totais = do_armazem(armazem.fatiar, campo, filtros)
+    if totais is None:
+        chave = {"obra": "por_obra", "centro_custo": "por_centro_custo"}[campo]
+        totais = gerar_relatorio_json(campos={chave}, **filtros).get(chave) or []
+    return totais
+
+def gastos_por_obra(**filtros) -> list:
+    """Uma linha por obra, do maior gasto para o menor (a paginação fica com o chamador)."""
+    totais = _gastos_por("obra", filtros)
+    with span("render"):
+        return [f"• {o.get('obra') or '-'}: {money(o.get('valor') or 0)}" for o in totais]
+
+def gastos_por_centro_custo(**filtros) -> list:
+    totais = _gastos_por("centro_custo", filtros)
+    with span("render"):
+        return [f"• {c.get('centro_custo') or '-'}: {money(c.get('valor') or 0)}" for c in totais]
+
+def paginado(user: str, titulo: str, linhas: list, **kwargs) -> dict:
+    """Primeira página da lista; o cursor fica na sessão para um "mais" sem argumento."""
+    resposta = cursores.paginar(user, titulo, linhas, **kwargs)
+    sessoes.atualizar(user, cursor=resposta["cursor"])
+    return resposta
 
-def gastos_por_centro_custo(**filtros) -> str:
-    rel = gerar_relatorio_json(**filtros)
-    centros = rel.get("por_centro_custo") or rel.get("gastos_por_centro_custo") or []
-    if not centros:
-        return "⚠️ Nenhum gasto por centro de custo encontrado."
-
-    linhas = ["📂 *Gastos por centro de custo*"]
-    for c in centros[:20]:
-        nome = c.get("centro_custo") or c.get("descricao") or "-"
-        valor = c.get("valor") or c.get("total") or 0
-        linhas.append(f"• {nome}: {money(valor)}")
-    return "\n".join(linhas)
+# ============================================================
+# 📦 HELPERS DE PEDIDOS
+# ============================================================
+def confirmacao_lote_pedidos(decisao: str, pendentes: list) -> dict:
+    """Confirmação do "autorizar/reprovar todos": só os pedidos listados agora, nunca os que chegarem depois."""
+    if not pendentes:
+        return {"text": "📭 Nenhum pedido pendente.", "buttons": MENU_INICIAL}
+    verbo = "Autorizar" if decisao == "autorizar" else "Reprovar"
+    ids = [p["id"] for p in pendentes]
+    total = sum(p.get("totalAmount") or 0 for p in pendentes)
+    return {
+        "text": f"⚠️ {verbo} *{len(ids)}* pedido(s) pendente(s), total de *{money(total)}*?\n"
+                f"Pedidos: {', '.join(map(str, ids))}",
+        "buttons": [
+            {"label": f"✅ {verbo} {len(ids)} pedido(s)", "action": f"{decisao} pedidos {' '.join(map(str, ids))}"},
+            {"label": "📋 Ver pendentes", "action": "listar_pedidos_pendentes"},
+        ],
+    }
+
+def resposta_lote_pedidos(decisao: str, resultados: list, pendentes: list) -> dict:
+    """Monta a tabela de sucesso/falha do lote e o menu com os pedidos que restaram."""
+    verbo = "autorizado" if decisao == "autorizar" else "reprovado"
+    titulo = "Autorização" if decisao == "autorizar" else "Reprovação"
+    ok = sum(1 for r in resultados if r["ok"])
+
+    linhas = [f"🧾 *{titulo} em lote* — {ok}/{len(resultados)} com sucesso"]
+    for r in resultados:
+        if r["ok"]:
+            linhas.append(f"✅ Pedido {r['pedido_id']} — {verbo}")
+        else:
+            motivo = f"HTTP {r['status']}" if r.get("status") else (r.get("erro") or "erro")
+            linhas.append(f"❌ Pedido {r['pedido_id']} — falhou ({motivo})")
+
+    linhas.append("")
+    linhas.append(f"📋 Restam {len(pendentes)} pedido(s) pendente(s)." if pendentes else "📭 Nenhum pedido pendente.")
+    botoes = [{"label": f"Itens {p['id']}", "action": f"itens do pedido {p['id']}"} for p in pendentes]
+    return {"text": "\n".join(linhas), "buttons": botoes}
 
 # ============================================================
 # 🧠 INTERPRETAÇÃO DE INTENÇÃO
 # ============================================================
 def entender_intencao(texto: str):
-    t = (texto or "").strip().lower()
-
-    if t in ["oi", "ola", "olá", "bom dia", "boa tarde", "boa noite"]:
-        return {"acao": "saudacao"}
-    if "pedido" in t and "pendente" in t:
-        return {"acao": "listar_pedidos_pendentes"}
-    if re.search(r"itens\s+do\s+pedido\s+\d+", t):
-        pid = re.findall(r"\d+", t)[-1]
-        return {"acao": "itens_pedido", "parametros": {"pedido_id": int(pid)}}
-    if "autorizar pedido" in t:
-        pid = re.findall(r"\d+", t)[-1]
-        return {"acao": "autorizar_pedido", "parametros": {"pedido_id": int(pid)}}
-    if "reprovar pedido" in t:
-        pid = re.findall(r"\d+", t)[-1]
-        return {"acao": "reprovar_pedido", "parametros": {"pedido_id": int(pid)}}
-    if "pdf" in t or "relatorio" in t or "relatório" in t:
-        nums = re.findall(r"\d+", t)
-        return {"acao": "relatorio_pdf", "parametros": {"pedido_id": int(nums[-1])}} if nums else {}
-    if "segunda via" in t or "boleto" in t:
-        nums = re.findall(r"\d+", t)
-        if len(nums) >= 2:
-            return {"acao": "link_boleto", "parametros": {"titulo_id": int(nums[-2]), "parcela_id": int(nums[-1])}}
-        return {"acao": "buscar_boletos_cpf"}
-    if re.search(r"\d{11}|\d{3}\.\d{3}\.\d{3}-\d{2}", t):
-        return {"acao": "cpf_digitado", "parametros": {"cpf": t}}
-    if "confirmar" in t:
-        return {"acao": "confirmar"}
-    if "resumo" in t or "dre" in t or "resultado" in t:
-        return {"acao": "resumo_financeiro"}
-    if "gasto" in t and "obra" in t:
-        return {"acao": "gastos_por_obra"}
-    if "centro de custo" in t:
-        return {"acao": "gastos_por_centro_custo"}
-    if "análise" in t or "analise" in t:
-        return {"acao": "analise_financeira"}
-    if "apresentacao" in t or "slides" in t or "gamma" in t:
-        return {"acao": "apresentacao_gamma"}
-    if "empresa" in t or re.search(r"\d{4}-\d{2}-\d{2}", t):
-        return {"acao": "definir_filtros"}
-    return {"acao": None}
+    """Classifica a mensagem pela tabela de regras de `intencoes` (já com as entidades extraídas)."""
+    return classificar(texto)
 
 # ============================================================
 # 💬 ENDPOINT PRINCIPAL DE MENSAGENS (JÁ FUNCIONAVA)
 # ============================================================
 @app.post("/mensagem")
 async def mensagem(msg: Message):
-    logging.info(f"📩 Mensagem recebida: {msg.user} -> {msg.text}")
+    evento("chat", "📩 Mensagem recebida", usuario=msg.user, texto=msg.text)
+    inicio = time.perf_counter()
     texto = (msg.text or "").strip()
+    with span("intencao"):
+        intencao = entender_intencao(texto)
+    entidades = intencao["entidades"]
+    rotulo = "definir_filtros" if entidades.get("datas") or entidades.get("empresa") else intencao.get("acao")
+    rastreio = rastreio_atual()
+    if rastreio is not None:
+        rastreio.acao = intencao.get("acao") or ""  # vai no Server-Timing (o gate confere a intenção do servidor)
+    try:
+        # Roda na faixa do custo da intenção (leve/media/pesada), fora do event loop,
+        # com o prazo da faixa valendo para todas as chamadas ao Sienge/OpenAI
+        with prazo.com_prazo(PRAZOS.get(escalonador.faixa_de(rotulo).nome)):
+            try:
+                resposta = await escalonador.executar(rotulo, msg.user, responder_mensagem, msg, texto, intencao)
+            except FaixaOcupada as e:
+                resposta = resposta_faixa_ocupada(e)
+            except PrazoEsgotado as e:
+                resposta = resposta_prazo_esgotado(e)
+            faltando = partes_faltando()
+        if faltando:
+            evento("chat", "⏱️ Resposta parcial por prazo", nivel=logging.WARNING, usuario=msg.user,
+                   intencao=rotulo, partes=faltando)
+            resposta["parcial"] = faltando
+            resposta["text"] = f"{resposta.get('text', '')}\n\n{aviso_parcial(faltando)}"
+        if debug_ativo():
+            resposta["rastreio"] = rastreio_atual().resumo()
+        return resposta
+    finally:
+        metricas.mensagem_segundos.observar(time.perf_counter() - inicio, rotulo or "desconhecida")
+
+MENU_INICIAL = [
+    {"label": "📋 Pedidos Pendentes", "action": "listar_pedidos_pendentes"},
+    {"label": "💳 Segunda Via de Boletos", "action": "buscar_boletos_cpf"},
+    {"label": "📊 Resumo Financeiro", "action": "resumo_financeiro"},
+    {"label": "🏗️ Gastos por Obra", "action": "gastos_por_obra"},
+    {"label": "🚨 Alertas", "action": "alertas"},
+    {"label": "🎬 Relatório Gamma Dark Mode", "action": "apresentacao_gamma"},
+]
+
+def resposta_faixa_ocupada(e: FaixaOcupada) -> dict:
+    evento("chat", "⏳ Pedido recusado na faixa", faixa=e.faixa, motivo=e.motivo)
+    if e.motivo == "usuario":
+        texto = ("⏳ Seu pedido anterior ainda está sendo processado. Assim que ele chegar, pode mandar o próximo."
+                 if e.faixa == "pesada" else "⏳ Ainda estou terminando seus pedidos anteriores. Tente de novo em instantes.")
+    else:
+        texto = "⏳ Muitos relatórios sendo gerados agora. Tente novamente em alguns instantes."
+    return {"text": texto}
 
-    # Atualiza filtros
-    if "empresa" in texto.lower() or re.search(r"\d{4}-\d{2}-\d{2}", texto):
-        novos = {}
-        novos.update(extrair_periodo(texto))
-        novos.update(extrair_empresa(texto))
-        if novos:
-            atualizados = atualizar_filtros(msg.user, novos)
-            return {
-                "text": "🧭 Filtros definidos.\n"
-                        + (f"• Início: {atualizados.get('startDate')}\n" if atualizados.get("startDate") else "")
-                        + (f"• Fim: {atualizados.get("endDate")}\n" if atualizados.get("endDate") else "")
-                        + (f"• Empresa: {atualizados.get('enterpriseId')}\n" if atualizados.get("enterpriseId") else ""),
-                "buttons": [
-                    {"label": "📊 Resumo Financeiro", "action": "resumo_financeiro"},
-                    {"label": "🏗️ Gastos por Obra", "action": "gastos_por_obra"},
-                    {"label": "📂 Gastos por Centro de Custo", "action": "gastos_por_centro_custo"},
-                ],
-            }
+def resposta_prazo_esgotado(e: PrazoEsgotado) -> dict:
+    evento("chat", "⏱️ Prazo da mensagem esgotado", nivel=logging.WARNING, etapa=e.etapa)
+    return {
+        "text": "⏱️ O Sienge está demorando mais que o normal e não deu tempo de montar a resposta. "
+                "Tente novamente em alguns instantes.",
+        "buttons": MENU_INICIAL,
+    }
+
+PARTES_PARCIAIS = {
+    "nomes": "alguns nomes aparecem como N/A",
+    "apropriacoes": "sem o rateio por plano de contas/centro de custo",
+    "boletos": "só parte dos boletos foi conferida",
+    "ia": "sem o comentário da IA",
+}
+
+def aviso_parcial(partes) -> str:
+    detalhes = "; ".join(PARTES_PARCIAIS.get(p, p) for p in partes)
+    return f"⏱️ _Resposta parcial para não demorar demais: {detalhes}._"
+
+def responder_mensagem(msg: Message, texto: str, intencao: dict) -> dict:
+    """Executa a intenção já classificada e monta a resposta do chat."""
+    # Atualiza filtros (datas/empresa já vêm extraídas na mesma passagem da intenção)
+    novos = filtros_das_entidades(intencao["entidades"])
+    if novos:
+        atualizados = atualizar_filtros(msg.user, novos)
+        return {
+            "text": "🧭 Filtros definidos.\n"
+                    + (f"• Início: {atualizados.get('startDate')}\n" if atualizados.get("startDate") else "")
+                    + (f"• Fim: {atualizados.get('endDate')}\n" if atualizados.get("endDate") else "")
+                    + (f"• Empresa: {atualizados.get('enterpriseId')}\n" if atualizados.get("enterpriseId") else ""),
+            "buttons": [
+                {"label": "📊 Resumo Financeiro", "action": "resumo_financeiro"},
+                {"label": "🏗️ Gastos por Obra", "action": "gastos_por_obra"},
+                {"label": "📂 Gastos por Centro de Custo", "action": "gastos_por_centro_custo"},
+            ],
+        }
 
-    intencao = entender_intencao(texto)
     acao = intencao.get("acao")
     parametros = intencao.get("parametros", {}) or {}
     filtros = filtros_do_usuario(msg.user)
 
-    menu_inicial = [
-        {"label": "📋 Pedidos Pendentes", "action": "listar_pedidos_pendentes"},
-        {"label": "💳 Segunda Via de Boletos", "action": "buscar_boletos_cpf"},
-        {"label": "📊 Resumo Financeiro", "action": "resumo_financeiro"},
-        {"label": "🏗️ Gastos por Obra", "action": "gastos_por_obra"},
-        {"label": "🎬 Relatório Gamma Dark Mode", "action": "apresentacao_gamma"},
-    ]
-
     if not texto or acao == "saudacao":
         return {
             "text": "👋 Olá! Sou a Constru.IA.\n"
                     "Posso te ajudar com: Pedidos, Boletos, Resumo Financeiro, Gastos e Relatórios com IA.\n"
                     "Dica: defina filtros com: `empresa 1 2024-01-01 a 2024-12-31`",
-            "buttons": menu_inicial,
+            "buttons": MENU_INICIAL,
         }
 
     try:
+        # ========================================================
+        # 📑 PRÓXIMA PÁGINA DE UMA LISTA (sem consultar o Sienge)
+        # ========================================================
+        if acao == "mais":
+            cursor = parametros.get("cursor") or sessoes.obter(msg.user).get("cursor")
+            pagina = cursores.proxima(msg.user, cursor) if cursor else None
+            if pagina is None:
+                return {"text": "⌛ Essa lista já terminou ou expirou. Peça a consulta de novo.", "buttons": MENU_INICIAL}
+            sessoes.atualizar(msg.user, cursor=pagina["cursor"])
+            return pagina
+
         # ========================================================
         # 💳 BOLETOS / CPF
         # ========================================================
@@ -260,7 +363,7 @@ async def mensagem(msg: Message):
                 return {"text": "⚠️ CPF inválido. Digite novamente."}
             resultado = buscar_boletos_por_cpf(cpf)
             nome = resultado.get("nome", "Cliente não identificado")
-            usuarios_contexto[msg.user] = {"cpf": cpf, "nome": nome, "aguardando_confirmacao": True}
+            sessoes.atualizar(msg.user, cpf=cpf, nome=nome, aguardando_confirmacao=True)
             return {
                 "text": f"🔎 Localizei o cliente *{nome}*. Confirmar para listar as 2ª vias?",
                 "buttons": [
@@ -270,25 +373,25 @@ async def mensagem(msg: Message):
             }
 
         if acao == "buscar_boletos_cpf":
-            return {"text": "💳 Digite o CPF do titular dos boletos.", "buttons": menu_inicial}
+            return {"text": "💳 Digite o CPF do titular dos boletos.", "buttons": MENU_INICIAL}
 
         # ========================================================
         # 💳 CONFIRMAR BOLETOS
         # ========================================================
         if texto.lower() == "confirmar" or acao == "confirmar":
-            ctx = usuarios_contexto.get(msg.user, {})
+            ctx = sessoes.obter(msg.user)
             cpf = ctx.get("cpf")
             if not cpf:
-                return {"text": "⚠️ Nenhum CPF armazenado. Digite novamente.", "buttons": menu_inicial}
+                return {"text": "⚠️ Nenhum CPF armazenado. Digite novamente.", "buttons": MENU_INICIAL}
 
             resultado = buscar_boletos_por_cpf(cpf)
             if "erro" in resultado:
-                return {"text": resultado["erro"], "buttons": menu_inicial}
+                return {"text": resultado["erro"], "buttons": MENU_INICIAL}
 
             nome = resultado.get("nome")
             boletos = resultado.get("boletos", [])
             if not boletos:
-                return {"text": f"📭 Nenhum boleto disponível para {nome}.", "buttons": menu_inicial}
+                return {"text": f"📭 Nenhum boleto disponível para {nome}.", "buttons": MENU_INICIAL}
 
             linhas, botoes = [], []
             for b in boletos:
@@ -307,20 +410,20 @@ async def mensagem(msg: Message):
                     }
                 )
 
-            usuarios_contexto[msg.user] = {}
-            return {
-                "text": f"✅ *Boletos disponíveis para {nome}:*\n\n" + "\n\n".join(linhas[:15]),
-                "buttons": botoes
-                + [
+            sessoes.atualizar(msg.user, cpf=None, nome=None, aguardando_confirmacao=None)
+            return paginado(
+                msg.user, f"✅ *Boletos disponíveis para {nome}:*\n\n", linhas,
+                botoes=botoes, tamanho=15, separador="\n\n",
+                extras=[
                     {"label": "💳 Nova busca por CPF", "action": "buscar_boletos_cpf"},
                     {"label": "📋 Pedidos Pendentes", "action": "listar_pedidos_pendentes"},
                     {"label": "📊 Resumo Financeiro", "action": "resumo_financeiro"},
                 ],
-            }
+            )
 
         if acao == "link_boleto":
             t, p = parametros.get("titulo_id"), parametros.get("parcela_id")
-            return {"text": gerar_link_boleto(t, p), "buttons": menu_inicial}
+            return {"text": gerar_link_boleto(t, p), "buttons": MENU_INICIAL}
 
         # ========================================================
         # 📦 PEDIDOS
@@ -331,7 +434,8 @@ async def mensagem(msg: Message):
                 return {"text": "📭 Nenhum pedido pendente."}
             linhas = [f"📦 Pedido {p['id']} — {money(p.get('totalAmount', 0))}" for p in pedidos]
             botoes = [{"label": f"Itens {p['id']}", "action": f"itens do pedido {p['id']}"} for p in pedidos]
-            return {"text": "\n".join(linhas), "buttons": botoes}
+            return paginado(msg.user, "", linhas, botoes=botoes, tamanho=10,
+                            extras=[{"label": "✅ Autorizar todos", "action": "autorizar todos"}])
 
         if acao == "itens_pedido":
             pid = parametros.get("pedido_id")
@@ -350,6 +454,20 @@ async def mensagem(msg: Message):
             return {"text": autorizar_pedido(parametros["pedido_id"])}
         if acao == "reprovar_pedido":
             return {"text": reprovar_pedido(parametros["pedido_id"])}
+        if acao == "decidir_pedidos_lote":
+            decisao = parametros["decisao"]
+            ids = parametros.get("pedido_ids") or []
+            if parametros.get("todos") and not ids:
+                # "todos" não decide nada: mostra quantidade e total, e o botão leva os ids desta lista
+                return confirmacao_lote_pedidos(decisao, listar_pedidos_pendentes())
+            if not ids:
+                return {
+                    "text": f"⚠️ Informe os pedidos. Ex: `{decisao} pedidos 101 102 103` ou `{decisao} todos`.",
+                    "buttons": MENU_INICIAL,
+                }
+            resultados = decidir_pedidos_em_lote(ids, decisao)
+            # Atualiza a lista de pendentes uma única vez, depois do lote inteiro
+            return resposta_lote_pedidos(decisao, resultados, listar_pedidos_pendentes())
         if acao == "relatorio_pdf":
             pid = parametros.get("pedido_id")
             pdf = gerar_relatorio_pdf_bytes(pid)
@@ -365,37 +483,88 @@ async def mensagem(msg: Message):
         # 💰 FINANCEIRO / IA
         # ========================================================
         if acao == "resumo_financeiro":
-            return {"text": resumo_financeiro(**filtros), "buttons": menu_inicial}
+            return {"text": resumo_financeiro(**filtros), "buttons": MENU_INICIAL}
         if acao == "gastos_por_obra":
-            return {"text": gastos_por_obra(**filtros), "buttons": menu_inicial}
+            linhas = gastos_por_obra(**filtros)
+            if not linhas:
+                return {"text": "⚠️ Nenhum gasto por obra encontrado.", "buttons": MENU_INICIAL}
+            return paginado(msg.user, "🏗️ *Gastos por obra*\n", linhas, extras=MENU_INICIAL)
         if acao == "gastos_por_centro_custo":
-            return {"text": gastos_por_centro_custo(**filtros), "buttons": menu_inicial}
+            linhas = gastos_por_centro_custo(**filtros)
+            if not linhas:
+                return {"text": "⚠️ Nenhum gasto por centro de custo encontrado.", "buttons": MENU_INICIAL}
+            return paginado(msg.user, "📂 *Gastos por centro de custo*\n", linhas, extras=MENU_INICIAL)
+        if acao == "alertas":
+            despesas = do_armazem(armazem.despesas, filtros, CAMPOS_ALERTAS)
+            if despesas is None:
+                alertas = alertas_financeiros(**filtros)
+            else:
+                with span("alertas"):
+                    alertas = detectar_alertas(despesas)
+            if not alertas:
+                return {"text": "✅ Nenhum alerta encontrado nas despesas do período.", "buttons": MENU_INICIAL}
+            icones = {"alta": "🔴", "media": "🟠", "baixa": "🟡"}
+            linhas = [f"{icones.get(a['severidade'], '•')} {a['mensagem']}" for a in alertas]
+            return paginado(msg.user, f"🚨 *Alertas financeiros* ({len(alertas)})\n", linhas, tamanho=10,
+                            extras=MENU_INICIAL)
         if acao == "analise_financeira":
-            rel = gerar_relatorio_json(**filtros)
+            import pandas as pd
+            from sienge.sienge_ia import gerar_analise_financeira
+
+            # A extração para PRAZO_RESERVA_IA antes do prazo: o resto fica para a IA
+            with prazo.reservando(PRAZO_RESERVA_IA):
+                rel = gerar_relatorio_json(**filtros)
             df = pd.DataFrame(rel.get("todas_despesas", []))
             if df.empty:
                 return {"text": "⚠️ Sem dados para análise."}
-            return {"text": gerar_analise_financeira("Relatório Financeiro", df), "buttons": menu_inicial}
+            # A IA recebe uma amostra; os alertas saem da base inteira
+            with span("alertas"):
+                digest = resumo_alertas(detectar_alertas(df))
+            analise = gerar_analise_financeira("Relatório Financeiro", df, alertas=digest)
+            if "ia" in partes_faltando():
+                analise = analise_sem_ia(rel, df, digest)  # o aviso de parcial vai no fim
+            return {"text": analise, "buttons": MENU_INICIAL}
         if acao == "apresentacao_gamma":
-            rel = gerar_relatorio_json(**filtros)
+            import pandas as pd
+            from dashboard_financeiro import gerar_relatorio_gamma
+
+            with prazo.reservando(PRAZO_RESERVA_IA):
+                rel = gerar_relatorio_json(**filtros)
             df = pd.DataFrame(rel.get("todas_despesas", []))
             dre = rel.get("dre", {}).get("formatado", {})
             if df.empty:
                 return {"text": "⚠️ Sem dados para gerar relatório."}
-            link = gerar_relatorio_gamma(df, dre, filtros, msg.user)
+            with span("render"):
+                link = gerar_relatorio_gamma(df, dre, filtros, msg.user)
             return {
                 "text": f"🎬 Relatório Gamma (Dark Mode) gerado!\n\n[📊 Acessar Relatório]({link})",
-                "buttons": menu_inicial,
+                "buttons": MENU_INICIAL,
             }
 
         return {
             "text": "🤖 Não entendi. Dica: `empresa 1 2024-01-01 a 2024-12-31`",
-            "buttons": menu_inicial,
+            "buttons": MENU_INICIAL,
         }
 
+    except PrazoEsgotado as e:
+        return resposta_prazo_esgotado(e)
+    except ListagemIncompleta as e:
+        # Sem um mês inteiro os totais sairiam errados: melhor não responder número nenhum
+        evento("chat", "⚠️ Listagem do Sienge incompleta", nivel=logging.WARNING, erro=str(e))
+        return {
+            "text": "⚠️ O Sienge não devolveu todos os lançamentos do período, então não dá para montar "
+                    "os totais com segurança. Tente novamente em alguns instantes.",
+            "buttons": MENU_INICIAL,
+        }
+    except CircuitoAberto as e:
+        logging.warning(f"⚡ Resposta degradada: {e}")
+        return {
+            "text": "⚠️ O Sienge está indisponível no momento. Tente novamente em alguns instantes.",
+            "buttons": MENU_INICIAL,
+        }
     except Exception as e:
         logging.exception("❌ Erro geral:")
-        return {"text": f"Ocorreu um erro: {e}", "buttons": menu_inicial}
+        return {"text": f"Ocorreu um erro: {e}", "buttons": MENU_INICIAL}
 
 # ============================================================
 # 🌐 WEBHOOK WHATSAPP CLOUD API (VERIFICAÇÃO)
@@ -422,14 +591,14 @@ async def verify_whatsapp(request: Request):
 # ============================================================
 def send_whatsapp_cloud_message(to_number: str, body: str):
     """
-    Envia mensagem de texto usando WhatsApp Cloud API.
+    Enfileira mensagem de texto para a WhatsApp Cloud API (envio em segundo plano).
     to_number: número sem 'whatsapp:', ex: 559193808761
     """
     if not (WHATSAPP_PHONE_NUMBER_ID and WHATSAPP_TOKEN):
         logging.error("❌ WHATSAPP_PHONE_NUMBER_ID ou WHATSAPP_TOKEN não configurados.")
         return
 
-    url = f"https://graph.facebook.com/v20.0/{WHATSAPP_PHONE_NUMBER_ID}/messages"
+    url = f"{META_GRAPH_URL}/{WHATSAPP_PHONE_NUMBER_ID}/messages"
     headers = {
         "Authorization": f"Bearer {WHATSAPP_TOKEN}",
         "Content-Type": "application/json",
@@ -441,20 +610,34 @@ def send_whatsapp_cloud_message(to_number: str, body: str):
         "text": {"body": body},
     }
 
-    try:
-        resp = requests.post(url, headers=headers, json=payload)
-        logging.info(f"📤 Enviando mensagem Cloud API → {to_number}: {body}")
-        logging.info(f"Resposta Meta: {resp.status_code} - {resp.text}")
-    except Exception as e:
-        logging.error(f"❌ Erro ao enviar mensagem via Cloud API: {e}")
+    despachante.enviar("meta", to_number, {"method": "POST", "url": url, "headers": headers, "json": payload})
+    evento("whatsapp.payload", "📤 Resposta enfileirada", nivel=logging.DEBUG, para=to_number, corpo=body)
+
+
+def send_twilio_message(to: str, body: str):
+    """Enfileira mensagem WhatsApp pela API REST da Twilio. to: 'whatsapp:+55...'"""
+    if not (TWILIO_ACCOUNT_SID and TWILIO_AUTH_TOKEN):
+        logging.error("❌ Twilio não configurado. Verifique TWILIO_ACCOUNT_SID e TWILIO_AUTH_TOKEN.")
+        return
+
+    despachante.enviar("twilio", to, {
+        "method": "POST",
+        "url": f"{TWILIO_API_URL}/2010-04-01/Accounts/{TWILIO_ACCOUNT_SID}/Messages.json",
+        "auth": (TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN),
+        "data": {"From": TWILIO_WHATSAPP_FROM, "To": to, "Body": body},
+    })
 
 @app.post("/webhook-whatsapp")
 async def webhook_whatsapp(request: Request):
     """
     Recebe mensagens do WhatsApp Cloud API (POST)
     """
+    with metricas.webhook_segundos.cronometrar("whatsapp"):
+        return await _processar_webhook_whatsapp(request)
+
+async def _processar_webhook_whatsapp(request: Request):
     data = await request.json()
-    logging.info(f"📲 Webhook WhatsApp recebido: {data}")
+    evento("whatsapp.payload", "📲 Webhook WhatsApp recebido", nivel=logging.DEBUG, payload=data)
 
     try:
         entry_list = data.get("entry", [])
@@ -475,9 +658,11 @@ async def webhook_whatsapp(request: Request):
         text = msg.get("text", {}).get("body", "")
 
         user_id = f"whatsapp:{from_number}"
+        evento("whatsapp", "📲 Mensagem recebida", de=from_number)
 
-        # Usa a MESMA lógica do backend normal
-        resposta_construia = await mensagem(Message(user=user_id, text=text))
+        # Usa a MESMA lógica do backend normal, com prazo abaixo do timeout do webhook
+        with prazo.com_prazo(PRAZO_WEBHOOK):
+            resposta_construia = await mensagem(Message(user=user_id, text=text))
         texto_resposta = resposta_construia.get("text", "Constru.IA: não consegui gerar resposta.")
 
         # Envia resposta via Cloud API
@@ -497,29 +682,21 @@ async def webhook_twilio(
     From: str = Form(...),   # Número do usuário no WhatsApp (ex: whatsapp:+5591...)
     Body: str = Form(...),   # Texto da mensagem
 ):
-    logging.info(f"📲 WhatsApp de {From}: {Body}")
+    with metricas.webhook_segundos.cronometrar("twilio"):
+        return await _processar_webhook_twilio(From, Body)
+
+async def _processar_webhook_twilio(From: str, Body: str):
+    evento("twilio", "📲 Mensagem recebida", de=From)
 
-    # Usa a MESMA lógica do backend normal
-    resposta_construia = await mensagem(
-        Message(user=From, text=Body)
-    )
+    # Usa a MESMA lógica do backend normal, com prazo abaixo do timeout do webhook (Twilio: 15 s)
+    with prazo.com_prazo(PRAZO_WEBHOOK):
+        resposta_construia = await mensagem(Message(user=From, text=Body))
 
     texto_resposta = resposta_construia.get("text", "Constru.IA: não consegui gerar resposta.")
-    logging.info(f"💬 Resposta para {From}: {texto_resposta}")
-
-    # Envia resposta via API da Twilio (em vez de TwiML)
-    if twilio_client:
-        try:
-            twilio_client.messages.create(
-                from_=TWILIO_WHATSAPP_FROM,
-                to=From,
-                body=texto_resposta,
-            )
-            logging.info("✅ Mensagem enviada via Twilio.")
-        except Exception as e:
-            logging.error(f"❌ Erro ao enviar mensagem WhatsApp via Twilio: {e}")
-    else:
-        logging.error("❌ twilio_client não inicializado. Verifique TWILIO_ACCOUNT_SID e TWILIO_AUTH_TOKEN.")
+    evento("twilio.payload", "💬 Resposta", nivel=logging.DEBUG, para=From, texto=texto_resposta)
+
+    # Envia resposta via API da Twilio (em vez de TwiML), em segundo plano
+    send_twilio_message(From, texto_resposta)
 
     # Twilio só precisa de 200 OK aqui
     return PlainTextResponse("OK")
@@ -530,15 +707,79 @@ async def webhook_twilio(
 @app.get("/teste-financeiro")
 def teste_financeiro():
     filtros = {"startDate": "2024-01-01", "endDate": "2024-12-31", "enterpriseId": "1"}
-    rel = gerar_relatorio_json(**filtros)
+    rel = gerar_relatorio_json(campos={"dre", "empresa", "fornecedor", "centro_custo", "obra"}, **filtros)
     return {
         "resumo": rel.get("dre", {}).get("formatado", {}),
         "amostra": rel.get("todas_despesas", [])[:5],
     }
 
+# ============================================================
+# 📤 EXPORTAÇÃO PARA BI (streaming)
+# ============================================================
+# Entrega todas as contas a pagar e apropriações: só com o token compartilhado
+#   EXPORTACAO_TOKEN = segredo enviado em `Authorization: Bearer <token>` (sem ele a rota fica desligada)
+EXPORTACAO_TOKEN = os.getenv("EXPORTACAO_TOKEN", "")
+
+def _exportacao_autorizada(request: Request) -> bool:
+    esquema, _, token = request.headers.get("authorization", "").partition(" ")
+    return bool(EXPORTACAO_TOKEN) and esquema.lower() == "bearer" and hmac.compare_digest(
+        token.strip().encode(), EXPORTACAO_TOKEN.encode())
+
+@app.get("/exportar/despesas")
+def exportar_despesas(
+    request: Request,
+    formato: str = "csv",
+    startDate: str = None,
+    endDate: str = None,
+    enterpriseId: str = None,
+    apropriacoes: bool = True,
+):
+    """
+    Despesas do período em CSV, NDJSON, Parquet ou Arrow IPC, enviadas em
+    pedaços. Filtros só pela URL (sem período: últimos 12 meses). Cada
+    apropriação financeira vira uma linha. Exige o EXPORTACAO_TOKEN.
+    """
+    if not _exportacao_autorizada(request):
+        return JSONResponse({"erro": "não autorizado"}, status_code=401, headers={"WWW-Authenticate": "Bearer"})
+    if formato not in exportacao.FORMATOS:
+        return JSONResponse({"erro": f"formato inválido; use {', '.join(exportacao.FORMATOS)}"}, status_code=400)
+
+    filtros = {k: v for k, v in {"startDate": startDate, "endDate": endDate, "enterpriseId": enterpriseId}.items() if v}
+    if filtros.get("startDate") and not filtros.get("endDate"):
+        return JSONResponse({"erro": "informe endDate junto com startDate"}, status_code=400)
+
+    campos = {"empresa", "fornecedor", "centro_custo", "obra"}
+    if apropriacoes:
+        campos.add("apropriacoes_financeiras")
+
+    try:
+        corpo = exportacao.exportar(iterar_despesas(filtros, campos=campos), formato)
+    except exportacao.FormatoIndisponivel as e:
+        return JSONResponse({"erro": str(e)}, status_code=501)
+
+    tipo, extensao = exportacao.FORMATOS[formato]
+    nome = f"despesas_{filtros.get('startDate', 'ultimos-12-meses')}_{filtros.get('endDate', 'hoje')}.{extensao}"
+    return StreamingResponse(corpo, media_type=tipo, headers={"Content-Disposition": f'attachment; filename="{nome}"'})
+
 # ============================================================
 # 🌍 STATUS
 # ============================================================
 @app.get("/")
 def root():
     return {"ok": True, "service": "constru-ai-connect", "status": "running"}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Métricas no formato texto do Prometheus (por worker)."""
+    return PlainTextResponse(metricas.renderizar(), media_type="text/plain; version=0.0.4")
+
+@app.get("/prontidao")
+def prontidao():
+    """Cobertura do cache aquecido de relatórios; 503 enquanto não estiver completo."""
+    estado = aquecedor.estado()
+    return JSONResponse(estado, status_code=200 if estado["pronto"] else 503)
+
+@app.get("/circuitos")
+def circuitos():
+    """Estado dos disjuntores (Sienge/OpenAI) e quantas transições já ocorreram."""
+    return estado_disjuntores()
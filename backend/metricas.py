@@ -0,0 +1,158 @@
+import bisect
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+# ============================================================
+# 📈 MÉTRICAS NO FORMATO PROMETHEUS (sem dependências)
+# ============================================================
+# Contadores e histogramas em memória, por processo. O custo no caminho
+# quente é um lock + bisect (~1 µs); a formatação só acontece no /metrics.
+# Com vários workers do uvicorn cada um expõe os próprios números.
+
+BUCKETS_PADRAO = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40, 60)
+
+_registro = []
+_coletores = []  # funções chamadas no /metrics para métricas calculadas na hora
+
+
+def _escapar(v) -> str:
+    return str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _fmt_rotulos(nomes, valores, extra=None):
+    pares = list(zip(nomes, valores))
+    if extra:
+        pares.append(extra)
+    if not pares:
+        return ""
+    return "{" + ",".join(f'{k}="{_escapar(v)}"' for k, v in pares) + "}"
+
+
+def _fmt_num(v):
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v)) if isinstance(v, float) and not v.is_integer() else str(int(v))
+
+
+class Contador:
+    tipo = "counter"
+
+    def __init__(self, nome: str, ajuda: str, rotulos=()):
+        self.nome, self.ajuda, self.rotulos = nome, ajuda, tuple(rotulos)
+        self._valores = defaultdict(float)
+        self._lock = threading.Lock()
+        _registro.append(self)
+
+    def inc(self, *rotulos, n: float = 1):
+        with self._lock:
+            self._valores[rotulos] += n
+
+    def valor(self, *rotulos) -> float:
+        return self._valores.get(rotulos, 0.0)
+
+    def linhas(self):
+        with self._lock:
+            itens = list(self._valores.items())
+        for rotulos, v in sorted(itens):
+            yield f"{self.nome}{_fmt_rotulos(self.rotulos, rotulos)} {_fmt_num(v)}"
+
+
+class Histograma:
+    tipo = "histogram"
+
+    def __init__(self, nome: str, ajuda: str, rotulos=(), buckets=BUCKETS_PADRAO):
+        self.nome, self.ajuda, self.rotulos = nome, ajuda, tuple(rotulos)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # rotulos -> [contagens por bucket..., soma, total]
+        self._lock = threading.Lock()
+        _registro.append(self)
+
+    def observar(self, valor: float, *rotulos):
+        i = bisect.bisect_left(self.buckets, valor)
+        with self._lock:
+            serie = self._series.get(rotulos)
+            if serie is None:
+                serie = self._series[rotulos] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            serie[i] += 1
+            serie[-2] += valor
+            serie[-1] += 1
+
+    @contextmanager
+    def cronometrar(self, *rotulos):
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observar(time.perf_counter() - inicio, *rotulos)
+
+    def linhas(self):
+        with self._lock:
+            itens = [(r, list(s)) for r, s in self._series.items()]
+        for rotulos, serie in sorted(itens):
+            acumulado = 0
+            for limite, n in zip(self.buckets + (float("inf"),), serie):
+                acumulado += n
+                yield f"{self.nome}_bucket{_fmt_rotulos(self.rotulos, rotulos, ('le', _fmt_num(limite)))} {acumulado}"
+            yield f"{self.nome}_sum{_fmt_rotulos(self.rotulos, rotulos)} {serie[-2]:.6f}"
+            yield f"{self.nome}_count{_fmt_rotulos(self.rotulos, rotulos)} {serie[-1]}"
+
+
+def registrar_coletor(fn):
+    """fn() devolve lista de (nome, tipo, ajuda, [(rotulos_dict, valor), ...])."""
+    _coletores.append(fn)
+    return fn
+
+
+def renderizar() -> str:
+    saida = []
+    for m in _registro:
+        saida.append(f"# HELP {m.nome} {m.ajuda}")
+        saida.append(f"# TYPE {m.nome} {m.tipo}")
+        saida.extend(m.linhas())
+    for coletor in _coletores:
+        for nome, tipo, ajuda, amostras in coletor():
+            saida.append(f"# HELP {nome} {ajuda}")
+            saida.append(f"# TYPE {nome} {tipo}")
+            for rotulos, valor in amostras:
+                saida.append(f"{nome}{_fmt_rotulos(list(rotulos), list(rotulos.values()))} {_fmt_num(valor)}")
+    return "\n".join(saida) + "\n"
+
+
+# ============================================================
+# 📊 MÉTRICAS DA APLICAÇÃO
+# ============================================================
+mensagem_segundos = Histograma(
+    "constru_mensagem_segundos", "Latência do /mensagem por intenção", ("acao",))
+webhook_segundos = Histograma(
+    "constru_webhook_segundos", "Latência dos webhooks de WhatsApp", ("webhook",))
+upstream_segundos = Histograma(
+    "constru_upstream_segundos", "Latência das chamadas externas", ("servico", "endpoint"))
+upstream_respostas = Contador(
+    "constru_upstream_respostas_total", "Respostas das chamadas externas por status", ("servico", "endpoint", "status"))
+cache_consultas = Contador(
+    "constru_cache_consultas_total", "Consultas aos caches internos", ("cache", "resultado"))
+
+
+def registrar_upstream(servico: str, endpoint: str, status, segundos: float):
+    upstream_segundos.observar(segundos, servico, endpoint)
+    upstream_respostas.inc(servico, endpoint, str(status))
+
+
+def cache_hit(cache: str):
+    cache_consultas.inc(cache, "hit")
+
+
+def cache_miss(cache: str):
+    cache_consultas.inc(cache, "miss")
+
+
+@registrar_coletor
+def _taxa_acerto_caches():
+    caches = {c for (c, _r) in list(cache_consultas._valores)}
+    amostras = []
+    for c in sorted(caches):
+        hit, miss = cache_consultas.valor(c, "hit"), cache_consultas.valor(c, "miss")
+        amostras.append(({"cache": c}, hit / (hit + miss) if hit + miss else 0.0))
+    return [("constru_cache_taxa_acerto", "gauge", "Fração de acertos por cache", amostras)]
@@ -0,0 +1,130 @@
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+import metricas
+
+# ============================================================
+# ⏳ PRAZO DE PONTA A PONTA POR MENSAGEM
+# ============================================================
+# Cada mensagem do chat/webhook ganha um prazo (instante limite) conforme a
+# faixa da intenção. Toda chamada ao Sienge e à OpenAI tira o timeout do
+# que sobra (`timeout`), e retentativas/backoff não passam do limite.
+# Quando o tempo acaba a chamada nem sai (PrazoEsgotado) e cada etapa
+# devolve o melhor que tem:
+#   nomes (get_cached)   → "N/A", sem gravar no cache
+#   apropriações         → lista vazia
+#   segunda via          → só os boletos já conferidos
+#   análise com IA       → os números do período, sem o comentário
+# e a resposta sai marcada como parcial. O prazo atravessa threads junto
+# com o contexto (rastreio.propagar, faixas, paginação antecipada).
+#
+#   PRAZO                = "0" desliga
+#   PRAZO_LEVE / PRAZO_MEDIA / PRAZO_PESADA = segundos por faixa (padrão: 8 / 20 / 60)
+#   PRAZO_WEBHOOK        = teto para mensagens dos webhooks WhatsApp/Twilio (padrão: 10). Os dois
+#                          processam na hora e só devolvem 200 no fim; a Twilio desiste em 15 s e a
+#                          Meta reenvia o que não recebe 200 rápido (processamento e resposta em dobro)
+#   PRAZO_RESERVA_IA     = segundos guardados para a IA nas intenções com análise (padrão: 10; nunca
+#                          mais que metade do que sobra, para a extração ter tempo num prazo curto)
+#   PRAZO_MINIMO         = com menos que isso uma chamada nem começa (padrão: 0.3)
+#
+# Fora de uma mensagem (aquecimento, scripts, Streamlit) não há prazo e os
+# timeouts de cada chamada valem como antes. Os envios ao WhatsApp/Twilio
+# (envio.despachante) rodam depois da resposta e mantêm o timeout próprio.
+
+PRAZO = os.getenv("PRAZO", "1") != "0"
+PRAZOS = {
+    "leve": float(os.getenv("PRAZO_LEVE", "8")),
+    "media": float(os.getenv("PRAZO_MEDIA", "20")),
+    "pesada": float(os.getenv("PRAZO_PESADA", "60")),
+}
+PRAZO_WEBHOOK = float(os.getenv("PRAZO_WEBHOOK", "10"))
+PRAZO_RESERVA_IA = float(os.getenv("PRAZO_RESERVA_IA", "10"))
+PRAZO_MINIMO = float(os.getenv("PRAZO_MINIMO", "0.3"))
+
+_limite: ContextVar[Optional[float]] = ContextVar("prazo_limite", default=None)
+_parcial: ContextVar[Optional[list]] = ContextVar("prazo_parcial", default=None)
+
+esgotados = metricas.Contador(
+    "constru_prazo_esgotado_total", "Chamadas não feitas porque o prazo da mensagem acabou", ("etapa",))
+parciais = metricas.Contador(
+    "constru_resposta_parcial_total", "Respostas entregues sem alguma parte por falta de tempo", ("parte",))
+
+
+class PrazoEsgotado(Exception):
+    """O prazo da mensagem acabou antes da chamada; quem chama devolve o que já tem."""
+
+    def __init__(self, etapa: str):
+        super().__init__(f"prazo esgotado antes de {etapa}")
+        self.etapa = etapa
+
+
+@contextmanager
+def com_prazo(segundos: Optional[float]):
+    """Dentro do bloco vale o prazo de `segundos` (ou o de fora, se for menor). None/0 não muda nada."""
+    if not PRAZO or not segundos:
+        yield
+        return
+    limite = time.monotonic() + segundos
+    externo = _limite.get()
+    t1 = _limite.set(limite if externo is None else min(externo, limite))
+    t2 = _parcial.set([] if _parcial.get() is None else _parcial.get())
+    try:
+        yield
+    finally:
+        _limite.reset(t1)
+        _parcial.reset(t2)
+
+
+@contextmanager
+def reservando(segundos: float):
+    """Dentro do bloco o prazo termina `segundos` antes (no máximo metade do que sobra), guardando tempo para a etapa seguinte."""
+    limite = _limite.get()
+    if limite is None:
+        yield
+        return
+    token = _limite.set(limite - min(segundos, max(0.0, limite - time.monotonic()) / 2))
+    try:
+        yield
+    finally:
+        _limite.reset(token)
+
+
+def restante() -> Optional[float]:
+    """Segundos até o prazo, ou None fora de uma mensagem."""
+    limite = _limite.get()
+    return None if limite is None else limite - time.monotonic()
+
+
+def timeout(padrao: float, etapa: str) -> float:
+    """Timeout para uma chamada: o menor entre `padrao` e o que sobra. PrazoEsgotado se não sobra nada."""
+    sobra = restante()
+    if sobra is None:
+        return padrao
+    if sobra < PRAZO_MINIMO:
+        esgotados.inc(etapa)
+        raise PrazoEsgotado(etapa)
+    return min(padrao, sobra)
+
+
+def dormir(segundos: float, etapa: str):
+    """time.sleep que não passa do prazo: se não couber, levanta PrazoEsgotado sem esperar."""
+    sobra = restante()
+    if sobra is not None and sobra - segundos < PRAZO_MINIMO:
+        esgotados.inc(etapa)
+        raise PrazoEsgotado(etapa)
+    time.sleep(segundos)
+
+
+def marcar_parcial(parte: str):
+    """Registra que a resposta desta mensagem saiu sem `parte` (nomes, apropriacoes, boletos, ia)."""
+    partes = _parcial.get()
+    if partes is not None and parte not in partes:
+        partes.append(parte)
+        parciais.inc(parte)
+
+
+def partes_faltando() -> list:
+    return list(_parcial.get() or [])
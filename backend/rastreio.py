@@ -0,0 +1,141 @@
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar, copy_context
+from urllib.parse import parse_qs
+
+from starlette.datastructures import MutableHeaders
+
+# ============================================================
+# ⏱️ RASTREIO POR REQUISIÇÃO (spans + Server-Timing)
+# ============================================================
+# Cada requisição HTTP ganha um Rastreio. `span("nome")` mede um trecho
+# (fase do pipeline ou chamada externa) e o pendura no span atual.
+# Na resposta vai o cabeçalho Server-Timing com o tempo somado e o número
+# de chamadas por nome. Com `?debug=1` ou `X-Debug-Trace: 1`, o /mensagem
+# devolve também a árvore completa — útil para achar N+1 em produção.
+# A intenção executada vai no mesmo cabeçalho (`acao;desc="..."`), também
+# nos webhooks, cuja resposta não é a do chat.
+#
+# Fora de uma requisição (Streamlit, scripts) `span` não faz nada.
+
+_rastreio_atual: ContextVar = ContextVar("rastreio", default=None)
+_span_atual: ContextVar = ContextVar("span_atual", default=None)
+
+
+class Span:
+    __slots__ = ("nome", "inicio", "duracao", "filhos")
+
+    def __init__(self, nome: str):
+        self.nome = nome
+        self.inicio = time.perf_counter()
+        self.duracao = None
+        self.filhos = []
+
+    def arvore(self, agora: float) -> dict:
+        dur = self.duracao if self.duracao is not None else agora - self.inicio
+        no = {"nome": self.nome, "ms": round(dur * 1000, 2)}
+        if self.filhos:
+            no["filhos"] = [f.arvore(agora) for f in list(self.filhos)]
+        return no
+
+
+class Rastreio:
+    def __init__(self, debug: bool = False):
+        self.debug = debug
+        self.raiz = Span("requisicao")
+        self.totais = {}  # nome -> [chamadas, segundos]
+        self.acao = None  # intenção executada (/mensagem e webhooks)
+        self._lock = threading.Lock()
+
+    def registrar(self, sp: Span):
+        with self._lock:
+            t = self.totais.setdefault(sp.nome, [0, 0.0])
+            t[0] += 1
+            t[1] += sp.duracao
+
+    def server_timing(self) -> str:
+        partes = []
+        with self._lock:
+            itens = list(self.totais.items())
+        for nome, (n, seg) in itens:
+            partes.append(f'{nome};dur={seg * 1000:.1f};desc="{n}x"')
+        partes.append(f"total;dur={(time.perf_counter() - self.raiz.inicio) * 1000:.1f}")
+        if self.acao is not None:
+            partes.append(f'acao;desc="{self.acao}"')
+        return ", ".join(partes)
+
+    def resumo(self) -> dict:
+        agora = time.perf_counter()
+        with self._lock:
+            contagem = {nome: {"chamadas": n, "ms": round(seg * 1000, 2)} for nome, (n, seg) in self.totais.items()}
+        return {"arvore": self.raiz.arvore(agora), "contagem": contagem}
+
+
+@contextmanager
+def span(nome: str):
+    r = _rastreio_atual.get()
+    if r is None:
+        yield
+        return
+    pai = _span_atual.get() or r.raiz
+    sp = Span(nome)
+    pai.filhos.append(sp)
+    token = _span_atual.set(sp)
+    try:
+        yield
+    finally:
+        sp.duracao = time.perf_counter() - sp.inicio
+        _span_atual.reset(token)
+        r.registrar(sp)
+
+
+def rastreio_atual():
+    return _rastreio_atual.get()
+
+
+def debug_ativo() -> bool:
+    r = _rastreio_atual.get()
+    return bool(r and r.debug)
+
+
+def propagar(fn):
+    """Envolve fn para rodar em outra thread mantendo o rastreio/span de quem criou."""
+    ctx = copy_context()
+
+    def _executar(*args, **kwargs):
+        return ctx.copy().run(fn, *args, **kwargs)
+
+    return _executar
+
+
+def _debug_pedido(scope) -> bool:
+    for k, v in scope.get("headers") or []:
+        if k == b"x-debug-trace" and v.strip() in (b"1", b"true"):
+            return True
+    qs = parse_qs((scope.get("query_string") or b"").decode())
+    return qs.get("debug", ["0"])[0] in ("1", "true")
+
+
+class RastreioMiddleware:
+    """Middleware ASGI: cria o rastreio e escreve o Server-Timing na resposta."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        r = Rastreio(debug=_debug_pedido(scope))
+        token = _rastreio_atual.set(r)
+
+        async def _send(message):
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message).append("Server-Timing", r.server_timing())
+            await send(message)
+
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            _rastreio_atual.reset(token)
@@ -0,0 +1,186 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from contextlib import contextmanager
+
+# ============================================================
+# 🗂️ ARMAZENAMENTO DE SESSÃO (filtros, CPF, confirmações)
+# ============================================================
+# Configuração via ambiente:
+#   SESSAO_BACKEND = memoria | sqlite          (padrão: memoria)
+#   SESSAO_TTL     = segundos sem uso até expirar (padrão: 6h)
+#   SESSAO_MAX     = máximo de usuários em memória (padrão: 10000)
+#   SESSAO_SQLITE_PATH = arquivo compartilhado entre workers (padrão: sessoes.db)
+#
+# Com mais de um worker do uvicorn use SESSAO_BACKEND=sqlite: o arquivo é
+# compartilhado e cada worker enxerga as mesmas conversas.
+
+SESSAO_TTL = int(os.getenv("SESSAO_TTL", str(6 * 3600)))
+SESSAO_MAX = int(os.getenv("SESSAO_MAX", "10000"))
+
+
+class ArmazenamentoSessao(ABC):
+    """Interface: cada usuário tem um dicionário JSON-serializável."""
+
+    @abstractmethod
+    def obter(self, user: str) -> dict:
+        ...
+
+    @abstractmethod
+    def salvar(self, user: str, dados: dict) -> None:
+        ...
+
+    @abstractmethod
+    def apagar(self, user: str) -> None:
+        ...
+
+    @contextmanager
+    def _exclusivo(self):
+        """Bloco em que ninguém mais lê-e-grava a sessão; cada backend define como."""
+        yield
+
+    def alterar(self, user: str, fn) -> dict:
+        """Lê a sessão, aplica `fn(dados)` e grava, tudo dentro de `_exclusivo`."""
+        with self._exclusivo():
+            dados = self.obter(user)
+            fn(dados)
+            self.salvar(user, dados)
+            return dados
+
+    def atualizar(self, user: str, **campos) -> dict:
+        """Mescla `campos` na sessão; valores None removem a chave."""
+        def aplicar(dados):
+            for k, v in campos.items():
+                if v is None:
+                    dados.pop(k, None)
+                else:
+                    dados[k] = v
+        return self.alterar(user, aplicar)
+
+    def mesclar_filtros(self, user: str, novos: dict) -> dict:
+        """Junta `novos` (sem os vazios) aos filtros guardados e devolve os filtros resultantes."""
+        def aplicar(dados):
+            dados["filtros"] = {**dados.get("filtros", {}), **{k: v for k, v in novos.items() if v}}
+        return self.alterar(user, aplicar)["filtros"]
+
+
+class SessaoMemoria(ArmazenamentoSessao):
+    """LRU com TTL, por processo. Memória limitada a `max_itens` usuários."""
+
+    def __init__(self, ttl: int = SESSAO_TTL, max_itens: int = SESSAO_MAX):
+        self.ttl = ttl
+        self.max_itens = max_itens
+        self._dados = OrderedDict()  # user -> (expira_em, dados)
+        self._lock = threading.RLock()  # alterar segura o lock durante obter + salvar
+
+    def obter(self, user: str) -> dict:
+        with self._lock:
+            item = self._dados.get(user)
+            if not item:
+                return {}
+            expira, dados = item
+            if expira < time.monotonic():
+                del self._dados[user]
+                return {}
+            self._dados.move_to_end(user)
+            return json.loads(json.dumps(dados))  # cópia: quem chama não altera o store
+
+    def salvar(self, user: str, dados: dict) -> None:
+        with self._lock:
+            self._dados[user] = (time.monotonic() + self.ttl, dict(dados))
+            self._dados.move_to_end(user)
+            while len(self._dados) > self.max_itens:
+                self._dados.popitem(last=False)
+
+    def _exclusivo(self):
+        return self._lock
+
+    def apagar(self, user: str) -> None:
+        with self._lock:
+            self._dados.pop(user, None)
+
+    def __len__(self):
+        return len(self._dados)
+
+
+class SessaoSQLite(ArmazenamentoSessao):
+    """
+    Sessões num arquivo SQLite (modo WAL), seguro para vários workers/processos.
+    Itens expirados são ignorados na leitura e removidos periodicamente.
+    """
+
+    def __init__(self, caminho: str = None, ttl: int = SESSAO_TTL, intervalo_limpeza: int = 300):
+        self.caminho = caminho or os.getenv("SESSAO_SQLITE_PATH", "sessoes.db")
+        self.ttl = ttl
+        self.intervalo_limpeza = intervalo_limpeza
+        self._local = threading.local()
+        self._proxima_limpeza = 0.0
+        with self._conexao() as con:
+            con.execute(
+                "CREATE TABLE IF NOT EXISTS sessoes ("
+                " usuario TEXT PRIMARY KEY, dados TEXT NOT NULL, expira_em REAL NOT NULL)"
+            )
+            con.execute("CREATE INDEX IF NOT EXISTS idx_sessoes_expira ON sessoes (expira_em)")
+
+    def _conexao(self) -> sqlite3.Connection:
+        con = getattr(self._local, "con", None)
+        if con is None:
+            con = sqlite3.connect(self.caminho, timeout=10, isolation_level=None)
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute("PRAGMA synchronous=NORMAL")
+            self._local.con = con
+        return con
+
+    def _limpar_expirados(self, con):
+        agora = time.time()
+        if agora < self._proxima_limpeza:
+            return
+        self._proxima_limpeza = agora + self.intervalo_limpeza
+        con.execute("DELETE FROM sessoes WHERE expira_em < ?", (agora,))
+
+    def obter(self, user: str) -> dict:
+        con = self._conexao()
+        row = con.execute(
+            "SELECT dados FROM sessoes WHERE usuario = ? AND expira_em >= ?", (user, time.time())
+        ).fetchone()
+        return json.loads(row[0]) if row else {}
+
+    def salvar(self, user: str, dados: dict) -> None:
+        con = self._conexao()
+        con.execute(
+            "INSERT INTO sessoes (usuario, dados, expira_em) VALUES (?, ?, ?) "
+            "ON CONFLICT(usuario) DO UPDATE SET dados = excluded.dados, expira_em = excluded.expira_em",
+            (user, json.dumps(dados, ensure_ascii=False), time.time() + self.ttl),
+        )
+        self._limpar_expirados(con)
+
+    @contextmanager
+    def _exclusivo(self):
+        """Lê e grava na mesma transação (BEGIN IMMEDIATE): duas mensagens do mesmo usuário não se sobrescrevem."""
+        con = self._conexao()
+        con.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            con.execute("ROLLBACK")
+            raise
+        con.execute("COMMIT")
+
+    def apagar(self, user: str) -> None:
+        self._conexao().execute("DELETE FROM sessoes WHERE usuario = ?", (user,))
+
+
+def criar_armazenamento_sessao() -> ArmazenamentoSessao:
+    backend = os.getenv("SESSAO_BACKEND", "memoria").lower()
+    if backend == "sqlite":
+        store = SessaoSQLite()
+        logging.info(f"🗂️ Sessões em SQLite compartilhado: {store.caminho}")
+        return store
+    if backend != "memoria":
+        logging.warning(f"⚠️ SESSAO_BACKEND desconhecido ({backend}); usando memória.")
+    return SessaoMemoria()
@@ -0,0 +1,79 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+# ============================================================
+# 🧾 CACHE PERSISTENTE DE APROPRIAÇÕES (por título)
+# ============================================================
+# O rateio de um título entre planos de contas / centros quase nunca muda
+# depois de lançado, mas /bills/{id}/budget-categories era chamado para
+# cada título em cada relatório. Aqui fica guardada a resposta crua do
+# Sienge (códigos, percentuais e hrefs; os nomes continuam vindo do
+# get_cached) junto com o marcador do título na listagem (data de
+# alteração, status, valor). Se o marcador mudar, ou passar o TTL, o
+# título é consultado de novo.
+#
+#   APROPRIACOES_CACHE     = arquivo SQLite (padrão: apropriacoes.db; "0" desliga)
+#   APROPRIACOES_TTL       = segundos até revalidar mesmo sem mudança (padrão: 30 dias)
+#
+# O arquivo (modo WAL) pode ser compartilhado entre workers e sobrevive a
+# reinícios.
+
+APROPRIACOES_TTL = float(os.getenv("APROPRIACOES_TTL", str(30 * 24 * 3600)))
+
+
+class CacheApropriacoes:
+    def __init__(self, caminho: str, ttl: float = APROPRIACOES_TTL):
+        self.caminho = caminho
+        self.ttl = ttl
+        self._local = threading.local()
+        with self._conexao() as con:
+            con.execute(
+                "CREATE TABLE IF NOT EXISTS apropriacoes ("
+                " bill_id INTEGER PRIMARY KEY, marcador TEXT NOT NULL, itens TEXT NOT NULL, gravado_em REAL NOT NULL)"
+            )
+
+    def _conexao(self) -> sqlite3.Connection:
+        con = getattr(self._local, "con", None)
+        if con is None:
+            con = sqlite3.connect(self.caminho, timeout=10, isolation_level=None)
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute("PRAGMA synchronous=NORMAL")
+            self._local.con = con
+        return con
+
+    def obter(self, bill_id: int, marcador: str):
+        """Itens guardados do título, ou None se não há, o marcador mudou ou venceu o TTL."""
+        row = self._conexao().execute(
+            "SELECT itens FROM apropriacoes WHERE bill_id = ? AND marcador = ? AND gravado_em >= ?",
+            (bill_id, marcador, time.time() - self.ttl),
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def salvar(self, bill_id: int, marcador: str, itens: list) -> None:
+        self._conexao().execute(
+            "INSERT INTO apropriacoes (bill_id, marcador, itens, gravado_em) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(bill_id) DO UPDATE SET marcador = excluded.marcador, itens = excluded.itens, "
+            "gravado_em = excluded.gravado_em",
+            (bill_id, marcador, json.dumps(itens, ensure_ascii=False, separators=(",", ":")), time.time()),
+        )
+
+    def limpar(self) -> None:
+        self._conexao().execute("DELETE FROM apropriacoes")
+
+    def __len__(self):
+        return self._conexao().execute("SELECT COUNT(*) FROM apropriacoes").fetchone()[0]
+
+
+def criar_cache_apropriacoes():
+    caminho = os.getenv("APROPRIACOES_CACHE", "apropriacoes.db")
+    if caminho in ("", "0"):
+        return None
+    try:
+        return CacheApropriacoes(caminho)
+    except sqlite3.Error as e:
+        logging.warning(f"⚠️ Cache de apropriações indisponível ({caminho}): {e}")
+        return None
@@ -1,40 +1,27 @@
-import requests
 import logging
-from base64 import b64encode
+
+from log_estruturado import ativo, evento
+from prazo import PrazoEsgotado, marcar_parcial
+from sienge.sienge_http import BASE_URL, PaginaFalhou, paginar, sienge_request
+
+CATEGORIA = "sienge.boletos"
 
 # ============================================================
 # 🚀 IDENTIFICAÇÃO DA VERSÃO
 # ============================================================
 logging.warning("🚀 Rodando versão 1.8 do sienge_boletos.py (parcelas extras e tratamento de erro interno)")
 
-# ============================================================
-# 🔐 CONFIGURAÇÕES DE AUTENTICAÇÃO SIENGE
-# ============================================================
-subdominio = "cctcontrol"
-usuario = "cctcontrol-api"
-senha = "9SQ2MaNrFOeZOOuOAqeSRy7bYWYDDf85"
-
-BASE_URL = f"https://api.sienge.com.br/{subdominio}/public/api/v1"
-_token = b64encode(f"{usuario}:{senha}".encode()).decode()
-
-json_headers = {
-    "Authorization": f"Basic {_token}",
-    "accept": "application/json",
-    "Content-Type": "application/json",
-}
-
 # ============================================================
 # 👤 CLIENTE
 # ============================================================
 def buscar_cliente_por_cpf(cpf: str):
     """Busca cliente no Sienge pelo CPF."""
     url = f"{BASE_URL}/customers?cpf={cpf}"
-    logging.info(f"GET {url}")
-    r = requests.get(url, headers=json_headers, timeout=30)
-    logging.info(f"{url} -> {r.status_code}")
+    r = sienge_request("GET", url, timeout=30)
+    evento(CATEGORIA, "GET customers", nivel=logging.DEBUG, status=r.status_code)
 
     if r.status_code != 200:
-        logging.warning("Erro ao buscar cliente: %s", r.text)
+        evento(CATEGORIA, "Erro ao buscar cliente", nivel=logging.WARNING, status=r.status_code, corpo=r.text)
         return None
 
     data = r.json()
@@ -47,14 +34,18 @@ def buscar_cliente_por_cpf(cpf: str):
 # ============================================================
 # 🧾 BOLETOS / TÍTULOS
 # ============================================================
+def iterar_boletos_por_cliente(cliente_id: int):
+    """Gera os boletos/títulos de um cliente, página a página (a próxima já vem sendo baixada)."""
+    url = f"{BASE_URL}/accounts-receivable/receivable-bills?customerId={cliente_id}"
+    try:
+        yield from paginar(url, timeout=30)
+    except PaginaFalhou as e:
+        evento(CATEGORIA, "Falha ao listar títulos", nivel=logging.WARNING, cliente=cliente_id, status=e.status)
+
+
 def listar_boletos_por_cliente(cliente_id: int):
     """Lista boletos/títulos vinculados a um cliente."""
-    url = f"{BASE_URL}/accounts-receivable/receivable-bills?customerId={cliente_id}"
-    r = requests.get(url, headers=json_headers, timeout=30)
-    logging.info(f"GET {url} -> {r.status_code}")
-    if r.status_code != 200:
-        return []
-    return r.json().get("results") or []
+    return list(iterar_boletos_por_cliente(cliente_id))
 
 
 def listar_parcelas(titulo_id: int):
@@ -62,8 +53,8 @@ def listar_parcelas(titulo_id: int):
     if not titulo_id:
         return []
     url = f"{BASE_URL}/accounts-receivable/receivable-bills/{titulo_id}/installments"
-    r = requests.get(url, headers=json_headers, timeout=30)
-    logging.info(f"GET {url} -> {r.status_code}")
+    r = sienge_request("GET", url, timeout=30)
+    evento(CATEGORIA, "GET installments", nivel=logging.DEBUG, titulo=titulo_id, status=r.status_code)
     if r.status_code != 200:
         return []
     return r.json().get("results") or []
@@ -78,27 +69,31 @@ def boleto_existe(titulo_id: int, parcela_id: int) -> bool:
     params = {"billReceivableId": titulo_id, "installmentId": parcela_id}
 
     try:
-        r = requests.get(url, headers=json_headers, params=params, timeout=20)
-        logging.info(f"🔎 Verificando boleto: {params} -> {r.status_code}")
-        logging.info(f"Resposta: {r.text[:400]}")
+        r = sienge_request("GET", url, params=params, timeout=20)
+        if ativo(CATEGORIA, logging.DEBUG):
+            evento(CATEGORIA, "🔎 Verificando boleto", nivel=logging.DEBUG,
+                   titulo=titulo_id, parcela=parcela_id, status=r.status_code, resposta=r.text[:400])
 
         # 200 = OK
         if r.status_code == 200:
             data = r.json()
             results = data.get("results") or []
             if results and results[0].get("urlReport"):
-                logging.info(f"🟢 Segunda via encontrada -> {results[0].get('urlReport')}")
+                evento(CATEGORIA, "🟢 Segunda via encontrada", nivel=logging.DEBUG, titulo=titulo_id, parcela=parcela_id)
                 return True
 
         # 422 = Erro de regra no Sienge
         if r.status_code == 422:
             if "RuntimeException" in r.text or "SiengeBusinessException" in r.text:
-                logging.warning(f"⚠️ Erro interno no Sienge ao tentar gerar boleto ({titulo_id}/{parcela_id})")
+                evento(CATEGORIA, "⚠️ Erro interno no Sienge ao tentar gerar boleto", nivel=logging.WARNING,
+                       titulo=titulo_id, parcela=parcela_id)
             else:
-                logging.info("🔴 Nenhuma segunda via disponível para essa parcela.")
+                evento(CATEGORIA, "🔴 Nenhuma segunda via disponível", nivel=logging.DEBUG, titulo=titulo_id, parcela=parcela_id)
 
+    except PrazoEsgotado:
+        raise
     except Exception as e:
-        logging.error(f"Erro ao verificar boleto ({titulo_id}/{parcela_id}): {e}")
+        evento(CATEGORIA, "Erro ao verificar boleto", nivel=logging.ERROR, titulo=titulo_id, parcela=parcela_id, erro=e)
     return False
 
 
@@ -113,72 +108,73 @@ def buscar_boletos_por_cpf(cpf: str):
 
     nome = cliente.get("name")
     cid = cliente.get("id")
-    logging.info(f"✅ Cliente encontrado: {nome} (ID {cid})")
-
-    boletos = listar_boletos_por_cliente(cid)
-    logging.info(f"📊 Total de títulos retornados: {len(boletos)}")
-
-    if not boletos:
-        return {"erro": f"📭 Nenhum boleto encontrado para {nome}."}
+    evento(CATEGORIA, "✅ Cliente encontrado", cliente=cid, nome=nome)
 
+    # Títulos processados conforme as páginas chegam
     lista = []
-    for b in boletos:
-        titulo_id = b.get("id") or b.get("receivableBillId")
-        valor = b.get("amount") or b.get("receivableBillValue") or 0.0
-        desc = b.get("description") or b.get("documentNumber") or b.get("note") or "-"
-        emissao = b.get("issueDate")
-        quitado = b.get("payOffDate")
-
-        logging.info(f"🧾 Título {titulo_id} | Valor {valor} | Descrição: {desc}")
-
-        if quitado:
-            logging.info(f"⏭️ Ignorando título {titulo_id} (já quitado)")
-            continue
-
-        parcelas = listar_parcelas(titulo_id)
-        logging.info(f"📦 Parcelas do título {titulo_id}: {len(parcelas)}")
-
-        if not parcelas:
-            continue
+    titulos = 0
+    try:
+        for b in iterar_boletos_por_cliente(cid):
+            titulos += 1
+            titulo_id = b.get("id") or b.get("receivableBillId")
+            valor = b.get("amount") or b.get("receivableBillValue") or 0.0
+            desc = b.get("description") or b.get("documentNumber") or b.get("note") or "-"
+            emissao = b.get("issueDate")
+            quitado = b.get("payOffDate")
+
+            if quitado:
+                evento(CATEGORIA, "⏭️ Título já quitado", nivel=logging.DEBUG, titulo=titulo_id)
+                continue
 
-        for p in parcelas:
-            logging.info(f"🧩 Parcela -> {p}")
+            parcelas = listar_parcelas(titulo_id)
+            evento(CATEGORIA, "🧾 Título", nivel=logging.DEBUG, titulo=titulo_id, valor=valor, descricao=desc, parcelas=len(parcelas))
 
-            # ✅ Usa o campo installmentId como ID principal
-            parcela_id = p.get("id") or p.get("installmentId")
-            if not parcela_id:
-                logging.info("⚠️ Parcela sem ID, ignorada")
+            if not parcelas:
                 continue
 
-            logging.info(f"🔍 Testando boleto título={titulo_id}, parcela={parcela_id}, valor={p.get('balanceDue')}")
-            existe = boleto_existe(titulo_id, parcela_id)
-            logging.info(f"Resultado da verificação -> {'🟢 Existe' if existe else '🔴 Não existe'}")
+            for p in parcelas:
+                # ✅ Usa o campo installmentId como ID principal
+                parcela_id = p.get("id") or p.get("installmentId")
+                if not parcela_id:
+                    evento(CATEGORIA, "⚠️ Parcela sem ID, ignorada", nivel=logging.DEBUG, titulo=titulo_id, parcela=p)
+                    continue
 
-            if not existe:
-                continue
+                existe = boleto_existe(titulo_id, parcela_id)
+                evento(CATEGORIA, "🔍 Parcela verificada", nivel=logging.DEBUG,
+                       titulo=titulo_id, parcela=parcela_id, saldo=p.get("balanceDue"), existe=existe)
+
+                if not existe:
+                    continue
 
-            lista.append({
-                "titulo_id": titulo_id,
-                "parcela_id": parcela_id,
-                "descricao": desc,
-                "valor": p.get("balanceDue") or valor,
-                "vencimento": p.get("dueDate") or emissao,
-            })
-
-        # 🔍 Checagem extra para parcelas conhecidas (Sienge às vezes omite)
-        parcelas_extras = [56, 99]
-        for extra_id in parcelas_extras:
-            logging.info(f"🔄 Tentando verificar parcela extra manual: {extra_id} (título {titulo_id})")
-            existe = boleto_existe(titulo_id, extra_id)
-            if existe:
                 lista.append({
                     "titulo_id": titulo_id,
-                    "parcela_id": extra_id,
+                    "parcela_id": parcela_id,
                     "descricao": desc,
-                    "valor": valor,
-                    "vencimento": emissao,
+                    "valor": p.get("balanceDue") or valor,
+                    "vencimento": p.get("dueDate") or emissao,
                 })
 
+            # 🔍 Checagem extra para parcelas conhecidas (Sienge às vezes omite)
+            parcelas_extras = [56, 99]
+            for extra_id in parcelas_extras:
+                evento(CATEGORIA, "🔄 Parcela extra manual", nivel=logging.DEBUG, titulo=titulo_id, parcela=extra_id)
+                existe = boleto_existe(titulo_id, extra_id)
+                if existe:
+                    lista.append({
+                        "titulo_id": titulo_id,
+                        "parcela_id": extra_id,
+                        "descricao": desc,
+                        "valor": valor,
+                        "vencimento": emissao,
+                    })
+    except PrazoEsgotado:
+        if not lista:
+            raise
+        marcar_parcial("boletos")  # entrega os já conferidos
+
+    evento(CATEGORIA, "📊 Títulos do cliente verificados", cliente=cid, titulos=titulos, disponiveis=len(lista))
+    if not titulos:
+        return {"erro": f"📭 Nenhum boleto encontrado para {nome}."}
     if not lista:
         return {"erro": f"📭 Nenhum boleto disponível para segunda via de {nome}."}
 
@@ -196,10 +192,10 @@ def gerar_link_boleto(titulo_id: int, parcela_id: int) -> str:
     url = f"{BASE_URL}/payment-slip-notification"
     params = {"billReceivableId": titulo_id, "installmentId": parcela_id}
 
-    logging.info(f"GET {url} -> params={params}")
-    r = requests.get(url, headers=json_headers, params=params, timeout=30)
-    logging.info(f"{url} -> {r.status_code}")
-    logging.info(f"Resposta: {r.text[:400]}")
+    r = sienge_request("GET", url, params=params, timeout=30)
+    evento(CATEGORIA, "🔗 Gerando link do boleto", titulo=titulo_id, parcela=parcela_id, status=r.status_code)
+    if ativo(CATEGORIA, logging.DEBUG):
+        evento(CATEGORIA, "Resposta payment-slip-notification", nivel=logging.DEBUG, resposta=r.text[:400])
 
     if r.status_code == 200:
         try:
@@ -211,7 +207,6 @@ def gerar_link_boleto(titulo_id: int, parcela_id: int) -> str:
                 linha_digitavel = result.get("digitableNumber")
 
                 if link:
-                    logging.info(f"🟢 Link do boleto gerado: {link}")
                     return (
                         f"📄 **Segunda via gerada com sucesso!**\n"
                         f"🔗 [Clique aqui para abrir o boleto]({link})\n"
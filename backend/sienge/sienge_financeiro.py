@@ -1,27 +1,24 @@
-import requests
 import logging
+import os
+import threading
 import time
-import json
-from base64 import b64encode
-from datetime import datetime, timedelta
-
-logging.warning("🚀 Rodando versão 6.0 do sienge_financeiro.py (com nomes de contas financeiras e IA integrada)")
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import date, datetime, timedelta
 
-# ============================================================
-# 🔐 Configurações de autenticação
-# ============================================================
-subdominio = "cctcontrol"
-usuario = "cctcontrol-api"
-senha = "9SQ2MaNrFOeZOOuOAqeSRy7bYWYDDf85"
+import requests
 
-BASE_URL = f"https://api.sienge.com.br/{subdominio}/public/api/v1"
-_token = b64encode(f"{usuario}:{senha}".encode()).decode()
+from metricas import cache_hit, cache_miss
+from prazo import PrazoEsgotado, marcar_parcial
+from rastreio import propagar, span
+from sienge.cache_apropriacoes import criar_cache_apropriacoes
+from sienge.sienge_http import (
+    BASE_URL, PRIORIDADE_BACKGROUND, CircuitoAberto, PaginaFalhou, paginar, prioridade, sienge_request,
+)
 
-json_headers = {
-    "Authorization": f"Basic {_token}",
-    "accept": "application/json",
-    "Content-Type": "application/json",
-}
+logging.warning("🚀 Rodando versão 6.0 do sienge_financeiro.py (com nomes de contas financeiras e IA integrada)")
 
 _cache = {}
 
@@ -29,14 +26,21 @@ def get_cached(url):
     if not url:
         return "N/A"
     if url in _cache:
+        cache_hit("entidades")
         return _cache[url]
+    cache_miss("entidades")
     try:
-        r = requests.get(url, headers=json_headers, timeout=20)
+        r = sienge_request("GET", url, timeout=20)
         if r.status_code == 200:
             data = r.json()
             name = data.get("name") or data.get("description") or data.get("fantasyName") or "N/A"
             _cache[url] = name
             return name
+    except CircuitoAberto:
+        return "N/A"  # não grava no cache: o nome volta quando o Sienge voltar
+    except PrazoEsgotado:
+        marcar_parcial("nomes")
+        return "N/A"  # idem: a próxima mensagem resolve o nome
     except Exception as e:
         logging.error(f"⚠️ Erro ao buscar {url}: {e}")
     _cache[url] = "N/A"
@@ -45,41 +49,63 @@ def get_cached(url):
 # ============================================================
 # 🧾 Apropriação Financeira (Plano de Contas)
 # ============================================================
-def get_apropriacoes_financeiras(bill_id: int):
+_cache_apropriacoes = criar_cache_apropriacoes()
+
+
+def marcador_conta(item) -> str:
+    """O que muda num título quando o rateio pode ter mudado: data de alteração, status e valor."""
+    alterado = item.get("changedDate") or item.get("lastModifiedDate") or item.get("registeredDate") or ""
+    return f"{alterado}|{item.get('status', '')}|{_valor_conta(item)}"
+
+
+def get_apropriacoes_financeiras(bill_id: int, marcador: str = None):
     """
     Busca as apropriações financeiras (categorias orçamentárias)
     vinculadas a um título específico no Sienge.
+    Com `marcador` (marcador_conta do título) usa o cache persistente.
     """
-    try:
-        url = f"{BASE_URL}/bills/{bill_id}/budget-categories"
-        r = requests.get(url, headers=json_headers, timeout=20)
-        if r.status_code == 200:
-            data = r.json()
-            results = data.get("results", [])
-            aprop_detalhes = []
-            for item in results:
-                categoria_codigo = item.get("paymentCategoriesId", "N/A")
-                categoria_nome = categoria_codigo
-                centro = "N/A"
-                percentual = item.get("percentage", 0)
-
-                for link in item.get("links", []):
-                    if link.get("rel") == "debtor":
-                        centro = get_cached(link.get("href"))
-                    if link.get("rel") == "paymentCategory":  # 🔥 Nome da conta financeira
-                        categoria_nome = get_cached(link.get("href"))
-
-                aprop_detalhes.append({
-                    "categoria": categoria_nome,
-                    "percentual": percentual,
-                    "debtor": centro,
-                })
-            return aprop_detalhes
-        elif r.status_code == 404:
+    itens = None
+    if marcador is not None and _cache_apropriacoes is not None:
+        itens = _cache_apropriacoes.obter(bill_id, marcador)
+        (cache_hit if itens is not None else cache_miss)("apropriacoes")
+    if itens is None:
+        try:
+            url = f"{BASE_URL}/bills/{bill_id}/budget-categories"
+            r = sienge_request("GET", url, timeout=20)
+            if r.status_code != 200:
+                return []
+            itens = [{k: item[k] for k in ("paymentCategoriesId", "percentage", "links") if k in item}
+                     for item in r.json().get("results", [])]
+        except CircuitoAberto:
             return []
-    except Exception as e:
-        logging.exception(f"⚠️ Erro em get_apropriacoes_financeiras: {e}")
-    return []
+        except PrazoEsgotado:
+            marcar_parcial("apropriacoes")
+            return []
+        except Exception as e:
+            logging.exception(f"⚠️ Erro em get_apropriacoes_financeiras: {e}")
+            return []
+        if marcador is not None and _cache_apropriacoes is not None:
+            _cache_apropriacoes.salvar(bill_id, marcador, itens)
+
+    aprop_detalhes = []
+    for item in itens:
+        categoria_codigo = item.get("paymentCategoriesId", "N/A")
+        categoria_nome = categoria_codigo
+        centro = "N/A"
+        percentual = item.get("percentage", 0)
+
+        for link in item.get("links", []):
+            if link.get("rel") == "debtor":
+                centro = get_cached(link.get("href"))
+            if link.get("rel") == "paymentCategory":  # 🔥 Nome da conta financeira
+                categoria_nome = get_cached(link.get("href"))
+
+        aprop_detalhes.append({
+            "categoria": categoria_nome,
+            "percentual": percentual,
+            "debtor": centro,
+        })
+    return aprop_detalhes
 
 # ============================================================
 # Datas padrão
@@ -89,81 +115,532 @@ def periodo_padrao():
     inicio = fim - timedelta(days=365)
     return inicio.isoformat(), fim.isoformat()
 
+# ============================================================
+# 🗓️ Partições mensais (meses fechados não mudam)
+# ============================================================
+# Uma janela startDate..endDate vira uma consulta por mês, baixadas em
+# paralelo e guardadas separadamente. Mês que já terminou fica no cache por
+# PARTICAO_TTL_PASSADO; o mês corrente (ou futuro) só por PARTICAO_TTL_ATUAL.
+# Qualquer período de filtro é montado juntando as partições.
+#
+#   PARTICAO_TTL_PASSADO = segundos para meses fechados (padrão: 7 dias)
+#   PARTICAO_TTL_ATUAL   = segundos para o mês corrente (padrão: 300)
+#   PARTICAO_PARALELO    = meses baixados ao mesmo tempo (padrão: 4)
+#   PARTICAO_MAX         = partições em memória (LRU, padrão: 512)
+
+PARTICAO_TTL_PASSADO = float(os.getenv("PARTICAO_TTL_PASSADO", str(7 * 24 * 3600)))
+PARTICAO_TTL_ATUAL = float(os.getenv("PARTICAO_TTL_ATUAL", "300"))
+PARTICAO_PARALELO = int(os.getenv("PARTICAO_PARALELO", "4"))
+PARTICAO_MAX = int(os.getenv("PARTICAO_MAX", "512"))
+
+_particoes = OrderedDict()  # chave -> (expira_em, resultados)
+_particoes_lock = threading.Lock()
+# Segundos de antecedência: partição que vence dentro da margem é rebaixada
+# (o aquecimento usa o intervalo até a próxima rodada)
+_renovar_margem: ContextVar[float] = ContextVar("particao_renovar_margem", default=0.0)
+
+
+@contextmanager
+def renovando(margem: float):
+    """Dentro do bloco, partições que vencem em menos de `margem` segundos contam como ausentes."""
+    token = _renovar_margem.set(margem)
+    try:
+        yield
+    finally:
+        _renovar_margem.reset(token)
+
+
+def particoes_mensais(inicio: str, fim: str):
+    """Divide [inicio, fim] (ISO, inclusivo) em fatias que não cruzam a virada do mês."""
+    a, b = date.fromisoformat(inicio[:10]), date.fromisoformat(fim[:10])
+    fatias = []
+    while a <= b:
+        proximo_mes = (a.replace(day=28) + timedelta(days=4)).replace(day=1)
+        ate = min(b, proximo_mes - timedelta(days=1))
+        fatias.append((a.isoformat(), ate.isoformat()))
+        a = proximo_mes
+    return fatias
+
+
+def _ttl_particao(fim: str) -> float:
+    hoje = datetime.now().date()
+    return PARTICAO_TTL_PASSADO if date.fromisoformat(fim) < hoje.replace(day=1) else PARTICAO_TTL_ATUAL
+
+
+def _particao_do_cache(chave, margem: float = None):
+    agora = time.monotonic()
+    margem = _renovar_margem.get() if margem is None else margem
+    with _particoes_lock:
+        item = _particoes.get(chave)
+        if item is None:
+            return None
+        if item[0] < agora:
+            del _particoes[chave]
+            return None
+        if item[0] - margem < agora:
+            return None  # ainda vale, mas será renovada (se a renovação falhar, a antiga fica)
+        _particoes.move_to_end(chave)
+        return item[1]
+
+
+def _guardar_particao(chave, resultados, ttl: float):
+    with _particoes_lock:
+        _particoes[chave] = (time.monotonic() + ttl, resultados)
+        _particoes.move_to_end(chave)
+        while len(_particoes) > PARTICAO_MAX:
+            _particoes.popitem(last=False)
+
+
+def limpar_particoes():
+    with _particoes_lock:
+        _particoes.clear()
+
+
 # ============================================================
 # Função base GET
 # ============================================================
-def sienge_get(endpoint, params=None, max_retries=3):
-    url = f"{BASE_URL}/{endpoint}"
-    if params is None:
-        params = {}
+def sienge_get(endpoint, params=None, max_retries=3, particionar=True):
+    """Listagem completa (todas as páginas de todos os meses) como lista."""
+    return list(sienge_iter(endpoint, params, max_retries, particionar))
+
+
+def sienge_iter(endpoint, params=None, max_retries=3, particionar=True):
+    """
+    Itens da listagem com janela de datas, mês a mês e em ordem.
+    Meses em cache saem na hora; os que faltam são baixados em paralelo
+    (cada um paginado) e entregues assim que o mês da vez fica pronto.
+    """
+    params = _com_periodo(params)
+    if not particionar or not params.get("endDate"):
+        yield from _sienge_get_janela(endpoint, params, max_retries)
+        return
+
+    base, fatias = _base_e_fatias(params)
+    em_cache = []
+    for ini, fim in fatias:
+        dados = _particao_do_cache((endpoint, base, ini, fim))
+        (cache_miss if dados is None else cache_hit)("particoes")
+        em_cache.append(dados)
+
+    def _baixar(fatia):
+        ini, fim = fatia
+        dados = _sienge_get_janela(endpoint, {**params, "startDate": ini, "endDate": fim}, max_retries)
+        _guardar_particao((endpoint, base, ini, fim), dados, _ttl_particao(fim))
+        return dados
+
+    faltando = [f for f, dados in zip(fatias, em_cache) if dados is None]
+    if len(faltando) <= 1:
+        for fatia, dados in zip(fatias, em_cache):
+            yield from (dados if dados is not None else _baixar(fatia))
+        return
+
+    with ThreadPoolExecutor(max_workers=min(PARTICAO_PARALELO, len(faltando))) as pool:
+        futuros = {f: pool.submit(propagar(_baixar), f) for f in faltando}
+        for fatia, dados in zip(fatias, em_cache):
+            yield from (dados if dados is not None else futuros[fatia].result())
+
+
+def _com_periodo(params):
+    params = dict(params or {})
     if "startDate" not in params:
-        inicio, fim = periodo_padrao()
-        params["startDate"], params["endDate"] = inicio, fim
+        params["startDate"], params["endDate"] = periodo_padrao()
+    return params
 
-    for tentativa in range(1, max_retries + 1):
-        try:
-            r = requests.get(url, headers=json_headers, params=params, timeout=40)
-            if r.status_code == 200:
-                data = r.json()
-                return data.get("results") or data
-            elif r.status_code == 429:
-                time.sleep(2 * tentativa)
-            elif r.status_code >= 500:
-                time.sleep(2)
-        except Exception as e:
-            logging.exception(f"❌ Erro em sienge_get: {e}")
-            time.sleep(2)
-    return []
+
+def _base_e_fatias(params):
+    base = tuple(sorted((k, str(v)) for k, v in params.items() if k not in ("startDate", "endDate")))
+    return base, particoes_mensais(params["startDate"], params["endDate"])
+
+
+def particoes_prontas(params=None, endpoints=("bills", "accounts-receivable/receivable-bills"), margem: float = 0.0):
+    """(em cache, total) das partições que um relatório com esses filtros vai ler. Não conta hit/miss."""
+    params = _com_periodo(params)
+    if not params.get("endDate"):
+        return 0, len(endpoints)
+    base, fatias = _base_e_fatias(params)
+    chaves = [(e, base, ini, fim) for e in endpoints for ini, fim in fatias]
+    return sum(_particao_do_cache(c, margem) is not None for c in chaves), len(chaves)
+
+
+class ListagemIncompleta(Exception):
+    """Uma janela da listagem não veio inteira: totais montados sem ela estariam errados."""
+
+    def __init__(self, endpoint: str, params: dict, motivo):
+        super().__init__(f"{endpoint} {params.get('startDate')}..{params.get('endDate')} incompleto ({motivo})")
+        self.endpoint = endpoint
+        self.motivo = motivo
+
+
+def _sienge_get_janela(endpoint, params, max_retries=3):
+    """Todas as páginas de uma consulta. ListagemIncompleta se alguma falhar — nunca uma lista pela metade."""
+    url = f"{BASE_URL}/{endpoint}"
+    try:
+        # 429/5xx já são retentados no limitador global (Retry-After + backoff)
+        return list(paginar(url, params, max_retries=max_retries))
+    except PaginaFalhou as e:
+        logging.warning(f"⚠️ sienge_get {endpoint} -> {e.status} (offset {e.offset})")
+        raise ListagemIncompleta(endpoint, params, e.status) from e
+    except requests.RequestException as e:
+        logging.warning(f"⚠️ sienge_get {endpoint} -> {e}")
+        raise ListagemIncompleta(endpoint, params, type(e).__name__) from e
 
 # ============================================================
 # 💰 Relatórios Financeiros
 # ============================================================
-def gerar_relatorio_json(params=None, **kwargs):
+# O relatório é montado em níveis, e só roda o que os `campos` pedidos exigem:
+#   totais        → as duas listagens (bills + receivable-bills) e o DRE
+#   nomes         → empresa/fornecedor/centro/obra de cada título (get_cached)
+#   apropriacoes  → /bills/{id}/budget-categories de cada título (o mais caro)
+# campos=None mantém o relatório completo (análise com IA, dashboard, Gamma).
+
+# campo da despesa → rel do link com o nome
+LINKS_NOMES = {
+    "empresa": "company",
+    "fornecedor": "creditor",
+    "centro_custo": "departmentsCost",
+    "obra": "buildingsCost",
+}
+# agregações prontas → campo de nome de que dependem
+AGREGACOES = {"por_obra": "obra", "por_centro_custo": "centro_custo"}
+CAMPO_APROPRIACOES = "apropriacoes_financeiras"
+
+
+def nomes_necessarios(campos=None) -> set:
+    """Quais nomes (nível 'nomes') os campos pedidos exigem."""
+    if campos is None:
+        return set(LINKS_NOMES)
+    nomes = {c for c in campos if c in LINKS_NOMES}
+    nomes.update(AGREGACOES[c] for c in campos if c in AGREGACOES)
+    return nomes
+
+
+def gerar_relatorio_json(params=None, campos=None, **kwargs):
+    """
+    Relatório financeiro do período/empresa.
+    campos: conjunto com o que o chamador vai ler ("dre", "por_obra",
+    "por_centro_custo", "obra", "fornecedor", "apropriacoes_financeiras"...).
+    """
     if not params:
         params = kwargs or {}
+    nomes = nomes_necessarios(campos)
+    com_apropriacoes = campos is None or CAMPO_APROPRIACOES in campos
 
-    contas_pagar = sienge_get("bills", params)
-    contas_receber = sienge_get("accounts-receivable/receivable-bills", params)
+    # As linhas são somadas/enriquecidas conforme chegam (página a página, mês a mês)
+    with span("receitas"):
+        total_receitas = sum(float(c.get("receivableBillValue") or 0)
+                             for c in sienge_iter("accounts-receivable/receivable-bills", params))
 
-    total_receitas = sum(float(c.get("receivableBillValue") or 0) for c in contas_receber)
-    total_despesas = sum(float(c.get("totalInvoiceAmount") or c.get("totalValueAmount") or 0) for c in contas_pagar)
-    lucro = total_receitas - total_despesas
+    with span("despesas"):
+        total_despesas = 0.0
+        todas_despesas = []
+        for item in sienge_iter("bills", params):
+            total_despesas += _valor_conta(item)
+            todas_despesas.append(_linha_despesa(item, nomes, com_apropriacoes))
 
-    dre_formatado = {
-        "receitas": f"R$ {total_receitas:,.2f}",
-        "despesas": f"R$ {total_despesas:,.2f}",
-        "lucro": f"R$ {lucro:,.2f}",
-    }
-
-    todas_despesas = []
-    for item in contas_pagar:
-        links = {l["rel"]: l["href"] for l in item.get("links", [])}
-        empresa = get_cached(links.get("company", "")) if "company" in links else "N/A"
-        fornecedor = get_cached(links.get("creditor", "")) if "creditor" in links else "N/A"
-        centro = get_cached(links.get("departmentsCost", "")) if "departmentsCost" in links else "N/A"
-        obra = get_cached(links.get("buildingsCost", "")) if "buildingsCost" in links else "N/A"
+    with span("agregacao"):
+        lucro = total_receitas - total_despesas
 
-        bill_id = item.get("id")
-        aprop_fin = get_apropriacoes_financeiras(bill_id) if bill_id else []
-
-        todas_despesas.append({
-            "empresa": empresa,
-            "fornecedor": fornecedor,
-            "centro_custo": centro,
-            "obra": obra,
-            "status": item.get("status", "N/A"),
-            "valor_total": float(item.get("totalInvoiceAmount") or item.get("totalValueAmount") or 0),
-            "data_vencimento": item.get("dueDate", "N/A"),
-            "descricao": item.get("notes") or item.get("description") or "",
-            "documento": item.get("documentNumber", ""),
-            "tipo_lancamento": item.get("originId", ""),
-            "apropriacoes_financeiras": aprop_fin,
-        })
+        dre_valores = {"receitas": total_receitas, "despesas": total_despesas, "lucro": lucro}
+        dre_formatado = {
+            "receitas": f"R$ {total_receitas:,.2f}",
+            "despesas": f"R$ {total_despesas:,.2f}",
+            "lucro": f"R$ {lucro:,.2f}",
+        }
 
-    logging.info(f"🧾 Total despesas extraídas: {len(todas_despesas)}")
+    logging.info(f"🧾 Total despesas extraídas: {len(todas_despesas)} (nomes={sorted(nomes)}, apropriações={com_apropriacoes})")
 
-    return {
+    rel = {
         "todas_despesas": todas_despesas,
-        "dre": {"formatado": dre_formatado},
+        "dre": {"formatado": dre_formatado, "valores": dre_valores},
         "total_registros": len(todas_despesas)
     }
+    for chave, campo in AGREGACOES.items():
+        if campo in nomes:
+            rel[chave] = _somar_por(todas_despesas, campo)
+    return rel
+
+
+def _valor_conta(item) -> float:
+    return float(item.get("totalInvoiceAmount") or item.get("totalValueAmount") or 0)
+
+
+def _somar_por(despesas, campo):
+    """[{campo: nome, "valor": total}, ...] do maior para o menor."""
+    totais = {}
+    for d in despesas:
+        totais[d[campo]] = totais.get(d[campo], 0.0) + d["valor_total"]
+    return [{campo: nome, "valor": valor} for nome, valor in sorted(totais.items(), key=lambda kv: -kv[1])]
+
+
+def _linha_despesa(item, nomes, com_apropriacoes):
+    """Linha de despesa de um título; resolve só os nomes pedidos e, se pedido, as apropriações."""
+    despesa = {}
+    if nomes:
+        links = {l["rel"]: l["href"] for l in item.get("links", [])}
+        for campo, rel in LINKS_NOMES.items():
+            if campo in nomes:
+                despesa[campo] = get_cached(links[rel]) if rel in links else "N/A"
+    despesa.update({
+        "status": item.get("status", "N/A"),
+        "valor_total": _valor_conta(item),
+        "data_vencimento": item.get("dueDate", "N/A"),
+        "data_emissao": item.get("issueDate", ""),
+        "descricao": item.get("notes") or item.get("description") or "",
+        "documento": item.get("documentNumber", ""),
+        "tipo_lancamento": item.get("originId", ""),
+    })
+    if com_apropriacoes:
+        bill_id = item.get("id")
+        despesa[CAMPO_APROPRIACOES] = get_apropriacoes_financeiras(bill_id, marcador_conta(item)) if bill_id else []
+    return despesa
+
+
+def iterar_despesas(params=None, campos=None):
+    """
+    Mesmas linhas de `todas_despesas`, entregues mês a mês (exportação).
+    Só um mês fica em memória; a listagem do mês seguinte já vai sendo
+    baixada enquanto este é enriquecido. Os meses não entram no cache de
+    partições (uma exportação de anos ocuparia a memória por dias).
+    Uma página que falha levanta PaginaFalhou e interrompe a exportação
+    (nada de arquivo "completo" sem um mês). Roda com prioridade de
+    fundo no limitador para não disputar com o chat.
+    """
+    params = dict(params or {})
+    if "startDate" not in params:
+        params["startDate"], params["endDate"] = periodo_padrao()
+    nomes = nomes_necessarios(campos)
+    com_apropriacoes = campos is None or CAMPO_APROPRIACOES in campos
+    fatias = particoes_mensais(params["startDate"], params["endDate"])
+
+    def _listar(fatia):
+        with prioridade(PRIORIDADE_BACKGROUND):
+            return list(paginar(f"{BASE_URL}/bills", {**params, "startDate": fatia[0], "endDate": fatia[1]}))
+
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        proxima = pool.submit(propagar(_listar), fatias[0]) if fatias else None
+        for i in range(len(fatias)):
+            contas = proxima.result()
+            proxima = pool.submit(propagar(_listar), fatias[i + 1]) if i + 1 < len(fatias) else None
+            for item in contas:
+                with prioridade(PRIORIDADE_BACKGROUND):
+                    linha = _linha_despesa(item, nomes, com_apropriacoes)
+                yield linha
+
+# ============================================================
+# 🚨 Alertas (varredura vetorizada da base inteira)
+# ============================================================
+# Regras determinísticas sobre TODAS as despesas do período (não a amostra
+# que vai para a IA), em operações de coluna do pandas/NumPy:
+#   concentracao_fornecedor  fornecedor com fatia >= ALERTA_CONCENTRACAO do total
+#   documento_duplicado      mesmo documento + mesmo valor lançado mais de uma vez
+#   fora_da_curva_obra       z-score do log do valor dentro da obra >= ALERTA_ZSCORE
+#   fora_da_curva_plano      idem por plano de contas (só quando há apropriações)
+#   vencidos_obra            títulos em aberto já vencidos, agrupados por obra
+#   pico_vencimentos         semanas com vencidos muito acima da média
+#   salto_mensal             mês (emissão) >= (1 + ALERTA_SALTO_MENSAL) × mês anterior
+# O z-score é calculado no log do valor: despesas têm cauda longa e, em
+# escala linear, qualquer compra grande viraria alerta.
+
+ALERTA_CONCENTRACAO = float(os.getenv("ALERTA_CONCENTRACAO", "0.25"))
+ALERTA_ZSCORE = float(os.getenv("ALERTA_ZSCORE", "3.5"))
+ALERTA_SALTO_MENSAL = float(os.getenv("ALERTA_SALTO_MENSAL", "0.5"))
+ALERTA_VENCIDOS_MIN = int(os.getenv("ALERTA_VENCIDOS_MIN", "3"))
+ALERTA_GRUPO_MIN = int(os.getenv("ALERTA_GRUPO_MIN", "8"))
+ALERTA_MAX_POR_TIPO = int(os.getenv("ALERTA_MAX_POR_TIPO", "10"))
+
+# Nomes que o relatório precisa resolver para a intenção "alertas" (sem apropriações)
+CAMPOS_ALERTAS = {"fornecedor", "obra"}
+COLUNAS_ALERTAS = ("fornecedor", "obra", "documento", "valor_total", "data_vencimento", "data_emissao", "status")
+STATUS_QUITADOS = ("PAID", "PAGO", "SETTLED", "CANCELED", "CANCELLED")
+SEVERIDADES = ("alta", "media", "baixa")
+
+
+def _brl(v) -> str:
+    return f"R$ {v:,.2f}"
+
+
+def _alerta(tipo, severidade, mensagem, valor=0.0, **extra):
+    return {"tipo": tipo, "severidade": severidade, "mensagem": mensagem, "valor": float(valor), **extra}
+
+
+def quadro_alertas(despesas):
+    """
+    DataFrame só com as colunas usadas. Texto vira category (cada groupby
+    reaproveita os códigos), datas são convertidas uma vez por valor distinto.
+    """
+    import numpy as np
+    import pandas as pd
+
+    def _categoria(valores):
+        # factorize não ordena as categorias (Categorical(lista) ordena: ~5x mais lento com 100k documentos)
+        codigos, unicos = pd.factorize(np.array(valores, dtype=object))
+        return pd.Categorical.from_codes(codigos, unicos)
+
+    def _datas(valores):
+        cat = _categoria(valores)
+        convertidas = pd.to_datetime(pd.Series(cat.categories, dtype=object), errors="coerce", format="%Y-%m-%d")
+        return pd.Series(pd.DatetimeIndex(convertidas).take(cat.codes, allow_fill=True, fill_value=pd.NaT))
+
+    if isinstance(despesas, pd.DataFrame) and "emissao" in despesas.columns:
+        return despesas  # já é um quadro de alertas
+    if isinstance(despesas, pd.DataFrame):
+        colunas = {c: (despesas[c].tolist() if c in despesas.columns else [None] * len(despesas)) for c in COLUNAS_ALERTAS}
+        aprops = despesas[CAMPO_APROPRIACOES].tolist() if CAMPO_APROPRIACOES in despesas.columns else None
+    else:
+        colunas = {c: [d.get(c) for d in despesas] for c in COLUNAS_ALERTAS}
+        aprops = [d.get(CAMPO_APROPRIACOES) for d in despesas] if CAMPO_APROPRIACOES in despesas[0] else None
+
+    df = pd.DataFrame({
+        "valor_total": np.fromiter((float(v or 0) for v in colunas["valor_total"]), float, len(colunas["valor_total"])),
+        **{c: _categoria([v or "" for v in colunas[c]]) for c in ("fornecedor", "obra", "documento", "status")},
+    })
+    df["vencimento"] = _datas(colunas["data_vencimento"])
+    df["emissao"] = _datas(colunas["data_emissao"]).fillna(df["vencimento"])
+    if aprops is not None:
+        df[CAMPO_APROPRIACOES] = aprops
+    return df
+
+
+def _fora_da_curva(grupos, valores, tipo, rotulo):
+    """z-score de log1p(valor) dentro de cada grupo com pelo menos ALERTA_GRUPO_MIN lançamentos."""
+    import numpy as np
+
+    logv = np.log1p(valores.clip(lower=0))
+    por_grupo = logv.groupby(grupos, sort=False, observed=True)
+    media, desvio, n = por_grupo.transform("mean"), por_grupo.transform("std"), por_grupo.transform("size")
+    z = (logv - media) / desvio.replace(0, np.nan)
+    marcados = z[(n >= ALERTA_GRUPO_MIN) & (z >= ALERTA_ZSCORE) & (grupos != "") & (grupos != "N/A")]
+    if marcados.empty:
+        return []
+    topo = marcados.nlargest(ALERTA_MAX_POR_TIPO).index
+    mediana = valores.groupby(grupos, sort=False, observed=True).transform("median")
+    return [
+        _alerta(tipo, "media" if z.at[i] < ALERTA_ZSCORE + 1 else "alta",
+                f"{rotulo} {grupos.at[i]}: lançamento de {_brl(valores.at[i])} (mediana {_brl(mediana.at[i])}, z={z.at[i]:.1f})",
+                valores.at[i], grupo=grupos.at[i], z=round(float(z.at[i]), 2), total_no_tipo=int(len(marcados)))
+        for i in topo
+    ]
+
+
+def detectar_alertas(despesas, hoje: date = None) -> list:
+    """
+    Alertas sobre as despesas (lista de `todas_despesas`, DataFrame ou o
+    quadro de `quadro_alertas`), do mais grave para o menos grave e, dentro
+    da severidade, por valor.
+    """
+    import numpy as np
+    import pandas as pd
+
+    if despesas is None or len(despesas) == 0:
+        return []
+    df = quadro_alertas(despesas)
+    valor = df["valor_total"]
+    total = float(valor.sum())
+    alertas = []
+
+    # 1) Concentração em fornecedor (com poucos títulos qualquer um "concentra")
+    if total > 0 and len(df) >= ALERTA_GRUPO_MIN:
+        por_fornecedor = valor.groupby(df["fornecedor"], sort=False, observed=True).sum()
+        por_fornecedor = por_fornecedor[~por_fornecedor.index.isin(["", "N/A"])]
+        fatia = por_fornecedor / total
+        for nome, f in fatia[fatia >= ALERTA_CONCENTRACAO].sort_values(ascending=False).items():
+            alertas.append(_alerta(
+                "concentracao_fornecedor", "alta" if f >= 2 * ALERTA_CONCENTRACAO else "media",
+                f"Fornecedor {nome} concentra {f:.0%} das despesas ({_brl(por_fornecedor[nome])})",
+                por_fornecedor[nome], fornecedor=nome, fatia=round(float(f), 4)))
+
+    # 2) Documento + valor repetidos
+    repetidos = df[df.duplicated(["documento", "valor_total"], keep=False) & (df["documento"] != "")]
+    if not repetidos.empty:
+        grupos = repetidos.groupby(["documento", "valor_total"], sort=False, observed=True).agg(
+            vezes=("valor_total", "size"), fornecedores=("fornecedor", "nunique"))
+        grupos["excesso"] = grupos.index.get_level_values(1) * (grupos["vezes"] - 1)
+        for (doc, v), g in grupos.nlargest(ALERTA_MAX_POR_TIPO, "excesso").iterrows():
+            alertas.append(_alerta(
+                "documento_duplicado", "alta",
+                f"Documento {doc} de {_brl(v)} lançado {int(g['vezes'])}x"
+                + (f" ({int(g['fornecedores'])} fornecedores)" if g["fornecedores"] > 1 else ""),
+                g["excesso"], documento=doc, vezes=int(g["vezes"]), total_no_tipo=int(len(grupos))))
+
+    # 3) Fora da curva por obra e por plano de contas
+    alertas += _fora_da_curva(df["obra"], valor, "fora_da_curva_obra", "Obra")
+    if CAMPO_APROPRIACOES in df.columns:
+        aprops = df[CAMPO_APROPRIACOES]
+        tamanhos = aprops.map(lambda a: len(a) if isinstance(a, list) else 0).to_numpy()
+        if tamanhos.sum():
+            planas = [a for lista in aprops if isinstance(lista, list) for a in lista]
+            categorias = pd.Series(pd.Categorical([a.get("categoria") or "" for a in planas]))
+            pct = np.array([float(a.get("percentual") or 0) for a in planas])
+            valores = pd.Series(np.repeat(valor.to_numpy(), tamanhos) * pct / 100)
+            alertas += _fora_da_curva(categorias, valores, "fora_da_curva_plano", "Plano de contas")
+
+    # 4) Vencidos em aberto (por obra e picos semanais)
+    hoje = pd.Timestamp(hoje or datetime.now().date())
+    vencidos = df[(df["vencimento"] < hoje) & ~df["status"].isin(STATUS_QUITADOS)]
+    if len(vencidos) >= ALERTA_VENCIDOS_MIN:
+        por_obra = vencidos.groupby("obra", sort=False, observed=True).agg(
+            size=("valor_total", "size"), sum=("valor_total", "sum"), antigo=("vencimento", "min"))
+        por_obra = por_obra[por_obra["size"] >= ALERTA_VENCIDOS_MIN].nlargest(ALERTA_MAX_POR_TIPO, "sum")
+        for obra, g in por_obra.iterrows():
+            dias = int((hoje - g["antigo"]).days)
+            alertas.append(_alerta(
+                "vencidos_obra", "alta" if dias > 60 else "media",
+                f"Obra {obra or '-'}: {int(g['size'])} títulos vencidos em aberto ({_brl(g['sum'])}, o mais antigo há {dias} dias)",
+                g["sum"], obra=obra, titulos=int(g["size"]), dias=dias))
+
+        semanas = vencidos.groupby(vencidos["vencimento"].dt.to_period("W"))["valor_total"].agg(["size", "sum"])
+        corte = semanas["size"].mean() + 2 * semanas["size"].std(ddof=0)
+        picos = semanas[(semanas["size"] >= max(ALERTA_VENCIDOS_MIN, corte))].nlargest(ALERTA_MAX_POR_TIPO, "sum")
+        for semana, g in picos.iterrows():
+            alertas.append(_alerta(
+                "pico_vencimentos", "media",
+                f"Semana de {semana.start_time.date().isoformat()}: {int(g['size'])} títulos vencidos em aberto ({_brl(g['sum'])})",
+                g["sum"], semana=semana.start_time.date().isoformat(), titulos=int(g["size"])))
+
+    # 5) Saltos mês a mês (total e por obra), numa matriz obra × mês
+    meses = df["emissao"].to_numpy().astype("datetime64[M]")
+    por_mes = valor.groupby([df["obra"], meses], observed=True).sum().unstack(fill_value=0.0).sort_index(axis=1)
+    if por_mes.shape[1] and df["emissao"].min().day > 1:
+        por_mes = por_mes.iloc[:, 1:]  # primeiro mês incompleto: não serve de base de comparação
+    if por_mes.shape[1] >= 2:
+        obras = list(por_mes.index) + [None]  # última linha = total
+        m = np.vstack([por_mes.to_numpy(), por_mes.to_numpy().sum(axis=0)])
+        anterior, atual = m[:, :-1], m[:, 1:]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            razao = np.where(anterior > 0, atual / anterior, 0.0)
+        # Um lançamento isolado numa obra pequena não é "salto": exige ao menos a média mensal da obra
+        aumento = np.where((razao >= 1 + ALERTA_SALTO_MENSAL) & (atual >= m.mean(axis=1, keepdims=True)),
+                           atual - anterior, 0.0)
+        for k in np.argsort(aumento, axis=None)[::-1][:ALERTA_MAX_POR_TIPO]:
+            i, j = divmod(int(k), aumento.shape[1])
+            if aumento[i, j] <= 0:
+                break
+            obra, mes = obras[i], str(por_mes.columns[j + 1])[:7]
+            alertas.append(_alerta(
+                "salto_mensal", "alta" if obra is None else "media",
+                f"{'Despesas totais' if obra is None else f'Obra {obra}'} em {mes}: {_brl(atual[i, j])} "
+                f"(+{razao[i, j] - 1:.0%} sobre o mês anterior)",
+                aumento[i, j], obra=obra, mes=mes))
+
+    ordem = {s: i for i, s in enumerate(SEVERIDADES)}
+    alertas.sort(key=lambda a: (ordem.get(a["severidade"], len(ordem)), -a["valor"]))
+    return alertas
+
+
+def resumo_alertas(alertas, max_linhas: int = 12) -> str:
+    """Digest compacto para os prompts de IA: contagem por tipo + os alertas mais graves."""
+    if not alertas:
+        return "Nenhum alerta automático na base completa."
+    contagem = {}
+    for a in alertas:
+        contagem[a["tipo"]] = contagem.get(a["tipo"], 0) + 1
+    linhas = ["Contagem: " + ", ".join(f"{t}={n}" for t, n in contagem.items())]
+    linhas += [f"- [{a['severidade']}] {a['mensagem']}" for a in alertas[:max_linhas]]
+    return "\n".join(linhas)
+
+
+def alertas_financeiros(params=None, **kwargs) -> list:
+    """Extrai o período (só os nomes necessários, sem apropriações) e roda detectar_alertas."""
+    rel = gerar_relatorio_json(params, campos=CAMPOS_ALERTAS, **kwargs)
+    with span("alertas"):
+        return detectar_alertas(rel.get("todas_despesas", []))
@@ -0,0 +1,429 @@
+import asyncio
+import email.utils
+import functools
+import heapq
+import itertools
+import logging
+import os
+import random
+import threading
+import time
+from base64 import b64encode
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FuturoTimeout
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from circuito import CircuitoAberto, disjuntor_sienge
+from metricas import Contador, registrar_coletor, registrar_upstream
+import prazo
+from prazo import PrazoEsgotado
+from rastreio import propagar, span
+
+# ============================================================
+# 🔐 CONFIGURAÇÕES DE AUTENTICAÇÃO SIENGE (compartilhadas)
+# ============================================================
+subdominio = "cctcontrol"
+usuario = "cctcontrol-api"
+senha = "9SQ2MaNrFOeZOOuOAqeSRy7bYWYDDf85"
+
+# SIENGE_BASE_URL permite apontar para um Sienge local de testes (bench/fake_sienge.py)
+BASE_URL = os.getenv("SIENGE_BASE_URL", f"https://api.sienge.com.br/{subdominio}/public/api/v1").rstrip("/")
+_token = b64encode(f"{usuario}:{senha}".encode()).decode()
+
+json_headers = {
+    "Authorization": f"Basic {_token}",
+    "accept": "application/json",
+    "Content-Type": "application/json",
+}
+
+pdf_headers = {
+    "Authorization": f"Basic {_token}",
+    "accept": "*/*",  # ✅ evita 406 no PDF
+}
+
+# ============================================================
+# 🚦 LIMITADOR DE TAXA (token bucket adaptativo com prioridade)
+# ============================================================
+# Todas as chamadas ao Sienge deste processo passam pelo mesmo balde.
+#   SIENGE_TAXA    = requisições/s somando todos os workers (padrão: 4)
+#   SIENGE_RAJADA  = tamanho do balde (padrão: 8)
+#   WEB_CONCURRENCY = nº de workers do uvicorn; a taxa é dividida entre eles
+# Ao receber 429 a taxa cai pela metade e o balde fica pausado pelo
+# Retry-After; cada sucesso devolve um pouco da taxa (AIMD).
+
+PRIORIDADE_INTERATIVA = 0   # mensagens do chat / webhooks
+PRIORIDADE_BACKGROUND = 10  # aquecimento de cache, sincronizações
+
+_prioridade_atual: ContextVar[int] = ContextVar("sienge_prioridade", default=PRIORIDADE_INTERATIVA)
+
+
+@contextmanager
+def prioridade(nivel: int):
+    """Define a prioridade das chamadas ao Sienge feitas dentro do bloco."""
+    token = _prioridade_atual.set(nivel)
+    try:
+        yield
+    finally:
+        _prioridade_atual.reset(token)
+
+
+class LimitadorTaxa:
+    def __init__(self, taxa: float, rajada: float, taxa_min: float = 0.2, incremento: float = 0.05):
+        self.taxa_max = taxa
+        self.taxa = taxa
+        self.taxa_min = min(taxa_min, taxa)
+        self.incremento = incremento
+        self.rajada = rajada
+        self._tokens = rajada
+        self._ultimo = time.monotonic()
+        self._pausado_ate = 0.0
+        self._fila = []  # heap de (prioridade, seq)
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+
+    def _repor(self, agora: float):
+        self._tokens = min(self.rajada, self._tokens + (agora - self._ultimo) * self.taxa)
+        self._ultimo = agora
+
+    def adquirir(self, nivel: Optional[int] = None, timeout: Optional[float] = None) -> bool:
+        """Bloqueia até liberar uma requisição. Menor `nivel` = atendido primeiro."""
+        nivel = _prioridade_atual.get() if nivel is None else nivel
+        limite = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            vez = (nivel, next(self._seq))
+            heapq.heappush(self._fila, vez)
+            try:
+                while True:
+                    agora = time.monotonic()
+                    self._repor(agora)
+                    if self._fila[0] == vez and agora >= self._pausado_ate and self._tokens >= 1:
+                        self._tokens -= 1
+                        return True
+                    if limite is not None and agora >= limite:
+                        return False
+                    if agora < self._pausado_ate:
+                        espera = self._pausado_ate - agora
+                    else:
+                        espera = max(0.001, (1 - self._tokens) / self.taxa)
+                    if limite is not None:
+                        espera = min(espera, limite - agora)
+                    self._cond.wait(espera)
+            finally:
+                self._fila.remove(vez)
+                heapq.heapify(self._fila)
+                self._cond.notify_all()
+
+    def registrar_429(self, retry_after: Optional[float]):
+        with self._cond:
+            self.taxa = max(self.taxa_min, self.taxa / 2)
+            if retry_after:
+                self._pausado_ate = max(self._pausado_ate, time.monotonic() + retry_after)
+            self._tokens = min(self._tokens, 0)
+            logging.warning(f"🚦 Sienge 429: taxa reduzida para {self.taxa:.2f} req/s, pausa {retry_after or 0:.1f}s")
+            self._cond.notify_all()
+
+    def registrar_sucesso(self):
+        if self.taxa < self.taxa_max:
+            with self._cond:
+                self.taxa = min(self.taxa_max, self.taxa + self.incremento)
+
+
+_workers = max(1, int(os.getenv("WEB_CONCURRENCY", "1")))
+limitador = LimitadorTaxa(
+    taxa=float(os.getenv("SIENGE_TAXA", "4")) / _workers,
+    rajada=float(os.getenv("SIENGE_RAJADA", "8")),
+)
+
+@registrar_coletor
+def _metricas_limitador():
+    return [("constru_sienge_taxa_req_s", "gauge", "Taxa atual do limitador do Sienge", [({}, limitador.taxa)])]
+
+
+# ============================================================
+# 🌐 SESSÃO HTTP + RETENTATIVAS
+# ============================================================
+_sessao = requests.Session()
+_sessao.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=32))
+_sessao.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=32))
+
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 20.0
+
+
+def _retry_after(r: requests.Response) -> Optional[float]:
+    valor = r.headers.get("Retry-After")
+    if not valor:
+        return None
+    try:
+        return max(0.0, float(valor))
+    except ValueError:
+        pass
+    try:
+        data = email.utils.parsedate_to_datetime(valor)
+        return max(0.0, data.timestamp() - time.time())
+    except Exception:
+        return None
+
+
+_SUBRECURSOS = ("budget-categories", "installments", "items", "pdf", "receivable-bills")
+
+
+def familia_endpoint(url: str) -> str:
+    """Agrupa URLs por recurso para as métricas: bills, budget-categories, customers..."""
+    caminho = urlsplit(url).path
+    if "/api/v1/" in caminho:
+        caminho = caminho.split("/api/v1/", 1)[1]
+    partes = [p for p in caminho.strip("/").split("/") if p and not p.isdigit()]
+    for sub in reversed(partes):
+        if sub in _SUBRECURSOS:
+            return sub
+    return partes[0] if partes else "raiz"
+
+
+def _backoff(tentativa: int) -> float:
+    """Backoff exponencial com jitter completo."""
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** tentativa))
+
+
+# ============================================================
+# 🤝 GETs IDÊNTICOS EM VOO
+# ============================================================
+# Várias conversas pedem a mesma URL ao mesmo tempo (/customers?cpf=,
+# hrefs de entidades do get_cached, /purchase-orders?status=PENDING).
+# Só a primeira vai ao Sienge; as outras esperam e recebem a mesma
+# resposta (ou a mesma exceção). A chave é método + URL + params + headers
+# de autenticação/formato; só GET sem corpo entra. A resposta é
+# compartilhada: quem chama usa r.json()/r.content, que não a alteram.
+#
+#   SIENGE_COALESCER = "0" desliga
+
+SIENGE_COALESCER = os.getenv("SIENGE_COALESCER", "1") != "0"
+
+_em_voo: Dict[tuple, Future] = {}
+_em_voo_lock = threading.Lock()
+
+coalescidos = Contador(
+    "constru_sienge_coalescidos_total", "GETs ao Sienge atendidos por uma chamada idêntica já em voo", ("familia",))
+
+
+def _chave_voo(method, url, headers, params, json) -> Optional[tuple]:
+    if not SIENGE_COALESCER or json is not None or method.upper() != "GET":
+        return None
+    headers = json_headers if headers is None else headers
+    try:
+        itens = params.items() if isinstance(params, dict) else (params or ())
+        params_chave = tuple(sorted((str(k), str(v)) for k, v in itens))
+    except (TypeError, ValueError):
+        return None  # params em formato que não sabemos comparar: vai direto
+    return (url, params_chave, headers.get("Authorization"), headers.get("accept"))
+
+
+def sienge_request(
+    method: str,
+    url: str,
+    headers: Optional[Dict[str, str]] = None,
+    params=None,
+    json=None,
+    timeout: float = 30,
+    max_retries: int = 3,
+    prioridade_nivel: Optional[int] = None,
+) -> requests.Response:
+    """
+    Faz a chamada ao Sienge passando pelo disjuntor e pelo limitador global.
+    429 sempre é retentado (honrando Retry-After); 5xx e erros de rede só em GET.
+    Retorna a última resposta; relança a exceção se nenhuma resposta foi obtida.
+    Com o Sienge fora do ar (circuito aberto) levanta CircuitoAberto sem esperar timeout.
+    Dentro de uma mensagem o timeout e as retentativas cabem no prazo dela (PrazoEsgotado).
+    GETs idênticos simultâneos viram uma só chamada (SIENGE_COALESCER).
+    """
+    familia = familia_endpoint(url)
+    with span(f"sienge.{familia}"):
+        chave = _chave_voo(method, url, headers, params, json)
+        if chave is None:
+            return _sienge_request(method, url, familia, headers, params, json, timeout, max_retries, prioridade_nivel)
+        with _em_voo_lock:
+            voo = _em_voo.get(chave)
+            lider = voo is None
+            if lider:
+                voo = _em_voo[chave] = Future()
+        if not lider:
+            coalescidos.inc(familia)
+            try:
+                return voo.result(timeout=prazo.restante())
+            except FuturoTimeout:
+                prazo.esgotados.inc("sienge")
+                raise PrazoEsgotado("sienge") from None
+            except PrazoEsgotado:
+                # O prazo que acabou foi o de quem foi na frente; com tempo sobrando, vai sozinho
+                return _sienge_request(method, url, familia, headers, params, json, timeout, max_retries, prioridade_nivel)
+        try:
+            r = _sienge_request(method, url, familia, headers, params, json, timeout, max_retries, prioridade_nivel)
+        except BaseException as e:
+            voo.set_exception(e)
+            raise
+        else:
+            voo.set_result(r)
+            return r
+        finally:
+            with _em_voo_lock:
+                _em_voo.pop(chave, None)
+
+
+async def sienge_request_async(method: str, url: str, **kwargs) -> requests.Response:
+    """
+    sienge_request para código asyncio. Se um GET idêntico já está em voo,
+    espera a resposta dele sem ocupar thread; senão roda num executor.
+    """
+    chave = _chave_voo(method, url, kwargs.get("headers"), kwargs.get("params"), kwargs.get("json"))
+    if chave is not None:
+        with _em_voo_lock:
+            voo = _em_voo.get(chave)
+        if voo is not None:
+            coalescidos.inc(familia_endpoint(url))
+            try:
+                # shield: o timeout de quem espera não pode cancelar o Future do líder
+                return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(voo)), prazo.restante())
+            except asyncio.TimeoutError:
+                prazo.esgotados.inc("sienge")
+                raise PrazoEsgotado("sienge") from None
+            except PrazoEsgotado:
+                pass  # o prazo que acabou foi o do líder; com tempo sobrando, vai sozinho
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, propagar(functools.partial(sienge_request, method, url, **kwargs)))
+
+
+def _sienge_request(method, url, familia, headers, params, json, timeout, max_retries, prioridade_nivel):
+    headers = json_headers if headers is None else headers
+    idempotente = method.upper() == "GET"
+    ultimo_erro = None
+    r = None
+
+    for tentativa in range(max_retries):
+        prazo.timeout(timeout, "sienge")  # sem tempo, nem pede a vaga de sonda do disjuntor
+        disjuntor_sienge.permitir()
+        try:
+            if not limitador.adquirir(prioridade_nivel, timeout=prazo.restante()):
+                prazo.esgotados.inc("sienge.limitador")
+                raise PrazoEsgotado("sienge.limitador")
+            limite = prazo.timeout(timeout, "sienge")  # o que sobrou depois da fila do limitador
+            inicio = time.perf_counter()
+            try:
+                r = _sessao.request(method, url, headers=headers, params=params, json=json, timeout=limite)
+            except requests.Timeout as e:
+                if limite >= timeout:
+                    raise
+                # Timeout encurtado pelo prazo da mensagem: não é falha do Sienge (disjuntor fica de fora)
+                registrar_upstream("sienge", familia, "prazo", time.perf_counter() - inicio)
+                prazo.esgotados.inc("sienge")
+                raise PrazoEsgotado("sienge") from e
+        except PrazoEsgotado:
+            disjuntor_sienge.liberar()  # se esta era a sonda, a próxima chamada pode testar
+            raise
+        except requests.RequestException as e:
+            registrar_upstream("sienge", familia, "erro", time.perf_counter() - inicio)
+            disjuntor_sienge.falha()
+            ultimo_erro, r = e, None
+            if not idempotente or tentativa == max_retries - 1:
+                break
+            prazo.dormir(_backoff(tentativa), "sienge")
+            continue
+
+        registrar_upstream("sienge", familia, r.status_code, time.perf_counter() - inicio)
+        if r.status_code >= 500:
+            disjuntor_sienge.falha()
+        else:
+            disjuntor_sienge.sucesso()  # 4xx/429 = Sienge respondendo
+
+        if r.status_code == 429:
+            espera = _retry_after(r)
+            limitador.registrar_429(espera)
+            if espera is None and tentativa < max_retries - 1:
+                prazo.dormir(_backoff(tentativa), "sienge")
+            continue
+        if r.status_code >= 500 and idempotente and tentativa < max_retries - 1:
+            prazo.dormir(_backoff(tentativa), "sienge")
+            continue
+
+        limitador.registrar_sucesso()
+        return r
+
+    if r is not None:
+        return r
+    raise ultimo_erro
+
+
+# ============================================================
+# 📄 PAGINAÇÃO (offset/limit) COM LEITURA ANTECIPADA
+# ============================================================
+# As listagens do Sienge vêm em páginas (resultSetMetadata.count/offset/limit).
+# `paginar` entrega os itens de TODAS as páginas, um a um: enquanto quem chama
+# processa a página atual, a próxima já está sendo baixada. Só cabem em
+# memória duas páginas por listagem.
+#
+#   SIENGE_PAGINA          = itens por página (padrão: 200, o máximo do Sienge)
+#   SIENGE_PREFETCH        = "0" desliga a leitura antecipada
+#   SIENGE_PREFETCH_WORKERS = threads compartilhadas de leitura antecipada (padrão: 8)
+
+SIENGE_PAGINA = int(os.getenv("SIENGE_PAGINA", "200"))
+SIENGE_PREFETCH = os.getenv("SIENGE_PREFETCH", "1") != "0"
+_prefetch_pool = ThreadPoolExecutor(
+    max_workers=int(os.getenv("SIENGE_PREFETCH_WORKERS", "8")), thread_name_prefix="sienge-pagina")
+
+
+class PaginaFalhou(Exception):
+    """Uma página da listagem voltou com erro; a lista estaria incompleta."""
+
+    def __init__(self, url: str, offset: int, status):
+        super().__init__(f"Página offset={offset} de {url} falhou ({status})")
+        self.url = url
+        self.offset = offset
+        self.status = status
+
+
+def _baixar_pagina(url, headers, params, offset, limite, timeout, max_retries):
+    r = sienge_request("GET", url, headers=headers, params={**params, "offset": offset, "limit": limite},
+                       timeout=timeout, max_retries=max_retries)
+    if r.status_code != 200:
+        raise PaginaFalhou(url, offset, r.status_code)
+    return r.json()
+
+
+def paginar(url: str, params=None, headers=None, limite: int = None, prefetch: bool = None,
+            timeout: float = 40, max_retries: int = 3):
+    """
+    Gera os itens de todas as páginas de uma listagem do Sienge.
+    Levanta PaginaFalhou se alguma página não vier 200 (e CircuitoAberto, como sienge_request).
+    """
+    params = {k: v for k, v in (params or {}).items() if k not in ("offset", "limit")}
+    limite = limite or SIENGE_PAGINA
+    prefetch = SIENGE_PREFETCH if prefetch is None else prefetch
+    baixar = propagar(_baixar_pagina)
+    offset, proxima = 0, None
+    try:
+        dados = _baixar_pagina(url, headers, params, 0, limite, timeout, max_retries)
+        while True:
+            if not isinstance(dados, dict):
+                yield from dados or []  # endpoint sem paginação
+                return
+            resultados = dados.get("results") or []
+            meta = dados.get("resultSetMetadata") or {}
+            total = meta.get("count")
+            offset += len(resultados)
+            tem_mais = bool(resultados) and (offset < total if total is not None else len(resultados) >= limite)
+            if tem_mais and prefetch:
+                proxima = _prefetch_pool.submit(baixar, url, headers, params, offset, limite, timeout, max_retries)
+            yield from resultados
+            if not tem_mais:
+                return
+            if proxima is not None:
+                dados, proxima = proxima.result(), None
+            else:
+                dados = _baixar_pagina(url, headers, params, offset, limite, timeout, max_retries)
+    finally:
+        if proxima is not None:
+            proxima.cancel()
@@ -1,18 +1,96 @@
 # sienge/sienge_ia.py
+from __future__ import annotations
+
 import logging
-from openai import OpenAI
-import pandas as pd
+import os
+import threading
+import time
+from typing import TYPE_CHECKING
+
+from circuito import CircuitoAberto, disjuntor_openai
+from metricas import registrar_upstream
+import prazo
+from prazo import PrazoEsgotado, marcar_parcial
+from rastreio import span
+
+if TYPE_CHECKING:
+    import pandas as pd
 
 logging.warning("🤖 Rodando módulo sienge_ia.py (análises automáticas de dados financeiros)")
 
-# ⚙️ Inicializa o cliente OpenAI — precisa da variável OPENAI_API_KEY configurada no Render
-client = OpenAI()
+# ⚙️ Cliente OpenAI — precisa da variável OPENAI_API_KEY configurada no Render
+# Timeout curto + disjuntor: com a OpenAI fora do ar a resposta volta na hora.
+# Dentro de uma mensagem o timeout é o que sobra do prazo dela (prazo.py).
+# O SDK (~0,7 s de import) só é carregado na primeira análise.
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "45"))
+_client = None
+_client_lock = threading.Lock()
+
+
+def _cliente():
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                from openai import OpenAI
+                _client = OpenAI(timeout=OPENAI_TIMEOUT, max_retries=1)
+    return _client
+
+def _secao_alertas(alertas: str) -> str:
+    """Bloco do prompt com os alertas da base completa (a amostra sozinha não mostra riscos)."""
+    if not alertas:
+        return ""
+    return f"""
+Alertas calculados sobre TODOS os lançamentos do período (use-os no item de riscos; não invente outros números):
+{alertas}
+"""
+
+IA_INDISPONIVEL = "⚠️ A IA está indisponível no momento. Os dados acima continuam válidos; tente a análise novamente em instantes."
+IA_SEM_TEMPO = "⏳ O comentário da IA não coube no tempo desta mensagem. Os dados continuam válidos; peça a análise de novo em instantes."
+
+
+def _chat_completion(**kwargs):
+    """Chamada ao chat.completions protegida pelo disjuntor da OpenAI."""
+    inicio = time.perf_counter()
+    status = "erro"
+    try:
+        cliente = _cliente()
+        limite = prazo.timeout(OPENAI_TIMEOUT, "openai")
+        cortado = limite < OPENAI_TIMEOUT
+        if cortado:
+            cliente = cliente.with_options(timeout=limite, max_retries=0)
+
+        def _criar(**kw):
+            try:
+                return cliente.chat.completions.create(**kw)
+            except Exception as e:
+                from openai import APITimeoutError
+                if cortado and isinstance(e, APITimeoutError):
+                    prazo.esgotados.inc("openai")
+                    raise PrazoEsgotado("openai") from e  # o prazo é nosso: não conta no disjuntor
+                raise
+
+        with span("llm.openai"):
+            resp = disjuntor_openai.chamar(_criar, ignorar=(PrazoEsgotado,), **kwargs)
+        status = "ok"
+        return resp
+    except CircuitoAberto:
+        status = "circuito_aberto"
+        raise
+    except PrazoEsgotado:
+        status = "prazo"
+        raise
+    finally:
+        registrar_upstream("openai", "chat.completions", status, time.perf_counter() - inicio)
 
 # ==========================================================
 # 🔍 Função base de análise financeira (resumo executivo)
 # ==========================================================
-def gerar_analise_financeira(titulo: str, dados: pd.DataFrame) -> str:
-    """Gera uma análise executiva com base no DataFrame de despesas/receitas."""
+def gerar_analise_financeira(titulo: str, dados: pd.DataFrame, alertas: str = None) -> str:
+    """
+    Gera uma análise executiva com base no DataFrame de despesas/receitas.
+    alertas: digest de sienge_financeiro.resumo_alertas (calculado na base inteira).
+    """
     try:
         if dados is None or len(dados) == 0:
             return "⚠️ Nenhum dado encontrado para análise."
@@ -34,9 +112,10 @@ Título do relatório: **{titulo}**
 
 Amostra de dados (até 40 linhas):
 {preview}
+{_secao_alertas(alertas)}
         """
 
-        resp = client.chat.completions.create(
+        resp = _chat_completion(
             model="gpt-4o-mini",
             messages=[
                 {"role": "system", "content": "Você é um consultor financeiro sênior e especialista em obras e construção civil."},
@@ -47,6 +126,11 @@ Amostra de dados (até 40 linhas):
         )
         return resp.choices[0].message.content
 
+    except CircuitoAberto:
+        return IA_INDISPONIVEL
+    except PrazoEsgotado:
+        marcar_parcial("ia")
+        return IA_SEM_TEMPO
     except Exception as e:
         logging.exception("❌ Erro na IA (gerar_analise_financeira):")
         return f"❌ Erro ao gerar análise financeira: {e}"
@@ -55,7 +139,7 @@ Amostra de dados (até 40 linhas):
 # ==========================================================
 # 🎞️ Geração de Apresentação Estilo Gamma (slide por slide)
 # ==========================================================
-def gerar_apresentacao_gamma(titulo: str, dados: pd.DataFrame) -> str:
+def gerar_apresentacao_gamma(titulo: str, dados: pd.DataFrame, alertas: str = None) -> str:
     """
     Gera uma apresentação executiva (modo 'Gamma') em formato de slides markdown.
     Ideal para ser exibida no dashboard Streamlit com st.markdown().
@@ -98,6 +182,7 @@ Resumo dos dados:
 
 Amostra (até 30 linhas):
 {preview}
+{_secao_alertas(alertas)}
 
 Formate a saída em seções assim:
 ## Slide 1 — Resumo Geral
@@ -110,7 +195,7 @@ texto...
 texto...
         """
 
-        resp = client.chat.completions.create(
+        resp = _chat_completion(
             model="gpt-4o-mini",
             messages=[
                 {"role": "system", "content": "Você é um especialista em apresentações corporativas para construção civil."},
@@ -123,6 +208,11 @@ texto...
         conteudo = resp.choices[0].message.content
         return conteudo.strip()
 
+    except CircuitoAberto:
+        return IA_INDISPONIVEL
+    except PrazoEsgotado:
+        marcar_parcial("ia")
+        return IA_SEM_TEMPO
     except Exception as e:
         logging.exception("❌ Erro na IA (gerar_apresentacao_gamma):")
         return f"❌ Erro ao gerar apresentação: {e}"
@@ -131,13 +221,13 @@ texto...
 # ==========================================================
 # 🔄 Função auxiliar (unifica chamadas)
 # ==========================================================
-def gerar_apresentacao_financeira(titulo: str, dados: pd.DataFrame, modo="resumo") -> str:
+def gerar_apresentacao_financeira(titulo: str, dados: pd.DataFrame, modo="resumo", alertas: str = None) -> str:
     """
     Função unificada para gerar tanto relatórios resumidos quanto apresentações completas.
     modo="resumo" → análise textual (executiva)
     modo="gamma" → slides estilo apresentação
     """
     if modo == "gamma":
-        return gerar_apresentacao_gamma(titulo, dados)
+        return gerar_apresentacao_gamma(titulo, dados, alertas)
     else:
-        return gerar_analise_financeira(titulo, dados)
+        return gerar_analise_financeira(titulo, dados, alertas)
@@ -1,43 +1,25 @@
 import requests
-from base64 import b64encode
 import logging
-from typing import List, Dict, Any, Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Iterable
 
-# === CONFIGURAÇÕES ===
-subdominio = "cctcontrol"
-usuario = "cctcontrol-api"
-senha = "9SQ2MaNrFOeZOOuOAqeSRy7bYWYDDf85"  # senha atual da sua API
-
-BASE_URL = f"https://api.sienge.com.br/{subdominio}/public/api/v1"
-
-# Auth básico
-_token = b64encode(f"{usuario}:{senha}".encode()).decode()
-
-# Cabeçalhos padrão JSON
-json_headers = {
-    "Authorization": f"Basic {_token}",
-    "accept": "application/json",
-    "Content-Type": "application/json",
-}
-
-# Cabeçalho para PDF (corrigido)
-pdf_headers = {
-    "Authorization": f"Basic {_token}",
-    "accept": "*/*",  # ✅ Corrigido para evitar 406
-}
+from log_estruturado import evento
+from rastreio import propagar
+from sienge.sienge_http import BASE_URL, PaginaFalhou, json_headers, paginar, pdf_headers, sienge_request
 
 logging.basicConfig(level=logging.INFO)
 
 
 def _get(url: str, headers: Dict[str, str]) -> requests.Response:
-    r = requests.get(url, headers=headers, timeout=30)
-    logging.info("%s -> %s", url, r.status_code)
+    r = sienge_request("GET", url, headers=headers, timeout=30)
+    evento("sienge.pedidos", "GET", nivel=logging.DEBUG, url=url, status=r.status_code)
     return r
 
 
 def _put(url: str, headers: Dict[str, str], body: Optional[dict] = None) -> requests.Response:
-    r = requests.put(url, headers=headers, json=body or {}, timeout=30)
-    logging.info("%s -> %s | body=%s", url, r.status_code, body)
+    r = sienge_request("PUT", url, headers=headers, json=body or {}, timeout=30)
+    evento("sienge.pedidos", "PUT", url=url, status=r.status_code)
+    evento("sienge.pedidos", "PUT body", nivel=logging.DEBUG, url=url, body=body)
     return r
 
 
@@ -53,15 +35,13 @@ def listar_pedidos_pendentes(data_inicio: Optional[str] = None, data_fim: Option
     if data_fim:
         url += f"&endDate={data_fim}"
 
-    r = _get(url, json_headers)
-    if r.status_code != 200:
-        logging.warning("Falha ao listar pedidos: %s", r.text)
+    # Todas as páginas; os reprovados são descartados conforme as páginas chegam
+    try:
+        results = [p for p in paginar(url, headers=json_headers, timeout=30) if not p.get("disapproved", False)]
+    except PaginaFalhou as e:
+        logging.warning("Falha ao listar pedidos: %s", e)
         return []
 
-    data = r.json() or {}
-    results = data.get("results", []) or []
-    results = [p for p in results if not p.get("disapproved", False)]
-
     try:
         results.sort(key=lambda p: p.get("date") or "", reverse=True)
     except Exception:
@@ -87,26 +67,77 @@ def itens_pedido(purchase_order_id: int) -> List[Dict[str, Any]]:
     return []
 
 
-def autorizar_pedido(purchase_order_id: int, observacao: Optional[str] = None) -> bool:
-    url = f"{BASE_URL}/purchase-orders/{purchase_order_id}/authorize"
+def _decidir_pedido(purchase_order_id: int, acao: str, observacao: Optional[str] = None) -> requests.Response:
+    """Chama /authorize ou /disapprove do pedido e devolve a resposta crua."""
+    url = f"{BASE_URL}/purchase-orders/{purchase_order_id}/{acao}"
     if observacao:
-        r = requests.patch(url, headers=json_headers, json={"observation": observacao}, timeout=30)
-        logging.info("%s -> %s | body=%s", url, r.status_code, {"observation": observacao})
-        return r.status_code in (200, 204)
-    r = _put(url, json_headers)
+        r = sienge_request("PATCH", url, json={"observation": observacao}, timeout=30)
+        evento("sienge.pedidos", "PATCH", url=url, status=r.status_code)
+        evento("sienge.pedidos", "PATCH body", nivel=logging.DEBUG, url=url, observacao=observacao)
+        return r
+    return _put(url, json_headers)
+
+
+def autorizar_pedido(purchase_order_id: int, observacao: Optional[str] = None) -> bool:
+    r = _decidir_pedido(purchase_order_id, "authorize", observacao)
     return r.status_code in (200, 204)
 
 
 def reprovar_pedido(purchase_order_id: int, observacao: Optional[str] = None) -> bool:
-    url = f"{BASE_URL}/purchase-orders/{purchase_order_id}/disapprove"
-    if observacao:
-        r = requests.patch(url, headers=json_headers, json={"observation": observacao}, timeout=30)
-        logging.info("%s -> %s | body=%s", url, r.status_code, {"observation": observacao})
-        return r.status_code in (200, 204)
-    r = _put(url, json_headers)
+    r = _decidir_pedido(purchase_order_id, "disapprove", observacao)
     return r.status_code in (200, 204)
 
 
+# =========================
+#  DECISÃO EM LOTE
+# =========================
+
+LOTE_MAX_PARALELO = 4  # chamadas simultâneas; a taxa fica com o limitador global do sienge_http
+
+
+def decidir_pedidos_em_lote(
+    ids: Iterable[int],
+    acao: str = "autorizar",
+    observacao: Optional[str] = None,
+    max_paralelo: int = LOTE_MAX_PARALELO,
+) -> List[Dict[str, Any]]:
+    """
+    Autoriza ou reprova vários pedidos em paralelo (a taxa é controlada pelo sienge_http).
+    acao: "autorizar" ou "reprovar".
+    Retorna uma linha por pedido: {"pedido_id", "ok", "status", "erro"}, na ordem recebida.
+    """
+    rota = {"autorizar": "authorize", "reprovar": "disapprove"}.get(acao)
+    if not rota:
+        raise ValueError(f"Ação de lote inválida: {acao}")
+
+    ids = list(dict.fromkeys(int(i) for i in ids))  # remove duplicados mantendo a ordem
+    if not ids:
+        return []
+
+    def _executar(pid: int) -> Dict[str, Any]:
+        try:
+            r = _decidir_pedido(pid, rota, observacao)
+            ok = r.status_code in (200, 204)
+            return {
+                "pedido_id": pid,
+                "ok": ok,
+                "status": r.status_code,
+                "erro": None if ok else (r.text or "")[:120],
+            }
+        except Exception as e:
+            logging.exception("Erro ao %s pedido %s:", acao, pid)
+            return {"pedido_id": pid, "ok": False, "status": None, "erro": str(e)}
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_paralelo, len(ids)))) as pool:
+        resultados = list(pool.map(propagar(_executar), ids))
+
+    logging.info(
+        "🧾 Lote %s: %s/%s pedidos com sucesso.",
+        acao, sum(1 for r in resultados if r["ok"]), len(resultados),
+    )
+    return resultados
+
+
 def gerar_relatorio_pdf_bytes(purchase_order_id: int) -> Optional[bytes]:
     """PDF oficial do Sienge: /purchase-orders/{id}/analysis/pdf"""
     url = f"{BASE_URL}/purchase-orders/{purchase_order_id}/analysis/pdf"
@@ -1,7 +1,78 @@
+import hashlib
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
 import pandas as pd
 import plotly.express as px
 import streamlit as st
-from sienge.sienge_ia import gerar_analise_financeira
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+from sienge.sienge_ia import IA_INDISPONIVEL, IA_SEM_TEMPO, gerar_analise_financeira
+
+# ============================================================
+# ⚡ CACHE E PARALELISMO DOS SLIDES
+# ============================================================
+# Cada interação com um widget reexecuta o script inteiro do Streamlit.
+# Os agrupamentos e os textos da IA ficam memorizados pelo hash do
+# DataFrame (só as colunas usadas nos slides), então um rerun com os
+# mesmos dados não refaz groupby nem paga a OpenAI de novo. As análises
+# que faltam saem em paralelo e cada slide mostra o texto assim que o
+# dele chega. Respostas de erro/indisponibilidade não entram no cache.
+#
+#   SLIDES_CACHE_TTL  = segundos que agrupamentos e textos ficam guardados (padrão: 3600)
+
+SLIDES_CACHE_TTL = int(os.getenv("SLIDES_CACHE_TTL", "3600"))
+
+# (título do slide, coluna agrupada, tipo do gráfico, título do gráfico, análise da IA, top N)
+SLIDES = (
+    ("🏗️ Gastos por Obra", "obra", "bar", "Total de Gastos por Obra", "Gastos por Obra", None),
+    ("🏢 Gastos por Centro de Custo", "centro_custo", "pie", "Distribuição por Centro de Custo",
+     "Gastos por Centro de Custo", None),
+    ("📦 Gastos por Fornecedor", "fornecedor", "bar", "Top 10 Fornecedores", "Top Fornecedores", 10),
+    ("📋 Status Financeiro das Despesas", "status", "bar", "Despesas por Status", "Status das Despesas", None),
+)
+
+
+class _AnaliseNaoGuardada(Exception):
+    """Texto de falha da IA: é mostrado, mas não pode ficar no cache."""
+
+
+def hash_dataframe(df: pd.DataFrame) -> str:
+    """Hash do conteúdo das colunas usadas nos slides (colunas com listas, como apropriações, ficam de fora)."""
+    colunas = [c for c in ("valor_total", *(s[1] for s in SLIDES)) if c in df.columns]
+    valores = pd.util.hash_pandas_object(df[colunas], index=False).values
+    return hashlib.sha1(",".join(colunas).encode() + valores.tobytes()).hexdigest()
+
+
+@st.cache_data(ttl=SLIDES_CACHE_TTL, show_spinner=False)
+def _agregacoes(chave: str, _df: pd.DataFrame) -> dict:
+    """Os quatro agrupamentos dos slides; `_df` não é hasheado de novo, a chave já é o hash dele."""
+    dados = {}
+    for _titulo, coluna, _tipo, _grafico, _ia, top in SLIDES:
+        if coluna not in _df.columns:
+            continue
+        agrupado = _df.groupby(coluna)["valor_total"].sum().reset_index()
+        if top:
+            agrupado = agrupado.sort_values("valor_total", ascending=False).head(top)
+        dados[coluna] = agrupado
+    return dados
+
+
+@st.cache_data(ttl=SLIDES_CACHE_TTL, show_spinner=False)
+def _analise(titulo: str, chave: str, _dados: pd.DataFrame) -> str:
+    texto = gerar_analise_financeira(titulo, _dados)
+    if texto in (IA_INDISPONIVEL, IA_SEM_TEMPO) or texto.startswith("❌"):
+        raise _AnaliseNaoGuardada(texto)
+    return texto
+
+
+def _analise_ou_falha(titulo: str, chave: str, dados: pd.DataFrame, ctx) -> str:
+    # Roda numa thread do pool: precisa do contexto do script para usar o cache do Streamlit
+    add_script_run_ctx(threading.current_thread(), ctx)
+    try:
+        return _analise(titulo, chave, dados)
+    except _AnaliseNaoGuardada as e:
+        return str(e)
 
 
 # ============================================================
@@ -10,7 +81,8 @@ from sienge.sienge_ia import gerar_analise_financeira
 def gerar_slides_financeiros(df: pd.DataFrame):
     """
     Gera visualizações e análises automáticas a partir do DataFrame financeiro.
-    Cada seção (slide) exibe um gráfico e a explicação da IA.
+    Cada seção (slide) exibe um gráfico e a explicação da IA; os gráficos
+    aparecem na hora e os textos chegam conforme cada análise termina.
     """
 
     if df.empty:
@@ -19,58 +91,35 @@ def gerar_slides_financeiros(df: pd.DataFrame):
 
     st.header("📊 Apresentação Interativa — Inteligência Financeira")
 
-    # === SLIDE 1 — GASTOS POR OBRA ===
-    if "obra" in df.columns:
-        st.subheader("🏗️ Gastos por Obra")
-        obra_data = df.groupby("obra")["valor_total"].sum().reset_index()
-        fig = px.bar(obra_data, x="obra", y="valor_total", text_auto=".2s", title="Total de Gastos por Obra")
-        st.plotly_chart(fig, use_container_width=True)
-
-        with st.spinner("Gerando análise da IA..."):
-            texto = gerar_analise_financeira("Gastos por Obra", obra_data)
-            st.markdown(texto)
-
-        st.divider()
-
-    # === SLIDE 2 — GASTOS POR CENTRO DE CUSTO ===
-    if "centro_custo" in df.columns:
-        st.subheader("🏢 Gastos por Centro de Custo")
-        cc_data = df.groupby("centro_custo")["valor_total"].sum().reset_index()
-        fig = px.pie(cc_data, values="valor_total", names="centro_custo", title="Distribuição por Centro de Custo")
-        st.plotly_chart(fig, use_container_width=True)
-
-        with st.spinner("Gerando análise da IA..."):
-            texto = gerar_analise_financeira("Gastos por Centro de Custo", cc_data)
-            st.markdown(texto)
-
-        st.divider()
-
-    # === SLIDE 3 — GASTOS POR FORNECEDOR ===
-    if "fornecedor" in df.columns:
-        st.subheader("📦 Gastos por Fornecedor")
-        forn_data = df.groupby("fornecedor")["valor_total"].sum().reset_index()
-        forn_data = forn_data.sort_values("valor_total", ascending=False).head(10)
-        fig = px.bar(forn_data, x="fornecedor", y="valor_total", text_auto=".2s", title="Top 10 Fornecedores")
+    chave = hash_dataframe(df)
+    dados = _agregacoes(chave, df)
+
+    # Gráficos primeiro, com um espaço reservado para o texto de cada slide
+    espacos = {}
+    for titulo, coluna, tipo, grafico, _ia, _top in SLIDES:
+        if coluna not in dados:
+            continue
+        st.subheader(titulo)
+        if tipo == "pie":
+            fig = px.pie(dados[coluna], values="valor_total", names=coluna, title=grafico)
+        else:
+            fig = px.bar(dados[coluna], x=coluna, y="valor_total", text_auto=".2s", title=grafico)
         st.plotly_chart(fig, use_container_width=True)
-
-        with st.spinner("Gerando análise da IA..."):
-            texto = gerar_analise_financeira("Top Fornecedores", forn_data)
-            st.markdown(texto)
-
+        espacos[coluna] = st.empty()
+        espacos[coluna].info("⏳ Gerando análise da IA...")
         st.divider()
 
-    # === SLIDE 4 — STATUS DAS DESPESAS ===
-    if "status" in df.columns:
-        st.subheader("📋 Status Financeiro das Despesas")
-        status_data = df.groupby("status")["valor_total"].sum().reset_index()
-        fig = px.bar(status_data, x="status", y="valor_total", text_auto=".2s", title="Despesas por Status")
-        st.plotly_chart(fig, use_container_width=True)
-
-        with st.spinner("Gerando análise da IA..."):
-            texto = gerar_analise_financeira("Status das Despesas", status_data)
-            st.markdown(texto)
-
-        st.divider()
+    # As análises saem juntas; cada slide é preenchido quando a sua fica pronta
+    if espacos:
+        ctx = get_script_run_ctx()
+        with ThreadPoolExecutor(max_workers=len(espacos), thread_name_prefix="slides") as pool:
+            futuros = {
+                pool.submit(_analise_ou_falha, ia, f"{chave}:{coluna}", dados[coluna], ctx): coluna
+                for _titulo, coluna, _tipo, _grafico, ia, _top in SLIDES
+                if coluna in espacos
+            }
+            for futuro in as_completed(futuros):
+                espacos[futuros[futuro]].markdown(futuro.result())
 
     # === SLIDE FINAL ===
     st.success("🎉 Fim da apresentação — relatório completo gerado com sucesso!")